@@ -0,0 +1,218 @@
+import struct
+
+from engine import Game, INFECTION_CARD_NAME, shared_map
+
+# компактный двоичный журнал партии: заголовок (зерно, карта, роли) и поток событий -
+# действия игроков и вытянутые карты, по несколько байт на событие
+LOG_MAGIC = b'PNDL'
+# версия 2: расклад колоды заражения по зерну изменился, журналы версии 1 не воспроизводятся;
+# версия 3: в заголовке контрольная сумма и размер карты, на больших картах номера карт в 4 байта
+LOG_VERSION = 3
+# сигнатура, версия, зерно, контрольная сумма карты, число городов, число игроков
+HEADER = struct.Struct('<4sBQIIB')
+
+DRAW_PLAYERS_CARD = 1
+DRAW_INFECTIONS_CARD = 2
+# действие -> (код, типы аргументов): P - игрок, T - город, C - карта или None, V - вирус, L - список карт
+ACTIONS = {
+    'action_with_city': (10, 'PTC'),
+    'transfer_card': (11, 'PPC'),
+    'create_vaccine': (12, 'PVL'),
+    'build_station': (13, 'PT'),
+    'fighting_virus': (14, 'P'),
+    'dispatcher_action': (15, 'PTC'),
+    'spending_action': (16, ''),
+}
+ACTION_BY_CODE = {code: (name, kinds) for name, (code, kinds) in ACTIONS.items()}
+
+
+class ReplayError(Exception):
+    pass
+
+
+class CardFormat:
+    # номера карт: два байта, а на картах из 65534 городов и больше - четыре;
+    # два старших значения - карта усиления заражаемости и отсутствие карты
+    def __init__(self, count):
+        self.struct = struct.Struct('<H' if count < 0xFFFE else '<I')
+        self.size = self.struct.size
+        self.infection_card = (1 << 8 * self.size) - 1
+        self.no_card = self.infection_card - 1
+
+    def card_id(self, game, card):
+        if card is None:
+            return self.no_card
+        if card == INFECTION_CARD_NAME:
+            return self.infection_card
+        return game.cities[card].take_num()
+
+
+class ActionLog:
+    def __init__(self):
+        self.data = bytearray()
+        self.busy = False
+        self.cards = None
+
+    @classmethod
+    def resume(cls, game, data):
+        # продолжение журнала партии, восстановленной из него же (replay)
+        log = cls()
+        log.data = bytearray(data)
+        log.cards = CardFormat(len(game.map))
+        return log
+
+    def start(self, game):
+        roles = [player.take_role() for player in game.take_players()]
+        city_map = game.map
+        self.cards = CardFormat(len(city_map))
+        self.data += HEADER.pack(LOG_MAGIC, LOG_VERSION, game.seed, city_map.checksum(), len(city_map), len(roles))
+        self.data += bytes(roles)
+
+    def record_players_card(self, game, card):
+        self.data.append(DRAW_PLAYERS_CARD)
+        self.data += self.cards.struct.pack(self.cards.card_id(game, card))
+
+    def record_infections_card(self, game, card):
+        self.data.append(DRAW_INFECTIONS_CARD)
+        self.data += self.cards.struct.pack(self.cards.card_id(game, card))
+
+    def record_action(self, game, name, args):
+        # возвращает позицию записи, чтобы отменить её, если действие не выполнится.
+        # Запись собирается отдельно и добавляется целиком: если аргумент не кодируется
+        # (неизвестный город или карта), в журнале не остается ее начала
+        code, kinds = ACTIONS[name]
+        cards = self.cards
+        data = bytearray((code,))
+        args = tuple(args) + (None,) * (len(kinds) - len(args))
+        for kind, arg in zip(kinds, args):
+            if kind == 'P':
+                data.append(arg.take_num())
+            elif kind == 'V':
+                data.append(arg)
+            elif kind == 'T':
+                data += cards.struct.pack(arg.take_num())
+            elif kind == 'C':
+                data += cards.struct.pack(cards.card_id(game, arg))
+            else:
+                data.append(len(arg))
+                for card in arg:
+                    data += cards.struct.pack(cards.card_id(game, card))
+        mark = len(self.data)
+        self.data += data
+        return mark
+
+    def cancel(self, mark):
+        del self.data[mark:]
+
+    def to_bytes(self):
+        return bytes(self.data)
+
+    def save(self, path):
+        with open(path, 'wb') as file:
+            file.write(self.data)
+
+
+def read_header(data, city_map):
+    # зерно, роли и начало событий; журнал, записанный на другой карте, не воспроизводится
+    magic, version, seed, crc, cities, count = HEADER.unpack_from(data, 0)
+    if magic != LOG_MAGIC or version != LOG_VERSION:
+        raise ReplayError('Неизвестный формат журнала')
+    if cities != len(city_map) or crc != city_map.checksum():
+        raise ReplayError('Журнал записан на другой карте')
+    roles = list(data[HEADER.size:HEADER.size + count])
+    return seed, roles, HEADER.size + count
+
+
+def read_events(data, pos, cards):
+    # события журнала: (код, значения аргументов в виде номеров); cards - CardFormat журнала
+    card = cards.struct
+    width = cards.size
+    size = len(data)
+    while pos < size:
+        code = data[pos]
+        pos += 1
+        if code == DRAW_PLAYERS_CARD or code == DRAW_INFECTIONS_CARD:
+            yield code, card.unpack_from(data, pos)[0]
+            pos += width
+            continue
+        if code not in ACTION_BY_CODE:
+            raise ReplayError(f'Неизвестное событие {code}')
+        args = []
+        for kind in ACTION_BY_CODE[code][1]:
+            if kind in 'PV':
+                args.append(data[pos])
+                pos += 1
+            elif kind in 'TC':
+                args.append(card.unpack_from(data, pos)[0])
+                pos += width
+            else:
+                count = data[pos]
+                args.append([card.unpack_from(data, pos + 1 + width * i)[0] for i in range(count)])
+                pos += 1 + width * count
+        yield code, args
+
+
+class DrawChecker:
+    # подставляется вместо журнала при воспроизведении и сверяет вытянутые карты с записанными
+    def __init__(self, events, cards):
+        self.events = events
+        self.cards = cards
+        self.busy = True
+
+    def start(self, game):
+        pass
+
+    def _check(self, game, code, card):
+        expected = next(self.events, None)
+        if expected != (code, self.cards.card_id(game, card)):
+            raise ReplayError(f'Ход {game.turn}: вытянута карта {card}, в журнале {expected}')
+
+    def record_players_card(self, game, card):
+        self._check(game, DRAW_PLAYERS_CARD, card)
+
+    def record_infections_card(self, game, card):
+        self._check(game, DRAW_INFECTIONS_CARD, card)
+
+
+def replay(data, turn=None, verify=True, city_map=None):
+    # восстановление партии по журналу без интерфейса; turn - остановиться в начале этого хода,
+    # city_map - карта, на которой записан журнал (по умолчанию общая карта)
+    if city_map is None:
+        city_map = shared_map()
+    seed, roles, pos = read_header(data, city_map)
+    cards = CardFormat(len(city_map))
+    events = read_events(data, pos, cards)
+    game = Game(roles, seed, DrawChecker(events, cards) if verify else None, city_map)
+    towns = {town.take_num(): town for town in game.take_cities_list()}
+    players = game.take_players()
+
+    def card_name(value):
+        if value == cards.no_card:
+            return None
+        if value == cards.infection_card:
+            return INFECTION_CARD_NAME
+        return towns[value].take_name()
+
+    for code, args in events:
+        if code == DRAW_PLAYERS_CARD or code == DRAW_INFECTIONS_CARD:
+            if verify:
+                raise ReplayError(f'Ход {game.turn}: в журнале лишняя карта {args}')
+            continue
+        if turn is not None and game.turn >= turn:
+            break
+        name, kinds = ACTION_BY_CODE[code]
+        values = []
+        for kind, value in zip(kinds, args):
+            if kind == 'P':
+                values.append(players[value])
+            elif kind == 'V':
+                values.append(value)
+            elif kind == 'T':
+                values.append(towns[value])
+            elif kind == 'C':
+                values.append(card_name(value))
+            else:
+                values.append([card_name(card) for card in value])
+        if not getattr(game, name)(*values):
+            raise ReplayError(f'Ход {game.turn}: действие {name} не выполнено')
+    return game
@@ -0,0 +1,121 @@
+from engine import VIRUS_COUNT, ROLE_DISPATCHER, ROLE_RESEARCHER, ROLE_ENGINEER, cure_size
+from state import INFECTION_CARD
+
+# виды действий; действие - кортеж (вид, аргументы...)
+MOVE = 0            # (MOVE, город) - в соседний город
+SHUTTLE = 1         # (SHUTTLE, город) - между станциями
+DIRECT_FLIGHT = 2   # (DIRECT_FLIGHT, город) - сбросить карту города назначения
+CHARTER_FLIGHT = 3  # (CHARTER_FLIGHT, город) - сбросить карту текущего города
+TREAT = 4           # (TREAT,)
+BUILD = 5           # (BUILD,)
+SHARE = 6           # (SHARE, игрок, карта) - передать карту игроку
+CURE = 7            # (CURE, вирус, карты)
+DISPATCH = 8        # (DISPATCH, игрок, город, карта или None) - перемещение диспетчером
+ACTION_NAMES = ['MOVE', 'SHUTTLE', 'DIRECT_FLIGHT', 'CHARTER_FLIGHT', 'TREAT', 'BUILD', 'SHARE', 'CURE', 'DISPATCH']
+
+_TREAT = (TREAT,)
+_BUILD = (BUILD,)
+
+
+def cure_cards(state, player):
+    # для каждого вируса - первые подходящие карты руки, если их хватает на вакцину
+    need = cure_size(state.roles[player])
+    viruses = state.map.viruses
+    groups = [[] for _ in range(VIRUS_COUNT)]
+    for card in state.hands[player]:
+        if card != INFECTION_CARD:
+            groups[viruses[card]].append(card)
+    return [(virus, tuple(cards[:need])) for virus, cards in enumerate(groups)
+            if len(cards) >= need and not state.vaccines[virus]]
+
+
+def _dispatch_actions(state, player, hand):
+    location = state.locations[player]
+    free = set(state.map.neighbors[location])
+    free.update(state.locations)
+    if state.stations[location]:
+        free.update(state.station_cities)
+    free.discard(location)
+    for city in free:
+        yield DISPATCH, player, city, None
+    for card in hand:
+        if card != INFECTION_CARD and card not in free and card != location:
+            yield DISPATCH, player, card, card
+    if location in hand:
+        for city in range(len(state.map)):
+            if city != location and city not in free and city not in hand:
+                yield DISPATCH, player, city, location
+
+
+def legal_actions(state):
+    # все допустимые действия текущего игрока без изменения состояния
+    if state.game_over:
+        return
+    current = state.current
+    role = state.roles[current]
+    location = state.locations[current]
+    hand = state.hands[current]
+    neighbors = state.map.neighbors[location]
+    for city in neighbors:
+        yield MOVE, city
+    # куда можно попасть без карты: перелет туда Game (action_with_city) не делает, карта не сбрасывается
+    neighbor_set = state.map.neighbor_sets[location]
+    free = neighbor_set
+    if state.stations[location]:
+        free = neighbor_set.union(state.station_cities)
+        for city in state.station_cities:
+            if city != location and city not in neighbor_set:
+                yield SHUTTLE, city
+    cards = set(hand)
+    cards.discard(INFECTION_CARD)
+    for card in cards:
+        if card != location and card not in free:
+            yield DIRECT_FLIGHT, card
+    if location in cards:
+        for city in range(len(state.map)):
+            if city != location and city not in free:
+                yield CHARTER_FLIGHT, city
+    if state.contamination[location] > 0:
+        yield _TREAT
+    if not state.stations[location] and (role == ROLE_ENGINEER or location in cards):
+        yield _BUILD
+    for other, other_location in enumerate(state.locations):
+        if other != current and (other_location == location or role == ROLE_RESEARCHER or
+                                 state.roles[other] == ROLE_RESEARCHER):
+            for card in cards:
+                yield SHARE, other, card
+    for virus, cure in cure_cards(state, current):
+        yield CURE, virus, cure
+    if role == ROLE_DISPATCHER:
+        for other in range(len(state.roles)):
+            if other != current:
+                yield from _dispatch_actions(state, other, cards)
+
+
+def apply_action(state, action):
+    # выполнение действия и списание одного хода; возвращает False для недопустимого действия
+    kind = action[0]
+    current = state.current
+    if kind == MOVE:
+        done = state.simple_moving(current, action[1])
+    elif kind == SHUTTLE:
+        done = state.work_moving(current, action[1])
+    elif kind == DIRECT_FLIGHT:
+        done = state.air_moving(current, action[1], action[1])
+    elif kind == CHARTER_FLIGHT:
+        done = state.air_moving(current, action[1], state.locations[current])
+    elif kind == TREAT:
+        done = state.fighting_virus(current)
+    elif kind == BUILD:
+        done = state.build_station(current)
+    elif kind == SHARE:
+        done = state.transfer_card(current, action[1], action[2])
+    elif kind == CURE:
+        done = state.create_vaccine(current, action[1], list(action[2]))
+    elif kind == DISPATCH:
+        done = state.dispatcher_action(action[1], action[2], action[3])
+    else:
+        done = False
+    if done:
+        state.spending_action()
+    return done
@@ -0,0 +1,312 @@
+import argparse
+import json
+import math
+import random
+import signal
+import time
+from multiprocessing import Pool, cpu_count
+
+from engine import Game, PLAYERS_WIN, VIRUS_COUNT, VIRUS_UNITS_COUNT, MAX_OUTBREAKS_COUNT, PLAYER_ACTIONS, \
+    ROLE_SCIENTIST, ROLE_DOCTOR, ROLE_DISPATCHER, cure_size
+from state import GameState, INFECTION_CARD
+from actions import MOVE, SHUTTLE, DIRECT_FLIGHT, CHARTER_FLIGHT, TREAT, BUILD, SHARE, CURE, DISPATCH, \
+    legal_actions, apply_action
+
+# ИИ-игрок: поиск Монте-Карло по дереву информационных множеств (ISMCTS).
+# Руки игроков открыты, скрыт только порядок оставшихся карт в колодах, поэтому на каждой итерации
+# он выбирается заново (детерминизация), а дерево строится по последовательностям действий
+MOVE_BUDGET = 1.0
+EXPLORATION = 0.7
+# на сколько ходов игроков вперед доигрывается партия из листа дерева
+ROLLOUT_TURNS = 3
+
+
+class Node:
+    __slots__ = ('parent', 'action', 'children', 'visits', 'value', 'available')
+
+    def __init__(self, parent=None, action=None):
+        self.parent = parent
+        self.action = action
+        self.children = dict()
+        self.visits = 0
+        self.value = 0.0
+        self.available = 0
+
+    def ucb(self, exploration):
+        # UCB1 с числом раз, когда действие было допустимо, вместо числа посещений родителя
+        return self.value / self.visits + exploration * math.sqrt(math.log(self.available) / self.visits)
+
+
+def determinize(state, rng):
+    # копия состояния, в которой порядок оставшихся карт обеих колод выбран случайно
+    # из их известного состава (расклад эпидемий по стопкам не учитывается)
+    state = state.clone(rng)
+    cards = list(state.players_pack[state.players_pos:])
+    rng.shuffle(cards)
+    state.players_pack = tuple(cards)
+    state.players_pos = 0
+    cards = list(state.infection_pack[state.infection_pos:])
+    rng.shuffle(cards)
+    state.infection_pack = tuple(cards)
+    state.infection_pos = 0
+    return state
+
+
+def evaluate(state):
+    # оценка от 0 до 1: победа - 1, поражение - 0, иначе по вакцинам, картам к ним, вспышкам и кубикам
+    if state.game_over:
+        return 1.0 if state.winner == PLAYERS_WIN else 0.0
+    viruses = state.map.viruses
+    progress = 0.0
+    for virus in range(VIRUS_COUNT):
+        if state.vaccines[virus]:
+            progress += 1
+            continue
+        best = 0.0
+        for player, hand in enumerate(state.hands):
+            need = cure_size(state.roles[player])
+            count = sum(1 for card in hand if card != INFECTION_CARD and viruses[card] == virus)
+            best = max(best, min(count / need, 1.0))
+        progress += 0.5 * best
+    return 0.05 + 0.45 * progress / VIRUS_COUNT + \
+        0.25 * (1 - state.scale_outbreaks / MAX_OUTBREAKS_COUNT) + \
+        0.2 * min(state.viruses_units) / VIRUS_UNITS_COUNT
+
+
+def rollout_action(actions, rng):
+    # легкая политика доигрывания: вакцина, если она возможна, часто лечение, иначе случайное действие
+    treat = None
+    for action in actions:
+        if action[0] == CURE:
+            return action
+        if action[0] == TREAT:
+            treat = action
+    if treat is not None and rng.random() < 0.5:
+        return treat
+    return rng.choice(actions)
+
+
+def rollout(state, rng, turns):
+    actions_left = turns * PLAYER_ACTIONS
+    while not state.game_over and actions_left > 0:
+        actions = list(legal_actions(state))
+        if not actions:
+            break
+        apply_action(state, rollout_action(actions, rng))
+        actions_left -= 1
+    return evaluate(state)
+
+
+def iterate(root, root_state, rng, exploration, rollout_turns):
+    # одна итерация: детерминизация, спуск по допустимым в ней действиям, раскрытие, доигрывание
+    state = determinize(root_state, rng)
+    node = root
+    size = 0
+    while not state.game_over:
+        actions = list(legal_actions(state))
+        if not actions:
+            break
+        untried = []
+        children = node.children
+        for action in actions:
+            child = children.get(action)
+            if child is None:
+                untried.append(action)
+            else:
+                child.available += 1
+        if untried:
+            action = rng.choice(untried)
+            child = Node(node, action)
+            child.available = 1
+            children[action] = child
+            apply_action(state, action)
+            node = child
+            size = 1
+            break
+        node = max((children[action] for action in actions), key=lambda child: child.ucb(exploration))
+        apply_action(state, node.action)
+    value = rollout(state, rng, rollout_turns)
+    while node is not None:
+        node.visits += 1
+        node.value += value
+        node = node.parent
+    return size
+
+
+def search(state, budget, seed, exploration=EXPLORATION, rollout_turns=ROLLOUT_TURNS, iterations=None):
+    # поиск из состояния state в течение budget секунд (или iterations итераций);
+    # возвращает статистику ходов корня {действие: (посещения, сумма оценок)}, число итераций и узлов
+    rng = random.Random(seed)
+    root = Node()
+    size = 1
+    done = 0
+    deadline = time.perf_counter() + budget
+    while (iterations is None or done < iterations) and time.perf_counter() < deadline:
+        size += iterate(root, state, rng, exploration, rollout_turns)
+        done += 1
+    moves = {action: (child.visits, child.value) for action, child in root.children.items()}
+    return moves, done, size
+
+
+def init_worker():
+    # процессы пула наследуют обработчики сигналов pygame (SDL превращает SIGTERM в событие QUIT),
+    # и без сброса terminate() не может их остановить
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def run_search(args):
+    # работа одного процесса пула
+    return search(*args)
+
+
+class MCTSPlayer:
+    # ИИ для мест за столом: параллельный поиск из корня в пуле процессов (каждый процесс строит
+    # свое дерево, посещения ходов корня складываются); поиск можно запустить и опрашивать,
+    # не останавливая интерфейс
+    def __init__(self, budget=MOVE_BUDGET, workers=None, exploration=EXPLORATION, rollout_turns=ROLLOUT_TURNS,
+                 iterations=None, seed=None):
+        self.budget = budget
+        self.workers = workers or cpu_count()
+        self.exploration = exploration
+        self.rollout_turns = rollout_turns
+        self.iterations = iterations
+        self.rng = random.Random(seed)
+        self.pool = None
+        self.pending = None
+        self.started = None
+        self.last_stats = None
+
+    def start(self, game):
+        state = GameState.from_game(game)
+        tasks = [(state, self.budget, self.rng.randrange(2 ** 32), self.exploration, self.rollout_turns,
+                  self.iterations) for _ in range(self.workers)]
+        self.started = time.perf_counter()
+        if self.workers == 1:
+            self.pending = [run_search(tasks[0])]
+            return
+        if self.pool is None:
+            self.pool = Pool(self.workers, init_worker)
+        self.pending = self.pool.map_async(run_search, tasks)
+
+    def is_thinking(self):
+        return self.pending is not None
+
+    def poll(self):
+        # выбранное действие, если поиск закончен, иначе None
+        if self.pending is None:
+            return None
+        if isinstance(self.pending, list):
+            results = self.pending
+        elif self.pending.ready():
+            results = self.pending.get()
+        else:
+            return None
+        self.pending = None
+        return self.finish(results)
+
+    def finish(self, results):
+        elapsed = time.perf_counter() - self.started
+        visits = dict()
+        values = dict()
+        for moves, _, _ in results:
+            for action, (count, value) in moves.items():
+                visits[action] = visits.get(action, 0) + count
+                values[action] = values.get(action, 0.0) + value
+        iterations = sum(result[1] for result in results)
+        self.last_stats = {
+            'iterations': iterations,
+            'iterations_per_second': iterations / elapsed if elapsed > 0 else 0.0,
+            'tree_size': sum(result[2] for result in results),
+            'workers': len(results),
+            'elapsed': elapsed,
+        }
+        if not visits:
+            return None
+        action = max(visits, key=lambda action: (visits[action], values[action]))
+        self.last_stats['value'] = values[action] / visits[action]
+        return action
+
+    def choose(self, game):
+        self.start(game)
+        if not isinstance(self.pending, list):
+            self.pending.wait()
+        return self.poll()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        self.pending = None
+
+
+def play_action(game, action):
+    # выполнение действия из actions.py методами Game от имени текущего игрока, как это делают кнопки
+    player = game.take_current_player()
+    towns = list(game.take_cities_list())
+    names = game.map.names
+    kind = action[0]
+    if kind == MOVE or kind == SHUTTLE:
+        done = game.action_with_city(player, towns[action[1]])
+    elif kind == DIRECT_FLIGHT:
+        done = game.action_with_city(player, towns[action[1]], names[action[1]])
+    elif kind == CHARTER_FLIGHT:
+        done = game.action_with_city(player, towns[action[1]], player.take_location().take_name())
+    elif kind == TREAT:
+        done = game.fighting_virus(player)
+    elif kind == BUILD:
+        done = game.build_station(player, player.take_location())
+    elif kind == SHARE:
+        done = game.transfer_card(player, game.take_players()[action[1]], names[action[2]])
+    elif kind == CURE:
+        done = game.create_vaccine(player, action[1], [names[card] for card in action[2]])
+    elif kind == DISPATCH:
+        card = None if action[3] is None else names[action[3]]
+        done = game.dispatcher_action(game.take_players()[action[1]], towns[action[2]], card)
+    else:
+        done = False
+    if done:
+        game.spending_action()
+    return done
+
+
+def play_game(roles, ai, seed):
+    # партия, в которой за всех игроков ходит ИИ; действие, которое не удалось выполнить, пропускается
+    game = Game(roles, seed)
+    stats = []
+    while not game.is_game_over():
+        action = ai.choose(game)
+        if action is None or not play_action(game, action):
+            game.spending_action()
+        stats.append(ai.last_stats)
+    return game, stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Партии ИИ против игры')
+    parser.add_argument('-n', '--games', type=int, default=1)
+    parser.add_argument('--roles', type=int, nargs='+', default=[ROLE_DOCTOR, ROLE_SCIENTIST, ROLE_DISPATCHER])
+    parser.add_argument('--budget', type=float, default=MOVE_BUDGET, help='секунд на ход')
+    parser.add_argument('--iterations', type=int, default=None, help='предел итераций на процесс')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    player = MCTSPlayer(args.budget, args.workers, iterations=args.iterations, seed=args.seed)
+    results = []
+    try:
+        for index in range(args.games):
+            game, stats = play_game(args.roles, player, args.seed + index)
+            results.append({
+                'seed': args.seed + index,
+                'win': bool(game.who_win()),
+                'loss_reason': game.take_loss_reason(),
+                'turns': game.turn,
+                'vaccines': sum(game.take_vaccines()),
+                'outbreaks': game.take_scale_outbreaks(),
+                'moves': len(stats),
+                'iterations_per_second': sum(item['iterations_per_second'] for item in stats) / max(len(stats), 1),
+                'tree_size': sum(item['tree_size'] for item in stats) / max(len(stats), 1),
+            })
+            print(json.dumps(results[-1], ensure_ascii=False))
+    finally:
+        player.close()
@@ -0,0 +1,164 @@
+import random
+
+import numpy as np
+
+from engine import Game, shared_map, MAK_CONTAMINATION, HOW_TAKE, MAX_OUTBREAKS_COUNT, INFECTIVITY, VIRUS_COUNT, \
+    MAX_CARDS_IN_HAND, LOSS_OUTBREAKS, LOSS_VIRUS_UNITS, LOSS_PLAYER_PACK
+from state import GameState, INFECTION_CARD
+
+
+class BatchEngine:
+    # G партий в одних массивах: конец хода (добор карт, заражение, вспышки) выполняется
+    # сразу для всех партий операциями над массивами
+    def __init__(self, states):
+        city_map = states[0].map
+        count = len(city_map)
+        games = len(states)
+        self.map = city_map
+        self.adjacency = np.zeros((count, count), dtype=np.float32)
+        for c_1, c_2 in city_map.edges:
+            self.adjacency[c_1, c_2] = self.adjacency[c_2, c_1] = 1
+        self.viruses = np.array(city_map.viruses, dtype=np.int64)
+        self.virus_mask = np.eye(VIRUS_COUNT, dtype=np.float32)[self.viruses]
+        self.contamination = np.array([state.contamination for state in states], dtype=np.int8)
+        self.viruses_units = np.array([state.viruses_units for state in states], dtype=np.int64)
+        self.victory_over_viruses = np.array([state.victory_over_viruses for state in states], dtype=bool)
+        self.scale_outbreaks = np.array([state.scale_outbreaks for state in states], dtype=np.int64)
+        self.scale_infectivity = np.array([state.scale_infectivity for state in states], dtype=np.int64)
+        self.game_over = np.array([state.game_over for state in states], dtype=bool)
+        self.loss_reason = np.zeros(games, dtype=np.int64)
+        self.current = np.array([state.current for state in states], dtype=np.int64)
+        self.hand_count = np.array([[len(hand) for hand in state.hands] for state in states], dtype=np.int64)
+        self.players_pack = self._pack([state.players_pack[state.players_pos:] for state in states])
+        self.players_pos = np.zeros(games, dtype=np.int64)
+        self.players_len = np.array([state.players_pack_left() for state in states], dtype=np.int64)
+        self.infection_pack = self._pack([state.infection_pack[state.infection_pos:] for state in states])
+        self.infection_pos = np.zeros(games, dtype=np.int64)
+        self.infection_len = np.array([len(state.infection_pack) - state.infection_pos for state in states],
+                                      dtype=np.int64)
+        # вся колода заражения каждой партии в текущем порядке: ее перемешивает генератор партии
+        self.complete_pack = np.array([state.complete_pack for state in states], dtype=np.int64)
+        # города под защитой специалиста по карантину (игроки в пакетном режиме не ходят)
+        self.protected = np.array([np.frombuffer(state.protected, dtype=np.uint8) for state in states], dtype=bool)
+        # у каждой партии копия ее генератора: колода перемешивается так же, как в Game с тем же зерном
+        self.rngs = []
+        for state in states:
+            rng = random.Random()
+            rng.setstate(state.rng.getstate())
+            self.rngs.append(rng)
+
+    @classmethod
+    def from_seeds(cls, seeds, roles, city_map=None):
+        # те же партии, что создает Game(roles, seed)
+        if city_map is None:
+            city_map = shared_map()
+        states = [GameState.from_game(Game(roles, seed, city_map=city_map)) for seed in seeds]
+        return cls(states)
+
+    @staticmethod
+    def _pack(packs):
+        width = max(len(pack) for pack in packs) or 1
+        array = np.full((len(packs), width), INFECTION_CARD, dtype=np.int64)
+        for game, pack in enumerate(packs):
+            array[game, :len(pack)] = pack
+        return array
+
+    def __len__(self):
+        return len(self.contamination)
+
+    def finish(self, games, reason):
+        games = games & ~self.game_over
+        self.game_over |= games
+        self.loss_reason[games] = reason
+
+    def receiving_cards(self):
+        games = np.arange(len(self))
+        active = ~self.game_over
+        for _ in range(HOW_TAKE):
+            active &= self.hand_count[games, self.current] < MAX_CARDS_IN_HAND
+            empty = active & (self.players_pos == self.players_len)
+            self.finish(empty, LOSS_PLAYER_PACK)
+            active &= ~empty
+            cards = self.players_pack[games, np.minimum(self.players_pos, self.players_pack.shape[1] - 1)]
+            self.players_pos += active
+            epidemic = active & (cards == INFECTION_CARD)
+            self.scale_infectivity += epidemic
+            self.hand_count[games[active & ~epidemic], self.current[active & ~epidemic]] += 1
+
+    def open_infections_cards(self, active):
+        # исчерпанная колода заражения перемешивается генератором своей партии, как Deck.reshuffle:
+        # перемешивания редки, поэтому идут по одной партии
+        exhausted = active & (self.infection_pos == self.infection_len)
+        if exhausted.any():
+            size = self.complete_pack.shape[1]
+            if size > self.infection_pack.shape[1]:
+                pack = np.full((len(self), size), INFECTION_CARD, dtype=np.int64)
+                pack[:, :self.infection_pack.shape[1]] = self.infection_pack
+                self.infection_pack = pack
+            for game in np.flatnonzero(exhausted):
+                cards = self.complete_pack[game].tolist()
+                self.rngs[game].shuffle(cards)
+                self.complete_pack[game] = cards
+                self.infection_pack[game, :size] = cards
+            self.infection_pos[exhausted] = 0
+            self.infection_len[exhausted] = size
+        cards = self.infection_pack[np.arange(len(self)), self.infection_pos]
+        self.infection_pos += active
+        return cards
+
+    def _infect(self, rows, targets):
+        # targets [len(rows), n] - попытки заражения в партиях rows; возвращает города со вспышкой
+        contamination = self.contamination[rows]
+        units = self.viruses_units[rows]
+        # заражение не действует: вирус побежден, кубики кончились или город под защитой
+        closed = self.victory_over_viruses[rows] | (units == 0)
+        targets &= ~closed[:, self.viruses]
+        targets &= ~self.protected[rows]
+        full = targets & (contamination == MAK_CONTAMINATION)
+        grow = targets & ~full
+        contamination += grow
+        units -= (grow.astype(np.float32) @ self.virus_mask).astype(units.dtype)
+        exhausted = np.zeros(len(self), dtype=bool)
+        exhausted[rows] = (units <= 0).any(axis=1)
+        np.maximum(units, 0, out=units)
+        self.contamination[rows] = contamination
+        self.viruses_units[rows] = units
+        self.scale_outbreaks[rows] += full.sum(axis=1)
+        self.finish(exhausted, LOSS_VIRUS_UNITS)
+        return full
+
+    def city_infection(self, cards, active):
+        # заражение вытянутых городов и волны вспышек по уровням обхода в ширину;
+        # каждый уровень обрабатывается только в тех партиях, где вспышка продолжается
+        rows = np.flatnonzero(active)
+        visited = np.zeros((len(rows), self.contamination.shape[1]), dtype=bool)
+        visited[np.arange(len(rows)), cards[rows]] = True
+        frontier = self._infect(rows, visited.copy())
+        while True:
+            spreading = frontier.any(axis=1) & ~self.game_over[rows]
+            if not spreading.any():
+                break
+            rows, frontier, visited = rows[spreading], frontier[spreading], visited[spreading]
+            spread = (frontier.astype(np.float32) @ self.adjacency) > 0
+            spread &= ~visited
+            visited |= spread
+            frontier = self._infect(rows, spread)
+        self.finish(self.scale_outbreaks >= MAX_OUTBREAKS_COUNT, LOSS_OUTBREAKS)
+
+    def step(self):
+        # конец хода во всех незавершенных партиях (аналог Game.transfer_motion)
+        self.receiving_cards()
+        rates = np.array(INFECTIVITY, dtype=np.int64)[np.minimum(self.scale_infectivity, len(INFECTIVITY) - 1)]
+        for i in range(max(INFECTIVITY)):
+            active = ~self.game_over & (rates > i)
+            if not active.any():
+                break
+            self.city_infection(self.open_infections_cards(active), active)
+        self.current = (self.current + 1) % self.hand_count.shape[1]
+
+    def run(self, turns):
+        for _ in range(turns):
+            if self.game_over.all():
+                break
+            self.step()
+        return self
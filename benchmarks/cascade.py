@@ -0,0 +1,62 @@
+import queue
+import time
+
+from engine import Game, MAK_CONTAMINATION, VIRUS_UNITS_COUNT, ROLE_DOCTOR, ROLE_SCIENTIST
+
+# сравнение OutbreakCascade с прежней реализацией Game.outbreak на худшем случае:
+# все города заражены до предела, и вспышка проходит по всей карте
+REPEATS = 2000
+
+
+def queue_outbreak(game, start_city):
+    # прежняя реализация: потокобезопасная очередь, новый список used и Game.infection на каждого соседа
+    game.scale_outbreaks += 1
+    infected = queue.Queue()
+    infected.put(start_city)
+    used = [False] * len(game.cities.values())
+    used[start_city.take_num()] = True
+    while not infected.empty():
+        city = infected.get()
+        for neig in city.take_neighbors():
+            if not used[neig.take_num()]:
+                used[neig.take_num()] = True
+                if not game.infection(neig):
+                    game.scale_outbreaks += 1
+                    infected.put(neig)
+
+
+def worst_case_game(roles):
+    game = Game(roles, 0)
+    for city in game.take_cities_list():
+        city.contamination = MAK_CONTAMINATION
+    game.viruses_units = [VIRUS_UNITS_COUNT * 10] * len(game.viruses_units)
+    return game
+
+
+def measure(outbreak, game, start, repeats=REPEATS):
+    best = None
+    for _ in range(5):
+        begin = time.perf_counter()
+        for _ in range(repeats):
+            game.scale_outbreaks = 0
+            game.last_outbreaks.clear()
+            outbreak(start)
+        elapsed = (time.perf_counter() - begin) / repeats
+        best = elapsed if best is None else min(best, elapsed)
+    return best, game.scale_outbreaks
+
+
+def main():
+    game = worst_case_game([ROLE_DOCTOR, ROLE_SCIENTIST])
+    start = game.cities['Атланта']
+    old, old_count = measure(lambda city: queue_outbreak(game, city), game, start)
+    game.game_over = False
+    new, new_count = measure(game.outbreak, game, start)
+    print(f'cities in cascade: {old_count} / {new_count}')
+    print(f'queue.Queue outbreak: {old * 1e6:8.1f} us')
+    print(f'OutbreakCascade:      {new * 1e6:8.1f} us  (x{old / new:.1f})')
+    print('chain:', ' -> '.join(game.take_last_outbreaks()[:8]), '...')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+
+from engine import Game, MAK_CONTAMINATION, VIRUS_UNITS_COUNT, VIRUS_COUNT, ROLE_DOCTOR, ROLE_SCIENTIST, shared_map
+from mapgen import generate, degree_stats
+from simulation import play_game, random_policy
+from benchmarks.suite import measure
+
+# как движок растет вместе с картой: от стандартных 48 городов до синтетических карт из mapgen.
+# Для каждого размера - время на город, чтобы нелинейность была видна сразу
+SIZES = [48, 100, 1000, 10000, 100000]
+ROLES = [ROLE_DOCTOR, ROLE_SCIENTIST]
+GAMES = 5
+# матрица расстояний RouteIndex занимает count^2 ячеек; на картах больше этого она не строится
+ROUTES_LIMIT = 3000
+
+
+def rounds_for(count, rounds):
+    # на больших картах раундов меньше, чтобы весь прогон укладывался в минуты
+    return max(3, min(rounds, rounds * 1000 // count))
+
+
+def bench_init(city_map, rounds):
+    seeds = iter(range(10 ** 9))
+    return measure(lambda _: Game(ROLES, next(seeds), city_map=city_map), rounds=rounds)
+
+
+def bench_infection(city_map, rounds):
+    # одно заражение каждого города без вспышек
+    game = Game(ROLES, 0, city_map=city_map)
+    cities = list(game.take_cities_list())
+
+    def setup():
+        for city in cities:
+            city.contamination = 0
+        game.viruses_units = [VIRUS_UNITS_COUNT * len(cities)] * VIRUS_COUNT
+        return game
+
+    def run(state):
+        for city in cities:
+            state.infection(city)
+
+    return measure(run, setup, rounds=rounds)
+
+
+def bench_outbreak(city_map, rounds):
+    # худший случай: все города заражены до предела, цепочка вспышек проходит по всей карте
+    game = Game(ROLES, 0, city_map=city_map)
+    cities = list(game.take_cities_list())
+    for city in cities:
+        city.contamination = MAK_CONTAMINATION
+    start = cities[0]
+
+    def setup():
+        game.viruses_units = [VIRUS_UNITS_COUNT * len(cities) * 10] * VIRUS_COUNT
+        game.scale_outbreaks = 0
+        game.game_over = False
+        game.last_outbreaks.clear()
+        return game
+
+    result = measure(lambda state: state.outbreak(start), setup, rounds=rounds)
+    result['chain'] = game.take_scale_outbreaks()
+    return result
+
+
+def bench_routes(city_map, rounds):
+    # матрица расстояний (общая на карту) и индекс станций партии
+    if len(city_map) > ROUTES_LIMIT:
+        return None
+    game = Game(ROLES, 0, city_map=city_map)
+    begin = time.perf_counter()
+    game.take_routes()
+    return {'median_us': (time.perf_counter() - begin) * 1e6, 'rounds': 1}
+
+
+def bench_games(city_map, games):
+    # целые партии случайной политики: партий и действий в секунду
+    begin = time.perf_counter()
+    actions = 0
+    for seed in range(games):
+        _, _, turns, _ = play_game(ROLES, random_policy, seed, city_map)
+        actions += turns
+    elapsed = time.perf_counter() - begin
+    return {'games_per_second': games / elapsed, 'turns_per_second': actions / elapsed,
+            'mean_turns': actions / games}
+
+
+def run_size(name, city_map, rounds, games):
+    count = len(city_map)
+    rounds = rounds_for(count, rounds)
+    result = degree_stats(city_map)
+    result['map'] = name
+    result['init'] = bench_init(city_map, rounds)
+    result['infection'] = bench_infection(city_map, rounds)
+    result['outbreak'] = bench_outbreak(city_map, rounds)
+    result['routes'] = bench_routes(city_map, rounds)
+    result['games'] = bench_games(city_map, games)
+    # время на город: у линейной операции оно не растет с картой
+    for key in ('init', 'infection', 'outbreak', 'routes'):
+        if result[key] is not None:
+            result[key]['per_city_us'] = result[key]['median_us'] / count
+    return result
+
+
+def print_report(results):
+    print(f'{"map":>8} {"cities":>7} {"init/city":>10} {"infect/city":>12} {"outbreak/city":>14} '
+          f'{"routes/city":>12} {"turns/s":>9}')
+    for result in results:
+        routes = result['routes']
+        print(f'{result["map"]:>8} {result["cities"]:>7} {result["init"]["per_city_us"]:>8.2f}us '
+              f'{result["infection"]["per_city_us"]:>10.3f}us {result["outbreak"]["per_city_us"]:>12.3f}us '
+              f'{routes["per_city_us"] if routes else float("nan"):>10.1f}us '
+              f'{result["games"]["turns_per_second"]:>9.0f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Масштабирование движка с размером карты')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='число городов синтетических карт')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--games', type=int, default=GAMES, help='партий на размер')
+    parser.add_argument('--degrees', default='poisson')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-gc', action='store_true',
+                        help='выключить циклический сборщик мусора: на больших картах он обходит все города')
+    parser.add_argument('--json', help='куда сохранить результат')
+    args = parser.parse_args()
+    if args.no_gc:
+        gc.disable()
+    maps = [('world', shared_map())]
+    for count in args.sizes:
+        maps.append((f'gen{count}', generate(count, args.degrees, seed=args.seed)))
+    results = []
+    for name, city_map in maps:
+        results.append(run_size(name, city_map, args.rounds, args.games))
+        print(f'{name}: done', file=sys.stderr)
+    print_report(results)
+    if args.json:
+        report = {'meta': {'python': platform.python_version(), 'machine': platform.machine(), 'gc': not args.no_gc,
+                           'time': time.strftime('%Y-%m-%dT%H:%M:%S')}, 'results': results}
+        with open(args.json, 'w', encoding='utf8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,306 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from engine import Game, CityMap, VIRUS_UNITS_COUNT, VIRUS_COUNT, ROLE_DOCTOR, ROLE_SCIENTIST, \
+    ROLE_QUARANTINE_SPECIALIST
+from snapshot import save_snapshot, load_snapshot
+from benchmarks.cascade import worst_case_game
+
+# набор замеров горячих мест движка и отрисовки; результат - JSON,
+# который можно сравнить с сохраненным ранее (базовым) результатом
+ROLES = [ROLE_DOCTOR, ROLE_SCIENTIST, ROLE_QUARANTINE_SPECIALIST]
+ROUNDS = 200
+# во сколько раз медиана может вырасти относительно базовой, прежде чем это считается регрессией
+THRESHOLD = 0.10
+
+
+def measure(run, setup=None, number=1, rounds=ROUNDS):
+    # время одного вызова run(state) в микросекундах; setup выполняется перед раундом и в замер не входит
+    times = []
+    for _ in range(rounds):
+        state = setup() if setup is not None else None
+        begin = time.perf_counter()
+        for _ in range(number):
+            run(state)
+        times.append((time.perf_counter() - begin) / number * 1e6)
+    return {
+        'best_us': min(times),
+        'median_us': statistics.median(times),
+        'rounds': rounds,
+        'number': number,
+    }
+
+
+def bench_map_load(rounds):
+    # холодная загрузка стандартной карты: разбор csv, индексы и соседи городов, контрольная сумма
+    return measure(lambda _: CityMap.load().checksum(), rounds=rounds)
+
+
+def bench_game_init(rounds):
+    # новая партия на уже загруженной общей карте: города и игроки, раздача колод, стартовое заражение
+    seeds = itertools.count()
+    return measure(lambda _: Game(ROLES, next(seeds)), rounds=rounds)
+
+
+def bench_infection(rounds):
+    # заражение каждого города карты по одному разу без вспышек
+    game = Game(ROLES, 0)
+    cities = list(game.take_cities_list())
+
+    def setup():
+        for city in cities:
+            city.contamination = 0
+        game.viruses_units = [VIRUS_UNITS_COUNT * 10] * VIRUS_COUNT
+        return game
+
+    def run(state):
+        for city in cities:
+            state.infection(city)
+
+    result = measure(run, setup, rounds=rounds)
+    result['per_call_us'] = result['median_us'] / len(cities)
+    return result
+
+
+def bench_outbreak(rounds):
+    # худший случай: все города заражены до предела, вспышка проходит по всей карте
+    # (без специалиста по карантину, который остановил бы ее у стартового города)
+    game = worst_case_game([ROLE_DOCTOR, ROLE_SCIENTIST])
+    start = game.cities['Атланта']
+
+    def run(state):
+        game.scale_outbreaks = 0
+        game.game_over = False
+        game.last_outbreaks.clear()
+        game.outbreak(start)
+
+    result = measure(run, number=20, rounds=rounds)
+    result['chain'] = game.take_scale_outbreaks()
+    return result
+
+
+def bench_transfer_motion(rounds):
+    # первые ходы свежих партий: добор карт и заражение городов
+    seeds = itertools.count()
+    return measure(lambda game: game.transfer_motion(), lambda: Game(ROLES, next(seeds)),
+                   number=5, rounds=rounds)
+
+
+def vaccine_game():
+    game = Game(ROLES, 0)
+    player = game.take_players()[0]
+    cards = [city.take_name() for city in game.take_cities_list() if city.take_virus() == 0][:5]
+    return game, player, cards
+
+
+def bench_create_vaccine(rounds):
+    game, player, cards = vaccine_game()
+
+    def setup():
+        for card in cards:
+            if not player.has_card(card):
+                player.add_card(card)
+        game.vaccines = [False] * VIRUS_COUNT
+        game.game_over = False
+        return game
+
+    return measure(lambda state: state.create_vaccine(player, 0, cards), setup, rounds=rounds * 10)
+
+
+def bench_check_combination(rounds):
+    game, player, cards = vaccine_game()
+    for card in cards:
+        if not player.has_card(card):
+            player.add_card(card)
+    return measure(lambda _: player.check_combination(cards), number=100, rounds=rounds)
+
+
+def bench_get_element(rounds):
+    # попадания в города и промахи по всей карте
+    game = Game(ROLES, 0)
+    points = [city.take_cords() for city in game.take_cities_list()]
+    points += [(x, y) for x in range(0, 1357, 97) for y in range(0, 628, 89)]
+    game.get_element(points[0])
+    coords = itertools.cycle(points)
+    return measure(lambda _: game.get_element(next(coords)), number=len(points), rounds=rounds)
+
+
+def init_display():
+    # отрисовка на внеэкранных поверхностях; окно не открывается
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    import main
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    return pygame, main
+
+
+def grid_map(side, step=60):
+    # синтетическая карта side x side городов: связи с соседями по сетке, вирусы по очереди
+    cities = [(num, f'Город {num}', ((num % side) * step + step // 2, (num // side) * step + step // 2),
+               num % VIRUS_COUNT) for num in range(side * side)]
+    graph = [(num, num + 1) for num in range(side * side) if num % side != side - 1]
+    graph += [(num, num + side) for num in range(side * side - side)]
+    return CityMap(cities, graph)
+
+
+def bench_frame(rounds):
+    # кадр стандартной карты через FrameRenderer, как в главном цикле: целиком (после сдвига окна)
+    # и кадр, где меняется только обводка города под курсором
+    pygame, main = init_display()
+    screen = pygame.Surface((main.IMAGE_W, main.IMAGE_H + 100))
+    city_map = main.load_map(main.MAP_FILE)
+    game = Game(ROLES, 0, city_map=city_map)
+    view = main.MapView(game, main.load_image(city_map.layout.image), *screen.get_size())
+    renderer = main.FrameRenderer(screen, view.static_map)
+    buttons = [button for button in main.make_buttons(game) if button.is_available(game.take_players()[0])]
+    map_layer = main.map_widgets(game, view)
+    hud_layer = main.hud_widgets(game, buttons)
+
+    def full(_):
+        renderer.set_static(view.static_map)
+        renderer.render(map_layer, hud_layer)
+
+    shapes = itertools.cycle([view.hit_index.shape(town) for town in view.visible])
+
+    def hover(_):
+        shape = next(shapes)
+        renderer.render(map_layer + [('hovered', shape, lambda screen: main.show_hovered(screen, shape))],
+                        hud_layer)
+
+    result = measure(full, rounds=rounds)
+    result['hover'] = measure(hover, number=10, rounds=rounds)
+    return result
+
+
+def bench_viewport(rounds):
+    # сдвиг окна по карте из 10^4 городов: отбор видимых городов и связей, статический слой, сетка попаданий
+    pygame, main = init_display()
+    game = Game(ROLES, 0, city_map=grid_map(100))
+    view = main.MapView(game, None, main.IMAGE_W, main.IMAGE_H + 100)
+    steps = itertools.cycle([(-300, -200)] * 10 + [(300, 200)] * 10)
+
+    def run(_):
+        view.viewport.pan(*next(steps))
+        view.refresh()
+
+    result = measure(run, rounds=rounds)
+    result['cities'] = len(game.map)
+    result['visible'] = len(view.visible)
+    return result
+
+
+def bench_snapshot(rounds):
+    # снимок партии в середине игры: запись и восстановление
+    game = Game(ROLES, 0)
+    for _ in range(20):
+        game.spending_action()
+    data = save_snapshot(game)
+    result = measure(lambda _: save_snapshot(game), number=10, rounds=rounds)
+    result['load'] = measure(lambda _: load_snapshot(data), number=10, rounds=rounds)
+    result['bytes'] = len(data)
+    return result
+
+
+def bench_risk(rounds):
+    # риск заражения и вспышки всех городов сразу после вытягивания карты заражения
+    game = Game(ROLES, 0)
+    risk = game.take_risk()
+    cities = list(game.take_cities_list())
+
+    def setup():
+        risk.key = None
+        return risk
+
+    return measure(lambda state: state.risks(cities), setup, rounds=rounds)
+
+
+BENCHMARKS = {
+    'map_load': bench_map_load,
+    'game_init': bench_game_init,
+    'infection': bench_infection,
+    'outbreak': bench_outbreak,
+    'transfer_motion': bench_transfer_motion,
+    'create_vaccine': bench_create_vaccine,
+    'check_combination': bench_check_combination,
+    'get_element': bench_get_element,
+    'frame': bench_frame,
+    'viewport': bench_viewport,
+    'snapshot': bench_snapshot,
+    'risk': bench_risk,
+}
+
+
+def run_suite(names, rounds=ROUNDS):
+    results = dict()
+    for name in names:
+        results[name] = BENCHMARKS[name](rounds)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'rounds': rounds,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold=THRESHOLD):
+    # отношение медиан к базовому замеру; возвращает имена замеров, ставших медленнее порога
+    regressions = []
+    for name, result in report['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            result['ratio'] = None
+            continue
+        ratio = result['median_us'] / base['median_us']
+        result['ratio'] = ratio
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def print_report(report, regressions):
+    for name, result in report['results'].items():
+        line = f'{name:18} {result["median_us"]:12.2f} us  (best {result["best_us"]:.2f})'
+        ratio = result.get('ratio')
+        if ratio is not None:
+            line += f'  x{ratio:.2f}'
+            if name in regressions:
+                line += '  REGRESSION'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры производительности движка и отрисовки')
+    parser.add_argument('names', nargs='*', help='замеры: ' + ', '.join(BENCHMARKS))
+    parser.add_argument('--rounds', type=int, default=ROUNDS)
+    parser.add_argument('--json', help='куда сохранить результат')
+    parser.add_argument('--baseline', help='JSON с результатом, с которым сравнивать')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error('неизвестные замеры: ' + ', '.join(unknown))
+    report = run_suite(args.names or list(BENCHMARKS), args.rounds)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf8') as file:
+            regressions = compare(report, json.load(file), args.threshold)
+    print_report(report, regressions)
+    if args.json:
+        with open(args.json, 'w', encoding='utf8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+from array import array
+from collections import deque
+
+
+class OutbreakCascade:
+    # разрешение цепочки вспышек без выделения памяти на каждый вызов:
+    # метки посещения по номеру поколения, переиспользуемая очередь и целые списки соседей
+    def __init__(self, towns, blocked=None, neighbors=None, viruses=None):
+        # blocked - маска городов под защитой специалиста по карантину (Game.protected), ее ведет игра;
+        # neighbors - готовые списки соседей по номерам (CityMap.neighbors), иначе берутся из городов.
+        # Без towns (уровни заражения в списке, как в GameState) нужны neighbors и viruses карты,
+        # и цепочку разрешает resolve_levels
+        if towns is None:
+            self.towns = None
+            count = len(neighbors)
+        else:
+            self.towns = sorted(towns, key=lambda town: town.take_num())
+            count = len(self.towns)
+            if neighbors is None:
+                neighbors = tuple(tuple(sorted(neig.take_num() for neig in town.take_neighbors()))
+                                  for town in self.towns)
+            viruses = tuple(town.take_virus() for town in self.towns)
+        self.neighbors = neighbors
+        self.viruses = viruses
+        self.visited = array('I', [0]) * count
+        self.generation = 0
+        self.work = deque()
+        self.chain = []
+        # города, получившие кубик в последнем вызове resolve_levels
+        self.infected = []
+        if blocked is None:
+            blocked = bytearray(count)
+        self.blocked = blocked
+
+    def next_generation(self):
+        self.generation += 1
+        if self.generation == 0xFFFFFFFF:
+            self.visited = array('I', [0]) * len(self.visited)
+            self.generation = 1
+        return self.generation
+
+    def resolve(self, start, viruses_units, victory_over_viruses):
+        # start - номер города, в котором произошла вспышка;
+        # возвращает (цепочка городов со вспышками по порядку, кончились ли кубики какого-то вируса)
+        generation = self.next_generation()
+        visited = self.visited
+        blocked = self.blocked
+        neighbors = self.neighbors
+        viruses = self.viruses
+        towns = self.towns
+        work = self.work
+        chain = self.chain
+        work.clear()
+        chain.clear()
+        visited[start] = generation
+        work.append(start)
+        chain.append(start)
+        exhausted = False
+        while work:
+            for neig in neighbors[work.popleft()]:
+                if visited[neig] == generation:
+                    continue
+                visited[neig] = generation
+                virus = viruses[neig]
+                if blocked[neig] or victory_over_viruses[virus] or viruses_units[virus] == 0:
+                    continue
+                if towns[neig].infection():
+                    viruses_units[virus] -= 1
+                    if viruses_units[virus] == 0:
+                        exhausted = True
+                else:
+                    chain.append(neig)
+                    work.append(neig)
+        return chain, exhausted
+
+    def resolve_levels(self, start, contamination, limit, blocked, viruses_units, victory_over_viruses):
+        # то же над списком уровней заражения по номеру города; limit - уровень, после которого
+        # кубик вызывает вспышку, blocked - маска защиты этого состояния
+        generation = self.next_generation()
+        visited = self.visited
+        neighbors = self.neighbors
+        viruses = self.viruses
+        work = self.work
+        chain = self.chain
+        infected = self.infected
+        work.clear()
+        chain.clear()
+        infected.clear()
+        visited[start] = generation
+        work.append(start)
+        chain.append(start)
+        exhausted = False
+        while work:
+            for neig in neighbors[work.popleft()]:
+                if visited[neig] == generation:
+                    continue
+                visited[neig] = generation
+                virus = viruses[neig]
+                if blocked[neig] or victory_over_viruses[virus] or viruses_units[virus] == 0:
+                    continue
+                if contamination[neig] < limit:
+                    contamination[neig] += 1
+                    infected.append(neig)
+                    viruses_units[virus] -= 1
+                    if viruses_units[virus] == 0:
+                        exhausted = True
+                else:
+                    chain.append(neig)
+                    work.append(neig)
+        return chain, exhausted
@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from engine import ROLE_DOCTOR, ROLE_SCIENTIST, ROLE_DISPATCHER
+from server import GameServer
+
+# клиент сервера партий и сценарий для локальной проверки: много партий одновременно,
+# каждая со случайными ходами, затем выгрузка простаивающих партий и их восстановление
+
+
+class Client:
+    # по одному соединению могут идти запросы нескольких партий сразу:
+    # ответы разбирает отдельная задача и передает их ожидающим по номеру запроса
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count(1)
+        self.waiting = dict()
+        self.events = []
+        self.listener = asyncio.create_task(self.listen())
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=8765, path=None):
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def listen(self):
+        # рассылки сервера складываются в events
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                future = self.waiting.pop(message.get('id'), None)
+                if future is not None:
+                    future.set_result(message)
+                else:
+                    self.events.append(message)
+        finally:
+            for future in self.waiting.values():
+                future.set_exception(ConnectionError('Сервер закрыл соединение'))
+            self.waiting.clear()
+
+    async def request(self, op, **fields):
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[request_id] = future
+        fields.update(op=op, id=request_id)
+        self.writer.write(json.dumps(fields, ensure_ascii=False).encode('utf8') + b'\n')
+        await self.writer.drain()
+        return await future
+
+    async def close(self):
+        self.listener.cancel()
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def random_action(state, city_map, rng):
+    # лечение, если в городе текущего игрока есть заражение, иначе переход в случайный соседний город
+    player = state['players'][state['current']]
+    city = city_map['names'].index(player['location'])
+    if state['contamination'][city] > 0 and rng.random() < 0.5:
+        return 'fighting_virus', {}
+    neighbor = rng.choice(city_map['neighbors'][city])
+    return 'action_with_city', {'city': city_map['names'][neighbor]}
+
+
+async def play(client, city_map, roles, moves, rng):
+    # одна партия: клиент занимает все места и делает moves действий
+    created = await client.request('create', roles=roles, seed=rng.randrange(2 ** 32))
+    game_id = created['game']
+    for seat in range(len(roles)):
+        joined = await client.request('join', game=game_id, seat=seat)
+    state = joined['state']
+    done = 0
+    for _ in range(moves):
+        if state['game_over']:
+            break
+        action, args = random_action(state, city_map, rng)
+        response = await client.request('act', game=game_id, action=action, args=args)
+        if not response['ok']:
+            raise RuntimeError(response['error'])
+        done += 1
+        state = (await client.request('state', game=game_id))['state']
+    return game_id, state, done
+
+
+async def scenario(args):
+    server = None
+    if args.serve:
+        server = GameServer(args.idle, args.idle / 2) if args.idle else GameServer()
+        await server.start(args.host, args.port, args.unix)
+    client = await Client.connect(args.host, args.port, args.unix)
+    city_map = await client.request('map')
+    rng = random.Random(args.seed)
+    roles = [ROLE_DOCTOR, ROLE_SCIENTIST, ROLE_DISPATCHER]
+    begin = time.perf_counter()
+    results = await asyncio.gather(*(play(client, city_map, roles, args.moves, random.Random(rng.random()))
+                                     for _ in range(args.games)))
+    elapsed = time.perf_counter() - begin
+    actions = sum(result[2] for result in results)
+    print(f'games: {len(results)}, actions: {actions}, {actions / elapsed:.0f} actions/s')
+    if args.idle:
+        # после простоя партии выгружаются; состояние после восстановления должно совпасть
+        await asyncio.sleep(args.idle * 2)
+        listed = await client.request('list')
+        print(f'active: {len(listed["active"])}, archived: {len(listed["archived"])}')
+        mismatches = 0
+        for game_id, state, _ in results:
+            restored = await client.request('state', game=game_id)
+            mismatches += restored['state'] != state
+        print(f'restored: {len(results)}, mismatches: {mismatches}')
+    await client.close()
+    if server is not None:
+        await server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Сценарий проверки сервера партий')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='путь Unix-сокета вместо TCP')
+    parser.add_argument('--serve', action='store_true', help='запустить сервер в этом же процессе')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--moves', type=int, default=40)
+    parser.add_argument('--idle', type=float, default=0, help='проверить выгрузку партий после простоя, секунд')
+    parser.add_argument('--seed', type=int, default=0)
+    asyncio.run(scenario(parser.parse_args()))
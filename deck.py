@@ -0,0 +1,58 @@
+class Deck:
+    # колода на плоском списке номеров карт: курсор вытягивания, сброс (уже вытянутые карты cards[:pos])
+    # и число оставшихся карт каждого вида, которое меняется вместе с курсором;
+    # карта с номером -1 (усиление заражаемости) считается в последней ячейке таблицы
+    def __init__(self, cards, kinds):
+        self.cards = list(cards)
+        self.pos = 0
+        self.counts = [0] * (kinds + 1)
+        for card in self.cards:
+            self.counts[card] += 1
+
+    @classmethod
+    def restore(cls, cards, pos, kinds):
+        # колода с уже вытянутыми pos картами (например, из снимка партии)
+        deck = cls(cards, kinds)
+        for card in deck.cards[:pos]:
+            deck.counts[card] -= 1
+        deck.pos = pos
+        return deck
+
+    def clone(self):
+        deck = Deck.__new__(Deck)
+        deck.cards = self.cards.copy()
+        deck.pos = self.pos
+        deck.counts = self.counts.copy()
+        return deck
+
+    def __len__(self):
+        return len(self.cards) - self.pos
+
+    def remaining(self):
+        return len(self.cards) - self.pos
+
+    def count(self, card):
+        # сколько карт этого вида еще в колоде
+        return self.counts[card]
+
+    def peek(self, k=1):
+        return self.cards[self.pos:self.pos + k]
+
+    def draw(self):
+        if self.pos == len(self.cards):
+            return None
+        card = self.cards[self.pos]
+        self.pos += 1
+        self.counts[card] -= 1
+        return card
+
+    def discarded(self):
+        return self.cards[:self.pos]
+
+    def reshuffle(self, rng):
+        # сброс возвращается в колоду, и вся колода перемешивается на месте
+        counts = self.counts
+        for card in self.cards[:self.pos]:
+            counts[card] += 1
+        rng.shuffle(self.cards)
+        self.pos = 0
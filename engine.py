@@ -0,0 +1,810 @@
+import csv
+import random
+import zlib
+from array import array
+
+from cascade import OutbreakCascade
+from deck import Deck
+from risk import OutbreakRisk
+from routes import RouteIndex
+from spatial import SpatialIndex
+from zobrist import StateHash, ZobristKeys, copy_key, fold_counters
+
+# параметры игровых механик
+MAK_CONTAMINATION = 4
+INFECTION_CARD_NAME = 'Усиление зарожаемости'
+INFECTION_CARDS_COUNT = 6
+HOW_TAKE = 2
+MAX_OUTBREAKS_COUNT = 8
+INFECTIVITY = [2, 2, 2, 3, 3, 4, 4]
+VIRUS_COUNT = 4
+VIRUS_UNITS_COUNT = 24
+START_GROUPS_SIZE = 3
+MAX_CARDS_IN_HAND = 7
+PLAYER_ACTIONS = 4
+START_PLAYERS_CARDS = 6
+# сколько карт одного вируса нужно для вакцины
+CURE_CARDS = 5
+SCIENTIST_CURE_CARDS = 4
+START = 'Атланта'
+# радиус города, в пределах которого засчитывается нажатие
+CITY_RADIUS = 15
+# параметры победителя
+GAME_WIN = False
+PLAYERS_WIN = True
+# причины поражения
+LOSS_OUTBREAKS = 1
+LOSS_VIRUS_UNITS = 2
+LOSS_PLAYER_PACK = 3
+# игровые роли
+ROLE_DISPATCHER = 1
+ROLE_DOCTOR = 2
+ROLE_SCIENTIST = 3
+ROLE_RESEARCHER = 4
+ROLE_ENGINEER = 5
+ROLE_QUARANTINE_SPECIALIST = 6
+ROLES = ['Диспетчер', 'Доктор', 'Ученый', 'Исследователь', 'Инженер', 'Специалист по карантину', 'Нет']
+NUMBER_BY_ROLE = {
+    'Диспетчер': 1, 'Доктор': 2, 'Ученый': 3, 'Исследователь': 4, 'Инженер': 5, 'Специалист по карантину': 6, 'Нет': -1
+}
+# номер карты усиления заражаемости в колоде игроков
+INFECTION_CARD = -1
+# ключи городов без хеша позиции (город вне партии)
+NO_KEYS = (0,) * (MAK_CONTAMINATION + 1)
+# счетчики партии в хеше позиции: ход, осталось действий, текущий игрок, вспышки, заражаемость,
+# вакцины, осталось карт в колодах игроков и заражения, исход
+HASH_COUNTERS = 9
+
+_shared_map = None
+
+
+def cure_size(role):
+    # сколько карт одного вируса нужно игроку с этой ролью для вакцины
+    return SCIENTIST_CURE_CARDS if role == ROLE_SCIENTIST else CURE_CARDS
+
+
+def load_cities(path='cities.csv'):
+    # загрузка городов из csv-файла
+    cities = []
+    with open(path, encoding="utf8") as csvfile:
+        reader = csv.reader(csvfile, delimiter=';', quotechar='"')
+        for record in reader:
+            num = int(record[0]) - 1
+            name = record[1]
+            cords = (int(record[2]), int(record[3]))
+            virus = int(record[4]) - 1
+            cities.append((num, name, cords, virus))
+    return cities
+
+
+def load_cities_graph(path='graph.csv'):
+    # загрузка связей между городами из csv-файла
+    graph = []
+    with open(path, encoding="utf8") as csvfile:
+        reader = csv.reader(csvfile, delimiter=';', quotechar='"')
+        for record in reader:
+            c_1 = int(record[0]) - 1
+            c_2 = int(record[1]) - 1
+            graph.append((c_1, c_2))
+    return graph
+
+
+class CityMap:
+    # неизменяемая топология карты, общая для всех партий и копий состояния;
+    # start - город, где начинают игроки и стоит первая станция (по умолчанию START или первый город),
+    # layout - оформление карты для отрисовки (mapfile.MapLayout), если карта загружена из файла карты
+    def __init__(self, cities, graph, start=None):
+        self.names = tuple(city[1] for city in cities)
+        self.cords = tuple(city[2] for city in cities)
+        self.viruses = tuple(city[3] for city in cities)
+        self.index = {name: num for num, name in enumerate(self.names)}
+        neighbors = [set() for _ in cities]
+        for c_1, c_2 in graph:
+            neighbors[c_1].add(c_2)
+            neighbors[c_2].add(c_1)
+        self.neighbors = tuple(tuple(sorted(group)) for group in neighbors)
+        self.neighbor_sets = tuple(frozenset(group) for group in neighbors)
+        self.edges = tuple(graph)
+        self.virus_of = dict(zip(self.names, self.viruses))
+        if start is None:
+            start = START if START in self.index else self.names[0]
+        self.start = start
+        self.layout = None
+        self.crc = None
+        self.zobrist = None
+
+    @classmethod
+    def load(cls, cities_path='cities.csv', graph_path='graph.csv'):
+        return cls(load_cities(cities_path), load_cities_graph(graph_path))
+
+    def __len__(self):
+        return len(self.names)
+
+    def card_id(self, card):
+        if card == INFECTION_CARD_NAME:
+            return INFECTION_CARD
+        return self.index[card]
+
+    def card_name(self, card):
+        if card == INFECTION_CARD:
+            return INFECTION_CARD_NAME
+        return self.names[card]
+
+    def checksum(self):
+        # контрольная сумма названий и связей: по ней снимок партии проверяет, что карта та же
+        if self.crc is None:
+            crc = zlib.crc32('\n'.join(self.names).encode('utf8'))
+            self.crc = zlib.crc32(array('I', [city for edge in self.edges for city in edge]).tobytes(), crc)
+        return self.crc
+
+    def zobrist_keys(self):
+        # ключи хеша позиции создаются при первой партии на карте
+        if self.zobrist is None:
+            self.zobrist = ZobristKeys(len(self), MAK_CONTAMINATION + 1, HASH_COUNTERS)
+        return self.zobrist
+
+
+def shared_map():
+    # файлы карты разбираются один раз на процесс, дальше все партии используют готовый объект
+    global _shared_map
+    if _shared_map is None:
+        _shared_map = CityMap.load()
+    return _shared_map
+
+
+class Town:
+    def __init__(self, num, name, cords, virus, state_hash=None, keys=NO_KEYS, station_key=0):
+        self.num = num
+        self.name = name
+        self.cords = cords
+        self.virus = virus
+
+        self.players = set()
+        self.station = False
+        self.contamination = 0
+        self.neighbors = set()
+        self.station_listeners = []
+        # хеш позиции партии и ключи города в нем: по уровню заражения и за станцию
+        self.state_hash = StateHash() if state_hash is None else state_hash
+        self.keys = keys
+        self.station_key = station_key
+
+    def take_num(self):
+        return self.num
+
+    def take_name(self):
+        return self.name
+
+    def take_cords(self):
+        return self.cords
+
+    def take_virus(self):
+        return self.virus
+
+    def add_player(self, player):
+        self.players.add(player)
+
+    def del_player(self, player):
+        self.players.discard(player)
+
+    def is_station(self):
+        return self.station
+
+    def build_station(self):
+        if self.station:
+            return
+        self.station = True
+        self.state_hash.value ^= self.station_key
+        for listener in self.station_listeners:
+            listener(self)
+
+    def infection(self):
+        if self.contamination == MAK_CONTAMINATION:
+            return False
+        self.contamination += 1
+        self.state_hash.value ^= self.keys[self.contamination - 1] ^ self.keys[self.contamination]
+        return True
+
+    def medication(self):
+        if self.contamination == 0:
+            return False
+        self.contamination -= 1
+        self.state_hash.value ^= self.keys[self.contamination + 1] ^ self.keys[self.contamination]
+        return True
+
+    def nullify_contamination(self):
+        self.state_hash.value ^= self.keys[self.contamination]
+        self.contamination = 0
+
+    def take_contamination(self):
+        return self.contamination
+
+    def take_players(self):
+        return self.players
+
+    def add_neighbor(self, city):
+        self.neighbors.add(city)
+
+    def set_neighbors(self, cities):
+        self.neighbors = set(cities)
+
+    def take_neighbors(self):
+        return self.neighbors
+
+
+class Player:
+    def __init__(self, num, role, location, virus_of, state_hash=None, card_keys=None, card_index=None):
+        # virus_of - вирус по названию карты города (CityMap.virus_of);
+        # card_keys - ключи карт в хеше позиции по номеру карты (CityMap.index), последний - карта не города
+        self.num = num
+        self.role = role
+        self.location = location
+        # рука - мультимножество карт (карта -> сколько таких на руке)
+        # и число карт каждого вируса, которое меняется вместе с рукой
+        self.hand = dict()
+        self.cards_count = 0
+        self.colors = [0] * VIRUS_COUNT
+        self.virus_of = virus_of
+        self.cure_size = cure_size(role)
+        self.state_hash = StateHash() if state_hash is None else state_hash
+        self.card_keys = array('Q', [0]) if card_keys is None else card_keys
+        self.card_index = dict() if card_index is None else card_index
+
+    def take_location(self):
+        return self.location
+
+    def set_location(self, location):
+        self.location = location
+
+    def take_role(self):
+        return self.role
+
+    def take_num(self):
+        return self.num
+
+    def add_card(self, card):
+        count = self.hand.get(card, 0) + 1
+        self.hand[card] = count
+        key = self.card_keys[self.card_index.get(card, -1)]
+        self.state_hash.value ^= key if count == 1 else copy_key(key, count)
+        self.cards_count += 1
+        virus = self.virus_of.get(card)
+        if virus is not None:
+            self.colors[virus] += 1
+
+    def del_card(self, card):
+        count = self.hand.get(card, 0)
+        if count == 0:
+            return False
+        key = self.card_keys[self.card_index.get(card, -1)]
+        self.state_hash.value ^= key if count == 1 else copy_key(key, count)
+        if count == 1:
+            del self.hand[card]
+        else:
+            self.hand[card] = count - 1
+        self.cards_count -= 1
+        virus = self.virus_of.get(card)
+        if virus is not None:
+            self.colors[virus] -= 1
+        return True
+
+    def has_card(self, card):
+        return card in self.hand
+
+    def take_hand(self):
+        return [card for card, count in self.hand.items() for _ in range(count)]
+
+    def take_hand_size(self):
+        return self.cards_count
+
+    def take_cure_size(self):
+        return self.cure_size
+
+    def can_cure(self, virus):
+        # хватает ли карт вируса на вакцину с учетом скидки ученого
+        return self.colors[virus] >= self.cure_size
+
+    def cards_of(self, virus):
+        return [card for card in self.take_hand() if self.virus_of.get(card) == virus]
+
+    def check_combination(self, cards):
+        # на руке есть все карты списка с учетом повторов
+        hand = self.hand
+        need = dict()
+        for card in cards:
+            count = need.get(card, 0) + 1
+            if hand.get(card, 0) < count:
+                return False
+            need[card] = count
+        return True
+
+
+def logged(method):
+    # успешные действия игроков записываются в журнал партии, если он подключен;
+    # вложенные вызовы (например, fighting_virus из action_with_city) не записываются
+    def wrapper(self, *args):
+        log = self.log
+        if log is None or log.busy:
+            return method(self, *args)
+        # действие пишется до выполнения, чтобы вытянутые им карты шли в журнале после него
+        mark = log.record_action(self, method.__name__, args)
+        log.busy = True
+        result = None
+        try:
+            result = method(self, *args)
+        finally:
+            log.busy = False
+            if not result:
+                log.cancel(mark)
+        return result
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+class Game:
+    def __init__(self, players, seed=None, log=None, city_map=None):
+        # seed задает собственный генератор партии, log - журнал действий (ActionLog),
+        # city_map - карта (по умолчанию общая карта из cities.csv и graph.csv)
+        if seed is None:
+            seed = random.randrange(2 ** 63)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.log = log
+        self.turn = 0
+        if city_map is None:
+            city_map = shared_map()
+        self.setup_board(players, city_map)
+        if log is not None:
+            log.start(self)
+
+        # колоды хранят номера карт: номер города или INFECTION_CARD
+        count = len(city_map)
+        cards = list(range(count))
+        self.rng.shuffle(cards)
+        start_cards = cards[:(START_PLAYERS_CARDS - len(self.players)) * len(players)]
+        cards = cards[(START_PLAYERS_CARDS - len(self.players)) * len(players):]
+        stack_len = len(cards) // INFECTION_CARDS_COUNT
+        stacks = []
+        for _ in range(INFECTION_CARDS_COUNT):
+            stacks.append(cards[:stack_len])
+            cards = cards[stack_len:]
+        stacks[-1] += cards
+        cards = start_cards
+        for stack in stacks:
+            stack.append(INFECTION_CARD)
+            self.rng.shuffle(stack)
+            cards += stack
+        self.players_pack = Deck(cards, count)
+        # первые 3 * START_GROUPS_SIZE карт заражения - разные города: они выбираются сразу,
+        # а остаток колоды перемешивается один раз вместо перемешивания всей колоды до успеха
+        first = self.rng.sample(range(count), 3 * START_GROUPS_SIZE)
+        chosen = set(first)
+        cards = list(range(count)) * MAK_CONTAMINATION + [city for city in range(count) if city not in chosen]
+        self.rng.shuffle(cards)
+        self.infection_pack = Deck(first + cards, count)
+
+        for player in self.players:
+            for _ in range(START_PLAYERS_CARDS - len(self.players)):
+                player.add_card(self.open_players_card())
+
+        self.scale_outbreaks = 0
+        self.scale_infectivity = 0
+        self.vaccines = [False] * VIRUS_COUNT
+        self.viruses_units = [VIRUS_UNITS_COUNT] * VIRUS_COUNT
+        self.victory_over_viruses = [False] * VIRUS_COUNT
+        self.game_over = False
+        self.winner = None
+        self.loss_reason = None
+        self.last_infections = []
+        self.last_outbreaks = []
+        self._reset_caches()
+
+        for units_count in range(1, 4):
+            for i in range(START_GROUPS_SIZE):
+                card = self.open_infections_card()
+                for _ in range(units_count):
+                    self.last_infections.append(card)
+                    self.infection(self.cities[card])
+
+        self.remaining_actions = PLAYER_ACTIONS
+        self.current_player = self.players[0]
+
+    def _reset_caches(self):
+        # производные структуры (цепочки вспышек, расстояния, сетка попаданий, риск) строятся
+        # при первом обращении; общая часть новой партии и восстановления из снимка
+        self.cascade = None
+        self.routes = None
+        self.hit_index = None
+        self.risk = None
+
+    def setup_board(self, players, city_map):
+        # города, связи и игроки в стартовом городе - общая часть новой партии и восстановления из снимка
+        self.map = city_map
+        count = len(city_map)
+        # хеш позиции ведут города и игроки при каждом изменении, счетчики партии добавляются при чтении
+        self.state_hash = StateHash()
+        keys = city_map.zobrist_keys()
+        towns = [Town(num, name, cords, virus, self.state_hash, keys.towns[num], keys.stations[num])
+                 for num, (name, cords, virus) in enumerate(zip(city_map.names, city_map.cords, city_map.viruses))]
+        for town, neighbors in zip(towns, city_map.neighbors):
+            town.set_neighbors(towns[neig] for neig in neighbors)
+        self.cities = {town.take_name(): town for town in towns}
+        start = self.cities[city_map.start]
+        start.build_station()
+        self.players = []
+        self.location_keys = []
+        for i in range(len(players)):
+            locations, cards = keys.player(i)
+            self.players.append(Player(i, players[i], start, city_map.virus_of, self.state_hash, cards,
+                                       city_map.index))
+            start.add_player(self.players[-1])
+            self.location_keys.append(locations)
+            self.state_hash.value ^= locations[start.take_num()]
+        # игрок по роли (первый, если роль повторяется)
+        self.by_role = dict()
+        for player in reversed(self.players):
+            self.by_role[player.take_role()] = player
+        # города под защитой специалиста по карантину: город, где он стоит, и соседи;
+        # маска меняется только при его перемещении в move_player
+        self.protected = bytearray(count)
+        self.specialist = self.by_role.get(ROLE_QUARANTINE_SPECIALIST)
+        if self.specialist is not None:
+            self.set_protection(self.specialist.take_location().take_num(), 1)
+        self.cities_graph = [(towns[c_1], towns[c_2]) for c_1, c_2 in city_map.edges]
+
+    def take_cities_list(self):
+        return self.cities.values()
+
+    def take_cities_graph(self):
+        return self.cities_graph
+
+    def take_routes(self):
+        # индекс расстояний создается при первом обращении
+        if self.routes is None:
+            self.routes = RouteIndex(self.cities.values(), self.map.edges)
+        return self.routes
+
+    def distance(self, city_1, city_2):
+        return self.take_routes().distance(city_1, city_2)
+
+    def reachable(self, player, actions):
+        return self.take_routes().reachable(player, actions)
+
+    def take_hit_index(self):
+        # сетка по координатам городов создается при первом обращении
+        if self.hit_index is None:
+            self.hit_index = SpatialIndex()
+            for city in self.cities.values():
+                x, y = city.take_cords()
+                self.hit_index.add(x, y, CITY_RADIUS, city)
+        return self.hit_index
+
+    def get_element(self, coord):
+        return self.take_hit_index().find(coord)
+
+    def infection(self, city):
+        if self.victory_over_viruses[city.take_virus()]:
+            return True
+        if self.viruses_units[city.take_virus()] == 0:
+            return True
+        if self.protected[city.take_num()]:
+            return True
+        if city.infection():
+            self.viruses_units[city.take_virus()] -= 1
+            if self.viruses_units[city.take_virus()] == 0:
+                self.finish(GAME_WIN, LOSS_VIRUS_UNITS)
+            return True
+        return False
+
+    def medication(self, player, city):
+        if player.take_role() == ROLE_DOCTOR or self.vaccines[city.take_virus()]:
+            if city.take_contamination() > 0:
+                self.viruses_units[city.take_virus()] += city.take_contamination()
+                city.nullify_contamination()
+                if self.vaccines[city.take_virus()] and \
+                        self.viruses_units[city.take_virus()] == VIRUS_UNITS_COUNT:
+                    self.victory_over_viruses[city.take_virus()] = True
+                return True
+            return False
+        if city.medication():
+            self.viruses_units[city.take_virus()] += 1
+            if self.vaccines[city.take_virus()] and \
+                    self.viruses_units[city.take_virus()] == VIRUS_UNITS_COUNT:
+                self.victory_over_viruses[city.take_virus()] = True
+            return True
+        return False
+
+    def take_risk(self):
+        # оценка риска заражения и вспышек на следующем ходу создается при первом обращении
+        if self.risk is None:
+            self.risk = OutbreakRisk(self, MAK_CONTAMINATION)
+        return self.risk
+
+    def take_viruses_unit(self):
+        return self.viruses_units
+
+    def take_cascade(self):
+        if self.cascade is None:
+            self.cascade = OutbreakCascade(self.cities.values(), self.protected, self.map.neighbors)
+        return self.cascade
+
+    def outbreak(self, start_city):
+        cascade = self.take_cascade()
+        chain, exhausted = cascade.resolve(start_city.take_num(), self.viruses_units, self.victory_over_viruses)
+        self.scale_outbreaks += len(chain)
+        self.last_outbreaks.extend(cascade.towns[city].take_name() for city in chain)
+        if exhausted:
+            self.finish(GAME_WIN, LOSS_VIRUS_UNITS)
+        if self.scale_outbreaks >= MAX_OUTBREAKS_COUNT:
+            self.finish(GAME_WIN, LOSS_OUTBREAKS)
+
+    def finish(self, winner, reason=None):
+        # партия заканчивается первым наступившим исходом
+        if self.game_over:
+            return
+        self.game_over = True
+        self.winner = winner
+        self.loss_reason = reason
+
+    def set_protection(self, city, value):
+        self.protected[city] = value
+        for neig in self.map.neighbors[city]:
+            self.protected[neig] = value
+
+    def move_player(self, player, city):
+        locations = self.location_keys[player.take_num()]
+        self.state_hash.value ^= locations[player.take_location().take_num()] ^ locations[city.take_num()]
+        if player is self.specialist:
+            self.set_protection(player.take_location().take_num(), 0)
+            self.set_protection(city.take_num(), 1)
+        player.take_location().del_player(player)
+        city.add_player(player)
+        player.set_location(city)
+        if player.take_role() == ROLE_DOCTOR and self.vaccines[city.take_virus()]:
+            self.medication(player, city)
+
+    def open_players_card(self):
+        card = self.players_pack.draw()
+        if card is not None:
+            card = self.map.card_name(card)
+        if self.log is not None:
+            self.log.record_players_card(self, card)
+        return card
+
+    def open_infections_card(self):
+        card = self.infection_pack.draw()
+        if card is None:
+            self.infection_pack.reshuffle(self.rng)
+            card = self.infection_pack.draw()
+        card = self.map.names[card]
+        if self.log is not None:
+            self.log.record_infections_card(self, card)
+        return card
+
+    def receiving_cards(self, player):
+        for _ in range(HOW_TAKE):
+            if player.take_hand_size() == MAX_CARDS_IN_HAND:
+                break
+            card = self.open_players_card()
+            if card is None:
+                self.finish(GAME_WIN, LOSS_PLAYER_PACK)
+                break
+            if card == INFECTION_CARD_NAME:
+                self.scale_infectivity += 1
+            else:
+                player.add_card(card)
+
+    @logged
+    def transfer_card(self, player_from, player_to, card):
+        if not player_from.has_card(card):
+            return False
+        if player_to.take_location() == player_from.take_location() or \
+                player_to.take_role() == ROLE_RESEARCHER or player_from.take_role() == ROLE_RESEARCHER:
+            player_from.del_card(card)
+            player_to.add_card(card)
+            return True
+        return False
+
+    @logged
+    def create_vaccine(self, player, virus, cards):
+        if self.vaccines[virus]:
+            return False
+        if INFECTION_CARD_NAME in cards:
+            return False
+        need = player.take_cure_size()
+        if len(cards) < need:
+            return False
+        cards = cards[:need]
+        virus_of = self.map.virus_of
+        if player.check_combination(cards) and all(virus_of.get(card) == virus for card in cards):
+            for card in cards:
+                player.del_card(card)
+            self.vaccines[virus] = True
+            if all(self.vaccines):
+                self.finish(PLAYERS_WIN)
+            doctor = self.find_role(ROLE_DOCTOR)
+            if doctor is not None:
+                self.medication(doctor, doctor.take_location())
+            return True
+        return False
+
+    def simple_moving(self, player, city):
+        if city in player.take_location().take_neighbors():
+            self.move_player(player, city)
+            return True
+        return False
+
+    def air_moving(self, player, city, card):
+        if not player.has_card(card):
+            return False
+        if player.take_location().take_name() == card:
+            self.move_player(player, city)
+            player.del_card(card)
+        elif city.take_name() == card:
+            self.move_player(player, city)
+            player.del_card(card)
+        else:
+            return False
+        return True
+
+    def work_moving(self, player, city):
+        if player.take_location().is_station() and city.is_station():
+            self.move_player(player, city)
+            return True
+        return False
+
+    @logged
+    def build_station(self, player, card):
+        if player.take_role() == ROLE_ENGINEER:
+            if not player.take_location().is_station():
+                player.take_location().build_station()
+                return True
+            return False
+        if player.take_location().take_name() == card.take_name() and not player.take_location().is_station() and \
+                player.has_card(card.take_name()):
+            player.take_location().build_station()
+            player.del_card(card.take_name())
+            return True
+        return False
+
+    @logged
+    def fighting_virus(self, player):
+        # print(player.take_location().take_contamination())
+        if player.take_location().take_contamination() > 0:
+            self.medication(player, player.take_location())
+            return True
+        return False
+
+    @logged
+    def action_with_city(self, player, city, card=None):
+        if player.take_location().take_cords() == city.take_cords():
+            return self.fighting_virus(player)
+        if self.simple_moving(player, city):
+            return True
+        if self.work_moving(player, city):
+            return True
+        if card is not None:
+            return self.air_moving(player, city, card)
+        return False
+
+    @logged
+    def dispatcher_action(self, player, city, card=None):
+        if self.current_player.take_role() != ROLE_DISPATCHER:
+            return False
+        if player.take_location() == city:
+            return False
+        if self.simple_moving(player, city):
+            return True
+        if city.take_players():
+            self.move_player(player, city)
+            return True
+        if self.work_moving(player, city):
+            return True
+        if self.current_player.has_card(card) and \
+                (player.take_location().take_name() == card or city.take_name() == card):
+            self.move_player(player, city)
+            self.current_player.del_card(card)
+            return True
+        return False
+
+    def how_many_actions(self):
+        return self.remaining_actions
+
+    def take_current_player(self):
+        return self.current_player
+
+    @logged
+    def spending_action(self):
+        self.remaining_actions -= 1
+        if self.remaining_actions == 0:
+            self.transfer_motion()
+        return True
+
+    def transfer_motion(self):
+        self.turn += 1
+        self.remaining_actions = PLAYER_ACTIONS
+        self.receiving_cards(self.take_current_player())
+        self.last_infections.clear()
+        self.last_outbreaks.clear()
+        for i in range(self.take_infectivity()):
+            card = self.open_infections_card()
+            self.city_infection(card)
+            self.last_infections.append(card)
+        self.current_player = self.players[(self.current_player.take_num() + 1)
+                                           % len(self.players)]
+
+    def take_infectivity(self):
+        return INFECTIVITY[self.scale_infectivity]
+
+    def city_infection(self, card):
+        city = self.cities[card]
+        if not self.infection(city):
+            self.outbreak(city)
+
+    def find_role(self, role):
+        return self.by_role.get(role)
+
+    def is_protected(self, city):
+        return self.protected[city.take_num()] == 1
+
+    def take_players(self):
+        return self.players
+
+    def take_virus_units(self, virus):
+        return self.viruses_units[virus]
+
+    def take_scale_outbreaks(self):
+        return self.scale_outbreaks
+
+    def take_last_infections(self):
+        return self.last_infections
+
+    def take_last_outbreaks(self):
+        return self.last_outbreaks
+
+    def take_player_pack(self):
+        return self.players_pack.remaining()
+
+    def take_players_deck(self):
+        return self.players_pack
+
+    def take_infection_deck(self):
+        return self.infection_pack
+
+    def is_game_over(self):
+        return self.game_over
+
+    def who_win(self):
+        return self.winner
+
+    def take_loss_reason(self):
+        return self.loss_reason
+
+    def take_vaccines(self):
+        return self.vaccines
+
+    def take_state_hash(self):
+        # 64-битный хеш позиции - ключ таблицы транспозиций: позиции, к которым пришли разным порядком
+        # действий, совпадают. Он совпадает и с хешем GameState.from_game(game) и его продолжений
+        vaccines = sum(1 << virus for virus, done in enumerate(self.vaccines) if done)
+        outcome = 0 if not self.game_over else 1 + bool(self.winner)
+        return self.state_hash.value ^ fold_counters(self.map.zobrist_keys(), (
+            self.turn, self.remaining_actions, self.current_player.take_num(), self.scale_outbreaks,
+            self.scale_infectivity, vaccines, self.players_pack.remaining(), self.infection_pack.remaining(),
+            outcome))
+
+    def rehash(self):
+        # хеш позиции заново по всему состоянию - после прямой правки полей (например, загрузки снимка)
+        card_index = self.map.index
+        value = 0
+        for town in self.cities.values():
+            value ^= town.keys[town.take_contamination()]
+            if town.is_station():
+                value ^= town.station_key
+        for player, locations in zip(self.players, self.location_keys):
+            value ^= locations[player.take_location().take_num()]
+            for card, count in player.hand.items():
+                for copy in range(1, count + 1):
+                    value ^= copy_key(player.card_keys[card_index.get(card, -1)], copy)
+        self.state_hash.value = value
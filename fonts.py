@@ -0,0 +1,53 @@
+from collections import OrderedDict
+
+import pygame
+
+# сколько отрисованных надписей хранится в кеше
+TEXT_CACHE_SIZE = 512
+
+
+class TextCache:
+    # шрифты по размеру и отрисованные надписи по (текст, размер, цвет) с вытеснением LRU
+    def __init__(self, size=TEXT_CACHE_SIZE):
+        self.size = size
+        self.fonts = dict()
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = pygame.font.Font(None, size)
+            self.fonts[size] = font
+        return font
+
+    def render(self, text, size, color):
+        key = (text, size, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self.font(size).render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'texts': len(self.surfaces), 'fonts': len(self.fonts)}
+
+    def clear(self):
+        self.fonts.clear()
+        self.surfaces.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+text_cache = TextCache()
+
+
+def render_text(text, size, color):
+    return text_cache.render(text, size, color)
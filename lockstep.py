@@ -0,0 +1,142 @@
+import argparse
+import random
+import sys
+
+from engine import Game, ROLE_DISPATCHER, ROLE_DOCTOR, ROLE_SCIENTIST, ROLE_RESEARCHER, ROLE_ENGINEER, \
+    ROLE_QUARANTINE_SPECIALIST
+from state import GameState
+from actions import ACTION_NAMES, MOVE, DISPATCH, legal_actions, apply_action
+from ai import play_action
+from batch import BatchEngine
+
+# проверка того, что GameState (поиск ИИ) и Game (интерфейс, сервер, журнал) играют по одним правилам:
+# одна и та же случайная последовательность действий проигрывается на обоих движках одной партии,
+# и после каждого действия состояния сравниваются. Так же сверяются концы ходов BatchEngine
+ROLES = [ROLE_DISPATCHER, ROLE_DOCTOR, ROLE_SCIENTIST, ROLE_RESEARCHER, ROLE_ENGINEER, ROLE_QUARANTINE_SPECIALIST]
+FIELDS = ('contamination', 'stations', 'locations', 'protected', 'scale_outbreaks', 'scale_infectivity',
+          'vaccines', 'viruses_units', 'victory_over_viruses', 'remaining_actions', 'current', 'turn',
+          'last_infections', 'game_over', 'winner', 'loss_reason')
+
+
+def differences(state, game):
+    # поля, в которых состояние расходится с партией
+    other = GameState.from_game(game, state.map)
+    result = [field for field in FIELDS if getattr(state, field) != getattr(other, field)]
+    if [sorted(hand) for hand in state.hands] != [sorted(hand) for hand in other.hands]:
+        result.append('hands')
+    if state.players_pack[state.players_pos:] != other.players_pack:
+        result.append('players_pack')
+    if state.infection_pack[state.infection_pos:] != other.infection_pack:
+        result.append('infection_pack')
+    if state.rng.getstate() != game.rng.getstate():
+        result.append('rng')
+    if state.take_state_hash() != game.take_state_hash():
+        result.append('state_hash')
+    return result
+
+
+def lockstep(roles, seed, limit):
+    # (номер действия, действие, расхождения) при первом расхождении, иначе None
+    game = Game(roles, seed)
+    state = GameState.from_game(game)
+    rng = random.Random(seed)
+    for step in range(limit):
+        if state.game_over:
+            break
+        action = rng.choice(list(legal_actions(state)))
+        done = apply_action(state, action)
+        if play_action(game, action) != done:
+            return step, action, ['done']
+        diff = differences(state, game)
+        if diff:
+            return step, action, diff
+    return None
+
+
+def transposition(seed):
+    # диспетчер переводит напарника и идет сам в двух порядках: позиции должны совпасть
+    # (равенство GameState и хеш Game), а от исходной - отличаться. True, если так и есть
+    rng = random.Random(seed)
+    roles = [ROLE_DISPATCHER, rng.choice(ROLES[1:])]
+    game = Game(roles, seed)
+    state = GameState.from_game(game)
+    neighbors = state.map.neighbors
+    move = MOVE, rng.choice(neighbors[state.locations[0]])
+    dispatch = DISPATCH, 1, rng.choice(neighbors[state.locations[1]]), None
+    results = []
+    for first, second in ((move, dispatch), (dispatch, move)):
+        copy = state.clone()
+        other = Game(roles, seed)
+        for action in (first, second):
+            if not apply_action(copy, action) or not play_action(other, action):
+                return False
+        results.append((copy, other.take_state_hash()))
+    (one, one_hash), (two, two_hash) = results
+    return one == two and hash(one) == hash(two) and one != state and \
+        one.take_state_hash() == one_hash == two_hash
+
+
+def batch_lockstep(seeds, turns):
+    # концы ходов BatchEngine и Game тех же партий; колода заражения заранее почти вытянута,
+    # чтобы партии прошли через ее перемешивание. Номера партий, где движки разошлись
+    roles = [ROLE_DISPATCHER, ROLE_DOCTOR, ROLE_QUARANTINE_SPECIALIST]
+    games = [Game(roles, seed) for seed in seeds]
+    for game in games:
+        deck = game.take_infection_deck()
+        while deck.remaining() > 1:
+            deck.draw()
+    batch = BatchEngine([GameState.from_game(game) for game in games])
+    towns = list(games[0].take_cities_list())
+    names = [town.take_name() for town in towns]
+    failed = []
+    live = set(range(len(games)))
+    for _ in range(turns):
+        for num in live:
+            games[num].transfer_motion()
+        batch.step()
+        for num in sorted(live):
+            game = games[num]
+            if game.is_game_over() or batch.game_over[num]:
+                same = game.is_game_over() == bool(batch.game_over[num]) and \
+                    (game.take_loss_reason() or 0) == batch.loss_reason[num]
+                live.discard(num)
+            else:
+                same = [game.cities[name].take_contamination() for name in names] == \
+                    batch.contamination[num].tolist() and game.scale_outbreaks == batch.scale_outbreaks[num] and \
+                    game.viruses_units == batch.viruses_units[num].tolist()
+            if not same:
+                failed.append(seeds[num])
+                live.discard(num)
+    return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Сверка GameState с Game на одинаковых действиях')
+    parser.add_argument('-n', '--games', type=int, default=200)
+    parser.add_argument('--actions', type=int, default=1000, help='предел действий в партии')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    failed = 0
+    for _ in range(args.games):
+        seed = rng.randrange(2 ** 32)
+        roles = rng.sample(ROLES, rng.randint(2, 4))
+        result = lockstep(roles, seed, args.actions)
+        if result is not None:
+            failed += 1
+            step, action, diff = result
+            print(f'seed {seed}, roles {roles}: действие {step} {ACTION_NAMES[action[0]]}{action[1:]}, '
+                  f'расходятся {", ".join(diff)}')
+    print(f'games: {args.games}, mismatches: {failed}')
+    transposed = 0
+    for _ in range(args.games):
+        seed = rng.randrange(2 ** 32)
+        if not transposition(seed):
+            transposed += 1
+            print(f'seed {seed}: перестановка действий дала разные позиции')
+    print(f'transpositions: {args.games}, mismatches: {transposed}')
+    batch_failed = batch_lockstep([rng.randrange(2 ** 32) for _ in range(args.games)], 40)
+    for seed in batch_failed:
+        print(f'seed {seed}: BatchEngine разошелся с Game')
+    print(f'batch: {args.games}, mismatches: {len(batch_failed)}')
+    sys.exit(1 if failed or transposed or batch_failed else 0)
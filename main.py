@@ -1,29 +1,18 @@
-import csv
 import pygame
 import os
 import sys
-import queue
-from random import shuffle
+import time
 from pygame import draw
 import pygame_gui
 
-# параметры игровых механик
-MAK_CONTAMINATION = 4
-INFECTION_CARD_NAME = 'Усиление зарожаемости'
-INFECTION_CARDS_COUNT = 6
-HOW_TAKE = 2
-MAX_OUTBREAKS_COUNT = 8
-INFECTIVITY = [2, 2, 2, 3, 3, 4, 4]
-VIRUS_COUNT = 4
-VIRUS_UNITS_COUNT = 24
-START_GROUPS_SIZE = 3
-MAX_CARDS_IN_HAND = 7
-PLAYER_ACTIONS = 4
-START_PLAYERS_CARDS = 6
-START = 'Атланта'
-# параметры победителя
-GAME_WIN = False
-PLAYERS_WIN = True
+from engine import Game, Town, Player, ROLE_DISPATCHER, ROLES, NUMBER_BY_ROLE, CITY_RADIUS
+from spatial import SpatialIndex
+from mapfile import MAP_FILE, load_map, layout_of
+from viewport import Viewport, CullIndex, edge_segments
+from fonts import render_text
+from ai import MCTSPlayer, play_action
+from profiler import PROFILER
+
 # параметры рисовки
 IMAGE_W = 1357
 IMAGE_H = 628
@@ -33,49 +22,38 @@ VIRUS_COLORS = [(10, 10, 10), (0, 10, 245), (255, 255, 0), (255, 0, 0)]
 CONTAMINATION_COLOR = (0, 100, 0)
 TEXT_COLOR = (0, 0, 0)
 STATION_COLOR = (225, 255, 255)
-CITY_RADIUS = 15
 BACKGROUND_COLOR = (112, 146, 190)
 # BUTTONS_CORDS = [(50, 470 - 30), (122, 470 - 30), (50, 542 - 30), (122, 542 - 30), (225, 600), (780, 40)]
 BUTTON_RADIUS = 35
+PLAYER_HIT_RADIUS = 32.5
 CHOOSE_COLOR = (220, 20, 60)
 EDGE_COLOR = (255, 255, 255)
-# игровые роли
-ROLE_DISPATCHER = 1
-ROLE_DOCTOR = 2
-ROLE_SCIENTIST = 3
-ROLE_RESEARCHER = 4
-ROLE_ENGINEER = 5
-ROLE_QUARANTINE_SPECIALIST = 6
-ROLES = ['Диспетчер', 'Доктор', 'Ученый', 'Исследователь', 'Инженер', 'Специалист по карантину', 'Нет']
-NUMBER_BY_ROLE = {
-    'Диспетчер': 1, 'Доктор': 2, 'Ученый': 3, 'Исследователь': 4, 'Инженер': 5, 'Специалист по карантину': 6, 'Нет': -1
-}
-
-
-def load_cities():
-    # загрузка городов из csv-файла
-    cities = []
-    with open('cities.csv', encoding="utf8") as csvfile:
-        reader = csv.reader(csvfile, delimiter=';', quotechar='"')
-        for record in reader:
-            num = int(record[0]) - 1
-            name = record[1]
-            cords = (int(record[2]), int(record[3]))
-            virus = int(record[4]) - 1
-            cities.append((num, name, cords, virus))
-    return cities
-
-
-def load_cities_graph():
-    # загрузка связей между городами из csv-файла
-    graph = []
-    with open('graph.csv', encoding="utf8") as csvfile:
-        reader = csv.reader(csvfile, delimiter=';', quotechar='"')
-        for record in reader:
-            c_1 = int(record[0]) - 1
-            c_2 = int(record[1]) - 1
-            graph.append((c_1, c_2))
-    return graph
+# подписи городов рисуются, только пока масштаб не меньше этого
+LABEL_ZOOM = 0.5
+# насколько за край окна (в пикселях) отбираются города, чьи кружки и подписи могут в него попасть
+VIEW_MARGIN = 120
+# шаг масштаба колесом мыши и сдвига стрелками
+ZOOM_STEP = 1.25
+PAN_STEP = 100
+PAN_KEYS = {pygame.K_LEFT: (PAN_STEP, 0), pygame.K_RIGHT: (-PAN_STEP, 0),
+            pygame.K_UP: (0, PAN_STEP), pygame.K_DOWN: (0, -PAN_STEP)}
+# кто играет за место: человек или ИИ
+CONTROLLERS = ['Человек', 'ИИ']
+# клавиша панели замеров; переменная окружения с путем к файлу включает замеры с запуска
+PROFILE_KEY = pygame.K_F3
+PROFILE_ENV = 'PANDEMIC_PROFILE'
+# предел частоты кадров; без ввода и хода ИИ цикл спит в ожидании события
+MAX_FPS = 60
+# как часто обновляется панель замеров, мс
+PROFILE_REFRESH = 500
+# клавиша карты риска: кольцо вокруг города тем плотнее, чем вероятнее его заражение на следующем ходу,
+# и тем краснее, чем вероятнее вспышка; при RISK_FULL и выше кольцо самое плотное и самое красное
+RISK_KEY = pygame.K_F4
+RISK_FULL = 0.1
+RISK_STEPS = 10
+RISK_LOW = (255, 215, 0)
+RISK_HIGH = (220, 0, 0)
+RISK_WIDTH = 5
 
 
 def load_image(name, colorkey=None):
@@ -87,660 +65,445 @@ def load_image(name, colorkey=None):
     return image
 
 
-class Town:
-    def __init__(self, num, name, cords, virus):
-        self.num = num
-        self.name = name
-        self.cords = cords
-        self.virus = virus
-
-        self.players = set()
-        self.station = False
-        if name == START:
-            self.station = True
-        self.contamination = 0
-        self.neighbors = set()
-
-    def take_num(self):
-        return self.num
-
-    def take_name(self):
-        return self.name
-
-    def take_cords(self):
-        return self.cords
-
-    def take_virus(self):
-        return self.virus
-
-    def add_player(self, player):
-        self.players.add(player)
-
-    def del_player(self, player):
-        self.players.discard(player)
-
-    def is_station(self):
-        return self.station
-
-    def build_station(self):
-        self.station = True
-
-    def infection(self):
-        if self.contamination == MAK_CONTAMINATION:
-            return False
-        self.contamination += 1
-        return True
-
-    def medication(self):
-        if self.contamination == 0:
-            return False
-        self.contamination -= 1
-        return True
-
-    def nullify_contamination(self):
-        self.contamination = 0
-
-    def take_contamination(self):
-        return self.contamination
-
-    def take_players(self):
-        return self.players
-
-    def add_neighbor(self, city):
-        self.neighbors.add(city)
-
-    def take_neighbors(self):
-        return self.neighbors
-
-
-class Player:
-    def __init__(self, num, role, location):
-        self.num = num
-        self.role = role
-        self.location = location
-        self.hand = []
-
-    def take_location(self):
-        return self.location
-
-    def set_location(self, location):
-        self.location = location
-
-    def take_role(self):
-        return self.role
-
-    def take_num(self):
-        return self.num
-
-    def add_card(self, card):
-        self.hand.append(card)
-
-    def del_card(self, card):
-        if card not in self.hand:
-            return False
-        index = self.hand.index(card)
-        del self.hand[index]
-        return True
-
-    def take_hand(self):
-        return self.hand
-
-    def check_combination(self, cards):
-        hand_copy = self.hand.copy()
-        for card in cards:
-            index = hand_copy.index(card)
-            if index == -1:
-                return False
-            del hand_copy[index]
-        return True
-
-
-class Game:
-    def __init__(self, players):
-        self.players = []
-        self.cities = dict()
-        cities_list = load_cities()
-        for city in cities_list:
-            num, name, cords, virus = city
-            self.cities[name] = Town(num, name, cords, virus)
-        for i in range(len(players)):
-            self.players.append(Player(i, players[i], self.cities[START]))
-        self.cities_graph = []
-        for c_1, c_2 in load_cities_graph():
-            name_1, name_2 = cities_list[c_1][1], cities_list[c_2][1]
-            self.cities[name_1].add_neighbor(self.cities[name_2])
-            self.cities[name_2].add_neighbor(self.cities[name_1])
-            self.cities_graph.append((self.cities[name_1], self.cities[name_2]))
-
-        cities_names = [city[1] for city in cities_list]
-        cards = cities_names.copy()
-        shuffle(cards)
-        start_cards = cards[:(START_PLAYERS_CARDS - len(self.players)) * len(players)]
-        cards = cards[(START_PLAYERS_CARDS - len(self.players)) * len(players):]
-        stack_len = len(cards) // INFECTION_CARDS_COUNT
-        stacks = []
-        for _ in range(INFECTION_CARDS_COUNT):
-            stacks.append(cards[:stack_len])
-            cards = cards[stack_len:]
-        stacks[-1] += cards
-        cards = start_cards
-        for stack in stacks:
-            stack.append(INFECTION_CARD_NAME)
-            shuffle(stack)
-            cards += stack
-        self.players_pack = iter(cards.copy())
-        self.len_players_pack = len(list(iter(cards.copy())))
-        cards = cities_names * (MAK_CONTAMINATION + 1)
-        shuffle(cards)
-        while len(set(cards[:3 * START_GROUPS_SIZE])) != 3 * START_GROUPS_SIZE:
-            shuffle(cards)
-        self.infection_pack = iter(cards.copy())
-        self.complete_pack = cards
-
-        for player in self.players:
-            for _ in range(START_PLAYERS_CARDS - len(self.players)):
-                player.add_card(self.open_players_card())
-
-        self.scale_outbreaks = 0
-        self.scale_infectivity = 0
-        self.vaccines = [False] * VIRUS_COUNT
-        self.viruses_units = [VIRUS_UNITS_COUNT] * VIRUS_COUNT
-        self.victory_over_viruses = [False] * VIRUS_COUNT
-        self.game_over = False
-        self.winner = None
-        self.last_infections = []
-
-        for units_count in range(1, 4):
-            for i in range(START_GROUPS_SIZE):
-                card = self.open_infections_card()
-                for _ in range(units_count):
-                    self.last_infections.append(card)
-                    self.infection(self.cities[card])
-
-        self.remaining_actions = PLAYER_ACTIONS
-        self.current_player = self.players[0]
-
-    def take_cities_list(self):
-        return self.cities.values()
-
-    def take_cities_graph(self):
-        return self.cities_graph
-
-    def get_element(self, coord):
-        x, y = coord
-        for city in self.cities.values():
-            cords = city.take_cords()
-            dist = ((cords[0] - x) ** 2 + (cords[1] - y) ** 2) ** 0.5
-            if dist <= CITY_RADIUS:
-                return city
-
-    def infection(self, city):
-        if self.victory_over_viruses[city.take_virus()]:
-            return True
-        if self.viruses_units[city.take_virus()] == 0:
-            return True
-        quarantine_specialist = self.find_role(ROLE_QUARANTINE_SPECIALIST)
-        if quarantine_specialist:
-            if city == quarantine_specialist.take_location() or \
-                    city in quarantine_specialist.take_location().take_neighbors():
-                return True
-        if city.infection():
-            self.viruses_units[city.take_virus()] -= 1
-            if self.viruses_units[city.take_virus()] == 0:
-                self.game_over = True
-                self.winner = GAME_WIN
-            return True
-        return False
-
-    def medication(self, player, city):
-        if player.take_role() == ROLE_DOCTOR or self.vaccines[city.take_virus()]:
-            if city.take_contamination() > 0:
-                self.viruses_units[city.take_virus()] += city.take_contamination()
-                city.nullify_contamination()
-                if self.vaccines[city.take_virus()] and \
-                        self.viruses_units[city.take_virus()] == VIRUS_UNITS_COUNT:
-                    self.victory_over_viruses[city.take_virus()] = True
-                return True
-            return False
-        if city.medication():
-            self.viruses_units[city.take_virus()] += 1
-            if self.vaccines[city.take_virus()] and \
-                    self.viruses_units[city.take_virus()] == VIRUS_UNITS_COUNT:
-                self.victory_over_viruses[city.take_virus()] = True
-            return True
-        return False
-
-    def take_viruses_unit(self):
-        return self.viruses_units
-
-    def outbreak(self, start_city):
-        self.scale_outbreaks += 1
-        infected = queue.Queue()
-        infected.put(start_city)
-        used = [False] * len(self.cities.values())
-        used[start_city.take_num()] = True
-        while not infected.empty():
-            city = infected.get()
-            for neig in city.take_neighbors():
-                if not used[neig.take_num()]:
-                    used[neig.take_num()] = True
-                    if not self.infection(neig):
-                        self.scale_outbreaks += 1
-                        infected.put(neig)
-        if self.scale_outbreaks >= MAX_OUTBREAKS_COUNT:
-            self.game_over = True
-            self.winner = GAME_WIN
-
-    def move_player(self, player, city):
-        player.take_location().del_player(player)
-        city.add_player(player)
-        player.set_location(city)
-        if player.take_role == ROLE_DOCTOR and self.vaccines[city.take_virus()]:
-            self.medication(player, city)
-
-    def open_players_card(self):
-        if self.players_pack:
-            self.len_players_pack -= 1
-            return next(self.players_pack)
-        return None
-
-    def open_infections_card(self):
-        if self.infection_pack:
-            return next(self.infection_pack)
-        cards = self.complete_pack.copy()
-        shuffle(cards)
-        self.infection_pack = iter(cards)
-        return next(self.infection_pack)
-
-    def receiving_cards(self, player):
-        for _ in range(HOW_TAKE):
-            if len(player.take_hand()) == MAX_CARDS_IN_HAND:
-                break
-            card = self.open_players_card()
-            if card is None:
-                self.game_over = True
-                self.winner = GAME_WIN
-            if card == INFECTION_CARD_NAME:
-                self.scale_infectivity += 1
-            else:
-                player.add_card(card)
-
-    def transfer_card(self, player_from, player_to, card):
-        if card not in player_from.take_hand():
-            return False
-        if player_to.take_location() == player_from.take_location() or \
-                player_to.take_role() == ROLE_RESEARCHER or player_from.take_role() == ROLE_RESEARCHER:
-            player_from.del_card(card)
-            player_to.add_card(card)
-            return True
-        return False
-
-    def create_vaccine(self, player, virus, cards):
-        if self.vaccines[virus]:
-            return False
-        if INFECTION_CARD_NAME in cards:
-            return False
-        if player.take_role() == ROLE_SCIENTIST and len(cards) >= 4:
-            cards = cards[:4]
-        elif len(cards) >= 5:
-            cards = cards[:5]
-        else:
-            return False
-        if player.check_combination(cards) and \
-                all(map(lambda card: self.cities[card].virus == virus, cards)):
-            for card in cards:
-                player.del_card(card)
-            self.vaccines[virus] = True
-            doctor = self.find_role(ROLE_DOCTOR)
-            if doctor is not None:
-                self.medication(doctor, doctor.take_location())
-            return True
-        return False
-
-    def simple_moving(self, player, city):
-        if city in player.take_location().take_neighbors():
-            self.move_player(player, city)
-            return True
-        return False
-
-    def air_moving(self, player, city, card):
-        if player.take_location().take_name() == card:
-            self.move_player(player, city)
-            player.del_card(card)
-        elif city.take_name() == card:
-            self.move_player(player, city)
-            player.del_card(card)
-        else:
-            return False
-        return True
-
-    def work_moving(self, player, city):
-        if player.take_location().is_station() and city.is_station():
-            self.move_player(player, city)
-            return True
-        return False
-
-    def build_station(self, player, card):
-        if player.take_role() == ROLE_ENGINEER:
-            if not player.location().is_station():
-                player.location().build_station()
-                return True
-            return False
-        if player.take_location().take_name() == card.take_name() and not player.take_location().is_station():
-            player.take_location().build_station()
-            player.del_card(card)
-            return True
-        return False
-
-    def fighting_virus(self, player):
-        # print(player.take_location().take_contamination())
-        if player.take_location().take_contamination() > 0:
-            self.medication(player, player.take_location())
-            return True
-        return False
-
-    def action_with_city(self, player, city, card=None):
-        if player.take_location().take_cords() == city.take_cords():
-            return self.fighting_virus(player)
-        if self.simple_moving(player, city):
-            return True
-        if self.work_moving(player, city):
-            return True
-        if card is not None:
-            return self.air_moving(player, city, card)
-        return False
-
-    def dispatcher_action(self, player, city, card=None):
-        if self.current_player.take_role() != ROLE_DISPATCHER:
-            return False
-        if player.take_location() == city:
-            return False
-        if self.simple_moving(player, city):
-            return True
-        if city.take_players():
-            self.move_player(player, city)
-            return True
-        if self.work_moving(player, city):
-            return True
-        if player.take_location() == card or city.take_name() == card:
-            self.move_player(player, city)
-            self.current_player.del_card(card)
-            return True
-        return False
-
-    def how_many_actions(self):
-        return self.remaining_actions
-
-    def take_current_player(self):
-        return self.current_player
-
-    def spending_action(self):
-        self.remaining_actions -= 1
-        if self.remaining_actions == 0:
-            self.transfer_motion()
-
-    def transfer_motion(self):
-        self.remaining_actions = PLAYER_ACTIONS
-        self.receiving_cards(self.take_current_player())
-        self.last_infections.clear()
-        for i in range(self.take_infectivity()):
-            card = self.open_infections_card()
-            self.infection(self.cities[card])
-            self.last_infections.append(card)
-        self.current_player = self.players[(self.current_player.take_num() + 1)
-                                           % len(self.players)]
-
-    def take_infectivity(self):
-        return INFECTIVITY[self.scale_infectivity]
-
-    def city_infection(self, card):
-        city = self.cities[card]
-        if not self.infection(city):
-            self.outbreak(city)
-
-    def find_role(self, role):
-        for player in self.players:
-            if player.take_role() == role:
-                return player
-        return None
-
-    def take_players(self):
-        return self.players
-
-    def take_virus_units(self, virus):
-        return self.viruses_units[virus]
-
-    def take_scale_outbreaks(self):
-        return self.scale_outbreaks
-
-    def take_last_infections(self):
-        return self.last_infections
-
-    def take_player_pack(self):
-        return self.len_players_pack
-
-    def is_game_over(self):
-        return self.game_over
-
-    def who_win(self):
-        return self.winner
-
-    def take_vaccines(self):
-        return self.vaccines
-
-
 def show_infectivity(screen, game):
     # отрисовка счетчика скрости заражения
     x, y = 50, 50
-    draw.circle(screen, 'white', (x, y), 33)
-    font = pygame.font.Font(None, 40)
-    text = font.render(str(game.take_infectivity()), True, TEXT_COLOR)
-    screen.blit(text, (x - 6, y - 24))
-    font = pygame.font.Font(None, 15)
-    text = font.render('Скорость', True, TEXT_COLOR)
-    screen.blit(text, (x - 24, y))
-    text = font.render('заражения', True, TEXT_COLOR)
-    screen.blit(text, (x - 27, y + 8))
+    rect = draw.circle(screen, 'white', (x, y), 33)
+    text = render_text(str(game.take_infectivity()), 40, TEXT_COLOR)
+    rect.union_ip(screen.blit(text, (x - 6, y - 24)))
+    text = render_text('Скорость', 15, TEXT_COLOR)
+    rect.union_ip(screen.blit(text, (x - 24, y)))
+    text = render_text('заражения', 15, TEXT_COLOR)
+    rect.union_ip(screen.blit(text, (x - 27, y + 8)))
+    return rect
 
 
 def show_scale_outbreaks(screen, game):
     # отрисовка счетчика количества вспышек
     x, y = 125, 50
-    draw.circle(screen, 'white', (x, y), 33)
-    font = pygame.font.Font(None, 40)
-    text = font.render(str(game.take_scale_outbreaks()), True, TEXT_COLOR)
-    screen.blit(text, (x - 6, y - 24))
-    font = pygame.font.Font(None, 15)
-    text = font.render('Количество', True, TEXT_COLOR)
-    screen.blit(text, (x - 30, y))
-    text = font.render('вспышек', True, TEXT_COLOR)
-    screen.blit(text, (x - 25, y + 8))
+    rect = draw.circle(screen, 'white', (x, y), 33)
+    text = render_text(str(game.take_scale_outbreaks()), 40, TEXT_COLOR)
+    rect.union_ip(screen.blit(text, (x - 6, y - 24)))
+    text = render_text('Количество', 15, TEXT_COLOR)
+    rect.union_ip(screen.blit(text, (x - 30, y)))
+    text = render_text('вспышек', 15, TEXT_COLOR)
+    rect.union_ip(screen.blit(text, (x - 25, y + 8)))
+    return rect
 
 
 def show_player(screen, coord, player):
     # отрисовка карточек игроков со списком из карт-городов
     x, y = coord
-    font = pygame.font.Font(None, 25)
-    text = font.render(str(ROLES[player.take_role() - 1]), True, TEXT_COLOR)
-    draw.rect(screen, PLAYER_COLORS[player.take_role() - 1], ((x, y), (250, 75)))
-    draw.rect(screen, (220, 220, 220), ((x, y - 10), (text.get_width() + 2, text.get_height() + 2)))
-    screen.blit(text, (x + 1, y - 9))
+    text = render_text(str(ROLES[player.take_role() - 1]), 25, TEXT_COLOR)
+    rect = draw.rect(screen, PLAYER_COLORS[player.take_role() - 1], ((x, y), (250, 75)))
+    rect.union_ip(draw.rect(screen, (220, 220, 220), ((x, y - 10), (text.get_width() + 2, text.get_height() + 2))))
+    rect.union_ip(screen.blit(text, (x + 1, y - 9)))
     dy = 15
     cities = player.take_hand()
-    indent = 0
     for i in range(min(3, len(cities))):
         city = cities[i]
-        font = pygame.font.Font(None, 20)
-        text = font.render(str(city), True, TEXT_COLOR)
-        screen.blit(text, (x + 10, y + dy))
+        text = render_text(str(city), 20, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (x + 10, y + dy)))
         dy += 15
-        if text.get_width() + 2 > indent:
-            indent = text.get_width() + 2
     x += 125
     dy = 10
     for i in range(3, len(cities)):
         city = cities[i]
-        font = pygame.font.Font(None, 20)
-        text = font.render(str(city), True, TEXT_COLOR)
-        screen.blit(text, (x, y + dy))
+        text = render_text(str(city), 20, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (x, y + dy)))
         dy += 15
-    x, y = player.take_location().take_cords()
+    return rect
+
+
+def show_pawn(screen, player, pos):
+    # фишка игрока на карте; pos - город игрока на экране
+    x, y = pos
     dx, dy = PLAYERS_INDENT[player.take_num()]
-    draw.circle(screen, PLAYER_COLORS[player.take_role() - 1], (x + dx, y + dy), 7)
+    return draw.circle(screen, PLAYER_COLORS[player.take_role() - 1], (x + dx, y + dy), 7)
+
+
+def risk_step(chance):
+    return min(RISK_STEPS, round(chance / RISK_FULL * RISK_STEPS))
+
+
+_risk_rings = dict()
+
+
+def risk_ring(infection, outbreak, radius):
+    # полупрозрачное кольцо для ступеней риска; одинаковые кольца рисуются один раз
+    key = (infection, outbreak, radius)
+    ring = _risk_rings.get(key)
+    if ring is None:
+        size = radius + 2 + RISK_WIDTH
+        ring = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+        share = outbreak / RISK_STEPS
+        color = [round(low + (high - low) * share) for low, high in zip(RISK_LOW, RISK_HIGH)]
+        color.append(60 + 195 * infection // RISK_STEPS)
+        draw.circle(ring, color, (size, size), size, width=RISK_WIDTH)
+        _risk_rings[key] = ring
+    return ring
+
+
+def show_risk(screen, pos, steps, radius):
+    # риск города на следующем ходу; pos - город на экране, steps - ступени риска заражения и вспышки
+    ring = risk_ring(*steps, radius)
+    x, y = pos
+    return screen.blit(ring, (x - ring.get_width() // 2, y - ring.get_height() // 2))
 
 
 def show_vaccines(screen, game):
     x, y = 900, 15
     vaccines = game.take_vaccines()
-    draw.rect(screen, 'white', ((x - 75, y), (290, 60)))
-    font = pygame.font.Font(None, 20)
-    text = font.render('Вакцины', True, TEXT_COLOR)
-    screen.blit(text, (x - 70, y + 25))
+    rect = draw.rect(screen, 'white', ((x - 75, y), (290, 60)))
+    text = render_text('Вакцины', 20, TEXT_COLOR)
+    rect.union_ip(screen.blit(text, (x - 70, y + 25)))
     for i in range(len(vaccines)):
         vaccine = vaccines[i]
         if vaccine:
-            draw.circle(screen, VIRUS_COLORS[i], (x + i * 55 + 20, y + 30), 25)
+            rect.union_ip(draw.circle(screen, VIRUS_COLORS[i], (x + i * 55 + 20, y + 30), 25))
         else:
-            draw.circle(screen, VIRUS_COLORS[i], (x + i * 55 + 20, y + 30), 25, width=2)
+            rect.union_ip(draw.circle(screen, VIRUS_COLORS[i], (x + i * 55 + 20, y + 30), 25, width=2))
+    return rect
 
 
 def show_number_of_player_cards(screen, game):
     x, y = 195, 50
-    draw.circle(screen, 'white', (x, y), 33)
-    font = pygame.font.Font(None, 40)
-    text = font.render(str(game.take_player_pack()), True, TEXT_COLOR)
-    screen.blit(text, (x - 15, y - 24))
-    font = pygame.font.Font(None, 15)
-    text = font.render('Количество', True, TEXT_COLOR)
-    screen.blit(text, (x - 30, y))
-    text = font.render('карт', True, TEXT_COLOR)
-    screen.blit(text, (x - 15, y + 8))
-    text = font.render('игроков', True, TEXT_COLOR)
-    screen.blit(text, (x - 20, y + 16))
+    rect = draw.circle(screen, 'white', (x, y), 33)
+    text = render_text(str(game.take_player_pack()), 40, TEXT_COLOR)
+    rect.union_ip(screen.blit(text, (x - 15, y - 24)))
+    text = render_text('Количество', 15, TEXT_COLOR)
+    rect.union_ip(screen.blit(text, (x - 30, y)))
+    text = render_text('карт', 15, TEXT_COLOR)
+    rect.union_ip(screen.blit(text, (x - 15, y + 8)))
+    text = render_text('игроков', 15, TEXT_COLOR)
+    rect.union_ip(screen.blit(text, (x - 20, y + 16)))
+    return rect
 
 
 def show_pack(screen, game):
     x, y = 1125, 15
-    draw.rect(screen, 'white', ((x - 5, y), (230, 150)))
-    font = pygame.font.Font(None, 20)
-    text = font.render('Последними были заражены:', True, TEXT_COLOR)
-    screen.blit(text, (x, y))
+    rect = draw.rect(screen, 'white', ((x - 5, y), (230, 150)))
+    text = render_text('Последними были заражены:', 20, TEXT_COLOR)
+    rect.union_ip(screen.blit(text, (x, y)))
     dy = 15
     cities = game.take_last_infections()
     for i in range(min(len(cities), 9)):
         city = cities[i]
-        text = font.render(city, True, TEXT_COLOR)
-        screen.blit(text, (x, y + dy))
+        text = render_text(city, 20, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (x, y + dy)))
         dy += 15
     dy = 15
     for i in range(9, len(cities)):
         city = cities[i]
-        text = font.render(city, True, TEXT_COLOR)
-        screen.blit(text, (x + 110, y + dy))
+        text = render_text(city, 20, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (x + 110, y + dy)))
         dy += 15
+    return rect
+
+
+def show_outbreaks(screen, game):
+    # цепочка вспышек за последний ход
+    x, y = 1125, 170
+    cities = game.take_last_outbreaks()
+    text = render_text('Вспышки: ' + ' -> '.join(cities[:4]) + (' ...' if len(cities) > 4 else ''), 20, TEXT_COLOR)
+    rect = draw.rect(screen, 'white', ((x - 5, y), (text.get_width() + 10, text.get_height() + 4)))
+    rect.union_ip(screen.blit(text, (x, y + 2)))
+    return rect
 
 
 def show_current_information(screen, game):
     x, y = 1100, 600
-    font = pygame.font.Font(None, 30)
-    text = font.render('Ходит: ' + ROLES[game.take_current_player().take_role() - 1], True, TEXT_COLOR)
-    screen.blit(text, (x, y))
-    font = pygame.font.Font(None, 30)
-    text = font.render('Осталось ходов: ' + str(game.how_many_actions()), True, TEXT_COLOR)
-    screen.blit(text, (x, y + 20))
-
-
-def new_map(screen, image, game):
-    cities = game.take_cities_list()
-    graph = game.take_cities_graph()
-    screen.blit(image, (0, 0))
-    exceptions = [(16, 38), (16, 45), (24, 47)]
-    # Отрисовка ребер между городами
-    for city in cities:
-        for neighbor in city.take_neighbors():
-            # Если ребро должно выходить за пределы карты и входить с другой стороны
-            if (city.take_num(), neighbor.take_num()) in exceptions:
-                x1, y1 = city.take_cords()
-                x2, y2 = neighbor.take_cords()
-                if x1 > x2:
-                    x1, y1 = x2, y2
-                draw.line(screen, EDGE_COLOR, (x1, y1), (0, (y1 + y2) // 2), width=3)
-                draw.line(screen, EDGE_COLOR, (x2, y2), (IMAGE_W, (y1 + y2) // 2), width=3)
-                font = pygame.font.Font(None, 20)
-                text = font.render(neighbor.take_name(), True, TEXT_COLOR)
-                screen.blit(text, (0, (y1 + y2) // 2))
-                font = pygame.font.Font(None, 20)
-                text = font.render(city.take_name(), True, TEXT_COLOR)
-                screen.blit(text, (IMAGE_W - 105, (y1 + y2) // 2))
-            elif (int(neighbor.take_num()), int(city.take_num())) not in exceptions:
-                draw.line(screen, EDGE_COLOR, city.take_cords(), neighbor.take_cords(), width=3)
+    text = render_text('Ходит: ' + ROLES[game.take_current_player().take_role() - 1], 30, TEXT_COLOR)
+    rect = screen.blit(text, (x, y))
+    text = render_text('Осталось ходов: ' + str(game.how_many_actions()), 30, TEXT_COLOR)
+    rect.union_ip(screen.blit(text, (x, y + 20)))
+    return rect
+
+
+def city_radius(viewport):
+    # при уменьшении кружки городов уменьшаются вместе с картой, при увеличении остаются прежними
+    return max(3, round(CITY_RADIUS * min(viewport.zoom, 1.0)))
+
+
+def blit_image(surface, image, viewport):
+    # видимая часть картинки карты в масштабе окна
+    x1, y1, x2, y2 = viewport.world_rect()
+    left, top = int(x1), int(y1)
+    crop = pygame.Rect(left, top, int(x2) + 1 - left, int(y2) + 1 - top).clip(image.get_rect())
+    if crop.width <= 0 or crop.height <= 0:
+        return
+    part = image.subsurface(crop)
+    if viewport.zoom != 1:
+        part = pygame.transform.scale(part, (round(crop.width * viewport.zoom), round(crop.height * viewport.zoom)))
+    surface.blit(part, viewport.to_screen(crop.x, crop.y))
+
+
+def render_static_map(image, game, viewport=None, cull=None):
+    # фон, связи, кружки и названия городов меняются только со сдвигом и масштабом окна
+    # и рисуются заново лишь для видимой части карты
+    city_map = game.map
+    layout = layout_of(city_map)
+    if viewport is None:
+        viewport = Viewport(IMAGE_W, IMAGE_H + 100, *layout.size)
+    if cull is None:
+        cull = CullIndex(layout.xs, layout.ys, edge_segments(city_map, layout), *layout.size)
+    surface = pygame.Surface((viewport.width, viewport.height))
+    surface.fill(layout.background)
+    if image is not None:
+        blit_image(surface, image, viewport)
+    labels = viewport.zoom >= LABEL_ZOOM
+    for index in cull.segments_in(viewport.world_rect()):
+        _, x1, y1, x2, y2, far = cull.segments[index]
+        end = viewport.to_screen(x2, y2)
+        draw.line(surface, EDGE_COLOR, viewport.to_screen(x1, y1), end, width=3)
+        # связь через край карты: у края подписан город на другом конце
+        if far != -1 and labels:
+            text = render_text(city_map.names[far], 20, TEXT_COLOR)
+            surface.blit(text, (end[0] - 105 if x2 else end[0], end[1]))
+    radius = city_radius(viewport)
+    for city in cull.cities(viewport.world_rect(), VIEW_MARGIN / viewport.zoom):
+        x, y = viewport.to_screen(layout.xs[city], layout.ys[city])
+        draw.circle(surface, layout.colors[city_map.viruses[city]], (x, y), radius)
+        if labels:
+            text = render_text(city_map.names[city], 18, TEXT_COLOR)
+            dx, dy = layout.label_offset(city)
+            draw.rect(surface, 'white', ((x + dx, y + dy), (text.get_width(), text.get_height())))
+            surface.blit(text, (x + dx, y + dy))
+    return surface
+
+
+def show_city(screen, city, pos):
+    # изменяемая часть города: станция и счетчик заражения; pos - город на экране
+    x, y = pos
+    rect = draw.circle(screen, CONTAMINATION_COLOR, (x - 10 - 5, y + 8), 7)
+    if city.is_station():
+        rect.union_ip(draw.polygon(screen, STATION_COLOR,
+                                   ((x + 5, y), (x + 5, y - 7), (x + 7 + 5, y - 14), (x + 19, y - 7), (x + 19, y))))
+    text = render_text(str(city.take_contamination()), 20, (100, 255, 100))
+    rect.union_ip(screen.blit(text, (x - 10 - 9, y + 2)))
+    return rect
+
+
+def show_ai_stats(screen, stats):
+    x, y = 1100, 645
+    text = render_text(f'ИИ: {stats["iterations_per_second"]:.0f} итер./с, узлов {stats["tree_size"]}',
+                       20, TEXT_COLOR)
+    return screen.blit(text, (x, y))
+
+
+def show_profile(screen, snapshot):
+    # панель замеров: среднее время кадра по фазам, гистограмма кадров, счетчики методов движка
+    x, y = 250, 100
+    frames = snapshot['frames']
+    lines = [f'Кадров: {frames["count"]}, среднее {frames["mean_ms"]:.2f} мс, max {frames["max_ms"]:.1f} мс']
+    lines.append('  '.join(f'{name} {spent:.2f}' for name, spent in frames['phases_ms'].items()))
+    lines.append('  '.join(f'{name}: {count}' for name, count in frames['histogram'].items() if count))
+    for name, method in snapshot['methods'].items():
+        lines.append(f'{name}: {method["calls"]} выз., {method["mean_us"]:.1f} мкс')
+    cascades = snapshot['cascades']
+    lines.append(f'Цепочки вспышек: {cascades["count"]}, средняя {cascades["mean"]:.1f}, max {cascades["max"]}')
+    rect = draw.rect(screen, 'white', ((x - 5, y), (420, len(lines) * 16 + 6)))
+    for line in lines:
+        rect.union_ip(screen.blit(render_text(line, 18, TEXT_COLOR), (x, y + 3)))
+        y += 16
+    return rect
+
+
+def map_widgets(game, view=None, risk=False):
+    # виджеты карты: (имя, состояние, функция рисования) в порядке наложения;
+    # с view (MapView) - только видимые города в координатах окна, risk - показывать карту риска
+    widgets = []
+    if view is None:
+        cities = game.take_cities_list()
+        positions = {city: city.take_cords() for city in cities}
+        radius = CITY_RADIUS
+    else:
+        cities = view.visible
+        positions = view.positions
+        radius = city_radius(view.viewport)
+    if risk:
+        # кольца риска лежат под счетчиками городов
+        for city, (infection, outbreak) in zip(cities, game.take_risk().risks(cities)):
+            steps = (risk_step(infection), risk_step(outbreak))
+            if steps[0]:
+                widgets.append((('risk', city.take_num()), (steps, radius),
+                                lambda screen, pos=positions[city], steps=steps:
+                                show_risk(screen, pos, steps, radius)))
     for city in cities:
-        x, y = city.take_cords()
-        draw.circle(screen, VIRUS_COLORS[city.take_virus()], (x, y), CITY_RADIUS)
-        if city.is_station():
-            draw.polygon(screen, STATION_COLOR,
-                         ((x + 5, y), (x + 5, y - 7), (x + 7 + 5, y - 14), (x + 19, y - 7), (x + 19, y)))
-        draw.circle(screen, CONTAMINATION_COLOR, (x - 10 - 5, y + 8), 7)
-        font = pygame.font.Font(None, 20)
-        text = font.render(str(city.take_contamination()), True, (100, 255, 100))
-        screen.blit(text, (x - 10 - 9, y + 2))
-        font = pygame.font.Font(None, 18)
-        text = font.render(city.take_name(), True, TEXT_COLOR)
-        if city.take_name() == 'Нью-Дели' or city.take_name() == 'Лос-Анджелес' or city.take_name() == 'Монреаль':
-            draw.rect(screen, 'white', ((x - 15, y - 25), (text.get_width(), text.get_height())))
-            screen.blit(text, (x - 15, y - 25))
-        else:
-            draw.rect(screen, 'white', ((x - 5, y + 7), (text.get_width(), text.get_height())))
-            screen.blit(text, (x - 5, y + 7))
+        widgets.append((('city', city.take_num()), (city.is_station(), city.take_contamination()),
+                        lambda screen, city=city: show_city(screen, city, positions[city])))
+    for player in game.take_players():
+        pos = positions.get(player.take_location())
+        if pos is not None:
+            widgets.append((('pawn', player.take_num()), player.take_location().take_num(),
+                            lambda screen, player=player, pos=pos: show_pawn(screen, player, pos)))
+    return widgets
+
+
+def hud_widgets(game, buttons):
+    widgets = [('infectivity', game.take_infectivity(), lambda screen: show_infectivity(screen, game))]
+    x = 20
+    for player in game.take_players():
+        widgets.append((('player', player.take_num()), tuple(player.take_hand()),
+                        lambda screen, player=player, x=x: show_player(screen, (x, 600), player)))
+        x += 270
+    widgets.append(('outbreaks', game.take_scale_outbreaks(), lambda screen: show_scale_outbreaks(screen, game)))
+    widgets.append(('current', (game.take_current_player().take_num(), game.how_many_actions()),
+                    lambda screen: show_current_information(screen, game)))
+    widgets.append(('vaccines', tuple(game.take_vaccines()), lambda screen: show_vaccines(screen, game)))
+    for button in buttons:
+        widgets.append((('button', id(button)), None, button.draw_button))
+    widgets.append(('pack', tuple(game.take_last_infections()), lambda screen: show_pack(screen, game)))
+    if game.take_last_outbreaks():
+        widgets.append(('outbreak_chain', tuple(game.take_last_outbreaks()),
+                        lambda screen: show_outbreaks(screen, game)))
+    widgets.append(('viruses', tuple(game.take_viruses_unit()), lambda screen: show_viruses(screen, game)))
+    widgets.append(('player_cards', game.take_player_pack(),
+                    lambda screen: show_number_of_player_cards(screen, game)))
+    return widgets
 
 
 def show_viruses(screen, game):
     x, y = 580, 40
-    font = pygame.font.Font(None, 20)
+    rect = pygame.Rect(x, y, 0, 0)
     for i in range(len(game.take_viruses_unit())):
         virus_units = game.take_viruses_unit()[i]
         if i < 2:
-            text = font.render(str(virus_units), True, (255, 255, 255))
+            text = render_text(str(virus_units), 20, (255, 255, 255))
         else:
-            text = font.render(str(virus_units), True, TEXT_COLOR)
-        draw.circle(screen, VIRUS_COLORS[i], (x + i * 43, y), 20)
-        screen.blit(text, (x + i * 43 - 7, y - 7))
-
-
-def new_cadr(screen, image, game, buttons):
-    new_map(screen, image, game)
-    show_infectivity(screen, game)
-    x = 20
-    for player in game.take_players():
-        show_player(screen, (x, 600), player)
-        x += 270
-    show_scale_outbreaks(screen, game)
-    show_current_information(screen, game)
-    show_vaccines(screen, game)
-    for button in buttons:
-        button.draw_button(screen)
-    show_pack(screen, game)
-    show_viruses(screen, game)
-    show_number_of_player_cards(screen, game)
+            text = render_text(str(virus_units), 20, TEXT_COLOR)
+        rect.union_ip(draw.circle(screen, VIRUS_COLORS[i], (x + i * 43, y), 20))
+        rect.union_ip(screen.blit(text, (x + i * 43 - 7, y - 7)))
+    return rect
 
 
 def show_game_over(screen, game):
     if game.who_win():
-        font = pygame.font.Font(None, 100)
-        text = font.render('Вы выиграли! Мир спасен!', True, TEXT_COLOR)
+        text = render_text('Вы выиграли! Мир спасен!', 100, TEXT_COLOR)
     else:
-        font = pygame.font.Font(None, 100)
-        text = font.render('Вы проиграли...', True, TEXT_COLOR)
-    screen.blit(text, (100, 100))
+        text = render_text('Вы проиграли...', 100, TEXT_COLOR)
+    return screen.blit(text, (100, 100))
+
+
+def show_chosen_city(screen, pos):
+    x, y = pos
+    return draw.polygon(screen, CHOOSE_COLOR, ((x + 10, y), (x + 20, y + 10), (x + 20, y - 10)))
+
+
+def show_chosen_player(screen, cords):
+    x, y = cords
+    return draw.polygon(screen, CHOOSE_COLOR, ((x - 70, y - 10), (x - 50, y - 30), (x - 90, y - 30)))
+
+
+def show_hovered(screen, shape):
+    # обводка элемента под курсором
+    x, y, radius = shape
+    return draw.circle(screen, CHOOSE_COLOR, (x, y), radius, width=2)
+
+
+class MapView:
+    # видимая часть карты партии: окно, отобранные в него города, статический слой
+    # и сетка попаданий по городам в координатах экрана; обновляются только при сдвиге и масштабе
+    def __init__(self, game, image, width, height):
+        self.game = game
+        self.image = image
+        layout = layout_of(game.map)
+        self.towns = list(game.take_cities_list())
+        self.viewport = Viewport(width, height, *layout.size)
+        self.cull = CullIndex(layout.xs, layout.ys, edge_segments(game.map, layout), *layout.size)
+        self.refresh()
+
+    def refresh(self):
+        viewport = self.viewport
+        cities = self.cull.cities(viewport.world_rect(), VIEW_MARGIN / viewport.zoom)
+        self.visible = [self.towns[city] for city in cities]
+        self.positions = {town: viewport.to_screen(*town.take_cords()) for town in self.visible}
+        self.static_map = render_static_map(self.image, self.game, viewport, self.cull)
+        radius = city_radius(viewport)
+        self.hit_index = SpatialIndex()
+        for town in self.visible:
+            x, y = self.positions[town]
+            self.hit_index.add(x, y, radius, town)
+
+
+class FrameRenderer:
+    # поверх закешированного статического слоя перерисовываются только виджеты,
+    # чье состояние изменилось, и виджеты, которые с ними пересекаются
+    def __init__(self, screen, static_map):
+        self.screen = screen
+        self.static_map = static_map
+        self.drawn = dict()
+        self.full = True
+        # время отрисовки виджетов слоя карты и интерфейса в последнем кадре, секунды
+        self.phases = {'map': 0.0, 'hud': 0.0}
+
+    def set_static(self, static_map):
+        # новый статический слой (окно карты сдвинуто) - кадр рисуется целиком
+        self.static_map = static_map
+        self.drawn.clear()
+        self.full = True
+
+    def render(self, map_layer, hud_layer):
+        # map_layer и hud_layer - виджеты карты и интерфейса, интерфейс рисуется поверх;
+        # возвращает список прямоугольников для pygame.display.update
+        screen = self.screen
+        widgets = map_layer + hud_layer
+        phases = self.phases
+        phases['map'] = phases['hud'] = 0.0
+        names = {name for name, _, _ in widgets}
+        dirty = [rect for name, (_, rect) in self.drawn.items() if name not in names]
+        for name in [name for name in self.drawn if name not in names]:
+            del self.drawn[name]
+        if self.full:
+            dirty.append(screen.get_rect())
+            self.full = False
+        marked = set()
+        for name, key, _ in widgets:
+            old = self.drawn.get(name)
+            if old is None or old[0] != key:
+                marked.add(name)
+                if old is not None:
+                    dirty.append(old[1])
+        if not marked and not dirty:
+            return []
+        while True:
+            changed = True
+            while changed:
+                changed = False
+                for name, _, _ in widgets:
+                    if name not in marked and name in self.drawn and self.drawn[name][1].collidelist(dirty) != -1:
+                        marked.add(name)
+                        dirty.append(self.drawn[name][1])
+                        changed = True
+            for rect in dirty:
+                screen.blit(self.static_map, rect, rect)
+            drawn = []
+            for index, (name, key, draw_widget) in enumerate(widgets):
+                if name in marked:
+                    begin = time.perf_counter()
+                    rect = draw_widget(screen) or pygame.Rect(0, 0, 0, 0)
+                    phases['map' if index < len(map_layer) else 'hud'] += time.perf_counter() - begin
+                    self.drawn[name] = (key, rect)
+                    drawn.append(rect)
+            # виджет мог вырасти и задеть соседей - тогда проход повторяется
+            dirty.extend(drawn)
+            if all(name in marked or rect.collidelist(drawn) == -1 for name, (_, rect) in self.drawn.items()):
+                return dirty
 
 
 class Button:
+    # role - роль, которой доступна кнопка (None - всем)
+    role = None
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
 
+    def is_available(self, player):
+        return self.role is None or player.take_role() == self.role
+
     def draw_button(self, screen):
-        draw.circle(screen, 'white', (self.x, self.y), BUTTON_RADIUS)
+        return draw.circle(screen, 'white', (self.x, self.y), BUTTON_RADIUS)
 
     def is_button_pressed(self, pos):
         ex, ey = pos
@@ -749,18 +512,18 @@ class Button:
 
 class MoveButton(Button):
     def draw_button(self, screen):
-        super().draw_button(screen)
-        font = pygame.font.Font(None, 17)
-        text = font.render('Перейти в', True, TEXT_COLOR)
-        screen.blit(text, (self.x - 33, self.y - 12))
-        text = font.render('выбранный', True, TEXT_COLOR)
-        screen.blit(text, (self.x - 33, self.y - 2))
-        text = font.render('город', True, TEXT_COLOR)
-        screen.blit(text, (self.x - 27, self.y + 8))
+        rect = super().draw_button(screen)
+        text = render_text('Перейти в', 17, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (self.x - 33, self.y - 12)))
+        text = render_text('выбранный', 17, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (self.x - 33, self.y - 2)))
+        text = render_text('город', 17, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (self.x - 27, self.y + 8)))
+        return rect
 
     def button_action(self, game, chosen_city, chosen_player):
         if chosen_city:
-            if (chosen_city.take_name() in game.take_current_player().take_hand() or \
+            if (game.take_current_player().has_card(chosen_city.take_name()) or \
                 chosen_city in \
                 game.take_current_player().take_location().take_neighbors()) and \
                     game.action_with_city(game.take_current_player(),
@@ -771,13 +534,12 @@ class MoveButton(Button):
 
 class BuildButton(Button):
     def draw_button(self, screen):
-        super().draw_button(screen)
-        font = pygame.font.Font(None, 17)
-        text = font.render('Построить', True, TEXT_COLOR)
-        screen.blit(text, (self.x - 33, self.y - 12))
-        font = pygame.font.Font(None, 17)
-        text = font.render('станцию', True, TEXT_COLOR)
-        screen.blit(text, (self.x - 27, self.y - 2))
+        rect = super().draw_button(screen)
+        text = render_text('Построить', 17, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (self.x - 33, self.y - 12)))
+        text = render_text('станцию', 17, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (self.x - 27, self.y - 2)))
+        return rect
 
     def button_action(self, game, chosen_city, chosen_player):
         if chosen_city:
@@ -788,13 +550,12 @@ class BuildButton(Button):
 
 class FightingButton(Button):
     def draw_button(self, screen):
-        super().draw_button(screen)
-        font = pygame.font.Font(None, 17)
-        text = font.render('Бороться с', True, TEXT_COLOR)
-        screen.blit(text, (self.x - 33, self.y - 12))
-        font = pygame.font.Font(None, 17)
-        text = font.render('заражением', True, TEXT_COLOR)
-        screen.blit(text, (self.x - 33, self.y - 2))
+        rect = super().draw_button(screen)
+        text = render_text('Бороться с', 17, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (self.x - 33, self.y - 12)))
+        text = render_text('заражением', 17, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (self.x - 33, self.y - 2)))
+        return rect
 
     def button_action(self, game, chosen_city, chosen_player):
         if game.fighting_virus(game.take_current_player()):
@@ -804,13 +565,12 @@ class FightingButton(Button):
 
 class TransferButton(Button):
     def draw_button(self, screen):
-        super().draw_button(screen)
-        font = pygame.font.Font(None, 17)
-        text = font.render('Передать', True, TEXT_COLOR)
-        screen.blit(text, (self.x - 27, self.y - 12))
-        font = pygame.font.Font(None, 17)
-        text = font.render('карту', True, TEXT_COLOR)
-        screen.blit(text, (self.x - 25, self.y - 2))
+        rect = super().draw_button(screen)
+        text = render_text('Передать', 17, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (self.x - 27, self.y - 12)))
+        text = render_text('карту', 17, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (self.x - 25, self.y - 2)))
+        return rect
 
     def button_action(self, game, chosen_city, chosen_player):
         if chosen_player and chosen_city and \
@@ -821,95 +581,207 @@ class TransferButton(Button):
 
 
 class DispatcherButton(Button):
+    role = ROLE_DISPATCHER
+
     def draw_button(self, screen):
-        super().draw_button(screen)
-        font = pygame.font.Font(None, 15)
-        text = font.render('Организовать', True, TEXT_COLOR)
-        screen.blit(text, (self.x - 35, self.y - 9))
-        font = pygame.font.Font(None, 15)
-        text = font.render('перелет', True, TEXT_COLOR)
-        screen.blit(text, (self.x - 28, self.y))
+        rect = super().draw_button(screen)
+        text = render_text('Организовать', 15, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (self.x - 35, self.y - 9)))
+        text = render_text('перелет', 15, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (self.x - 28, self.y)))
+        return rect
 
     def button_action(self, game, chosen_city, chosen_player):
-        if chosen_player and len(chosen_city) == 1 and \
-                game.dispatcher_action(chosen_player,
-                                       chosen_city[0], chosen_city[0].take_name()):
+        if chosen_player is None or chosen_city is None:
+            return False
+        # перелет оплачивается картой города назначения, а если ее нет - картой города, где стоит игрок
+        card = chosen_city.take_name()
+        if not game.take_current_player().has_card(card):
+            card = chosen_player.take_location().take_name()
+        if game.dispatcher_action(chosen_player, chosen_city, card):
             game.spending_action()
             return True
 
 
 class VaccineButton(Button):
     def draw_button(self, screen):
-        super().draw_button(screen)
-        font = pygame.font.Font(None, 17)
-        text = font.render('Создать', True, TEXT_COLOR)
-        screen.blit(text, (self.x - 27, self.y - 12))
-        font = pygame.font.Font(None, 17)
-        text = font.render('вакцину', True, TEXT_COLOR)
-        screen.blit(text, (self.x - 25, self.y - 2))
+        rect = super().draw_button(screen)
+        text = render_text('Создать', 17, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (self.x - 27, self.y - 12)))
+        text = render_text('вакцину', 17, TEXT_COLOR)
+        rect.union_ip(screen.blit(text, (self.x - 25, self.y - 2)))
+        return rect
 
     def button_action(self, game, chosen_city, chosen_player):
-        if len(chosen_city) > 0:
-            if game.create_vaccine(game.take_current_player(), chosen_city[0].take_virus(),
-                                   [city.take_name() for city in chosen_city]):
-                game.spending_action()
-                return True
+        # выбранный город задает вирус, вакцина делается из карт этого вируса на руке
+        if chosen_city is None:
+            return False
+        player = game.take_current_player()
+        virus = chosen_city.take_virus()
+        if game.create_vaccine(player, virus, player.cards_of(virus)):
+            game.spending_action()
+            return True
 
 
-def main(screen, players):
-    image = load_image('map.png')
-    screen.fill(BACKGROUND_COLOR)
-    screen.blit(image, (0, 0))
-    pygame.display.flip()
-    game = Game(players)
+def make_buttons(game):
+    # все кнопки партии создаются один раз; кнопки ролей - только для ролей, которые есть за столом
     buttons = [MoveButton(50, 440), BuildButton(122, 440),
                FightingButton(50, 512), TransferButton(122, 512), VaccineButton(780, 40)]
+    dispatcher = game.find_role(ROLE_DISPATCHER)
+    if dispatcher is not None:
+        buttons.append(DispatcherButton(200 + dispatcher.take_num() * 300, 600))
+    return buttons
+
+
+def main(screen, players, ai_seats=(), map_file=MAP_FILE):
+    # ai_seats - номера мест, за которые ходит ИИ, map_file - файл карты
+    city_map = load_map(map_file)
+    image = None
+    if city_map.layout.image is not None:
+        image = load_image(city_map.layout.image)
+    screen.fill(city_map.layout.background)
+    pygame.display.flip()
+    game = Game(players, city_map=city_map)
+    ai = MCTSPlayer() if ai_seats else None
+    view = MapView(game, image, *screen.get_size())
+    renderer = FrameRenderer(screen, view.static_map)
+    buttons = make_buttons(game)
+    # кнопки и карточки игроков стоят на месте, города - в сетке окна карты (view.hit_index)
+    hit_index = SpatialIndex()
+    for button in buttons:
+        hit_index.add(button.x, button.y, BUTTON_RADIUS, button)
+    for i, player in enumerate(game.take_players()):
+        hit_index.add(20 + i * 270, 600, PLAYER_HIT_RADIUS, player)
     running = True
     chosen_city = None
     chosen_player = None
     chosen_player_cords = (-100, -100)
+    hovered = None
+    show_profiler = False
+    show_risk_map = False
+    # точка, за которую тянут карту правой кнопкой мыши
+    dragging = False
+    clock = pygame.time.Clock()
     while running:
-        for event in pygame.event.get():
+        ai_turn = ai is not None and not game.is_game_over() and game.take_current_player().take_num() in ai_seats
+        clock.tick(MAX_FPS)
+        if ai_turn:
+            # пока думает ИИ, результат поиска опрашивается каждый кадр
+            events = pygame.event.get()
+        else:
+            # без панели цикл спит до события; при записи замеров в файл - не дольше интервала записи
+            timeout = 0
+            if show_profiler:
+                timeout = PROFILE_REFRESH
+            elif PROFILER.enabled and PROFILER.dump_path is not None:
+                timeout = int(PROFILER.dump_interval * 1000)
+            events = [pygame.event.wait(timeout)] + pygame.event.get()
+            if events[0].type == pygame.NOEVENT:
+                # ожидание кончилось без событий: замеры выгружаются, кадр без панели не нужен
+                PROFILER.tick()
+                if not show_profiler and len(events) == 1:
+                    continue
+        begin = time.perf_counter()
+        moved = False
+        for event in events:
             if event.type == pygame.QUIT:
                 running = False
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                city = game.get_element(event.pos)
-                if city:
-                    if chosen_city != city:
-                        chosen_city = city
+            if event.type == pygame.KEYDOWN and event.key == PROFILE_KEY:
+                show_profiler = not show_profiler
+                if show_profiler:
+                    PROFILER.enable(PROFILER.dump_path, PROFILER.dump_interval)
+            if event.type == pygame.KEYDOWN and event.key == RISK_KEY:
+                show_risk_map = not show_risk_map
+            if event.type == pygame.KEYDOWN and event.key in PAN_KEYS:
+                moved |= view.viewport.pan(*PAN_KEYS[event.key])
+            if event.type == pygame.MOUSEWHEEL:
+                moved |= view.viewport.zoom_at(pygame.mouse.get_pos(), ZOOM_STEP ** event.y)
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 3:
+                dragging = True
+            if event.type == pygame.MOUSEBUTTONUP and event.button == 3:
+                dragging = False
+            if event.type == pygame.MOUSEMOTION:
+                if dragging:
+                    moved |= view.viewport.pan(*event.rel)
+                hovered = hit_index.find(event.pos) or view.hit_index.find(event.pos)
+                if isinstance(hovered, Button) and not hovered.is_available(game.take_current_player()):
+                    hovered = None
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and not ai_turn:
+                element = hit_index.find(event.pos) or view.hit_index.find(event.pos)
+                if isinstance(element, Town):
+                    if chosen_city != element:
+                        chosen_city = element
                     else:
                         chosen_city = None
-                for button in buttons:
-                    if button.is_button_pressed(event.pos) \
-                            and button.button_action(game, chosen_city, chosen_player):
+                elif isinstance(element, Button):
+                    if element.is_available(game.take_current_player()) \
+                            and element.button_action(game, chosen_city, chosen_player):
                         chosen_player_cords = (-100, -100)
                         chosen_player = None
                         chosen_city = None
-                        break
-                for i in range(4):
-                    ex, ey = event.pos
-                    x, y = 20 + i * 270, 600
-                    dist = ((x - ex) ** 2 + (y - ey) ** 2) ** 0.5
-                    if dist <= 32.5:
-                        if chosen_player == game.take_players()[i]:
-                            chosen_player = None
-                            chosen_player_cords = (-100, -100)
-                        else:
-                            chosen_player = game.take_players()[i]
-                            chosen_player_cords = (x + 100, y)
-        if game.take_current_player().take_role() == ROLE_DISPATCHER:
-            buttons.append(DispatcherButton(200 + game.take_current_player().take_num() * 300, 600))
-        else:
-            while len(buttons) > 5:
-                buttons.pop()
-        show_game_over(screen, game)
-        new_cadr(screen, image, game, buttons)
-        if chosen_city:
-            x, y = chosen_city.take_cords()
-            draw.polygon(screen, CHOOSE_COLOR, ((x + 10, y), (x + 20, y + 10), (x + 20, y - 10)))
-        x, y = chosen_player_cords
-        draw.polygon(screen, CHOOSE_COLOR, ((x - 70, y - 10), (x - 50, y - 30), (x - 90, y - 30)))
-        pygame.display.flip()
+                elif isinstance(element, Player):
+                    if chosen_player == element:
+                        chosen_player = None
+                        chosen_player_cords = (-100, -100)
+                    else:
+                        x, y, _ = hit_index.shape(element)
+                        chosen_player = element
+                        chosen_player_cords = (x + 100, y)
+        if ai_turn:
+            # поиск идет в пуле процессов, интерфейс продолжает рисоваться
+            if not ai.is_thinking():
+                ai.start(game)
+            action = ai.poll()
+            if action is not None and not play_action(game, action):
+                game.spending_action()
+            elif action is None and not ai.is_thinking():
+                game.spending_action()
+        if moved:
+            view.refresh()
+            renderer.set_static(view.static_map)
+            hovered = None
+        events_done = time.perf_counter()
+        current = game.take_current_player()
+        map_layer = map_widgets(game, view, show_risk_map)
+        widgets = hud_widgets(game, [button for button in buttons if button.is_available(current)])
+        if chosen_city and chosen_city in view.positions:
+            pos = view.positions[chosen_city]
+            map_layer.append(('chosen_city', pos, lambda screen: show_chosen_city(screen, pos)))
+        if chosen_player:
+            widgets.append(('chosen_player', chosen_player_cords,
+                            lambda screen: show_chosen_player(screen, chosen_player_cords)))
+        if hovered is not None:
+            if isinstance(hovered, Town):
+                shape = view.hit_index.shape(hovered)
+                map_layer.append(('hovered', shape, lambda screen: show_hovered(screen, shape)))
+            else:
+                shape = hit_index.shape(hovered)
+                widgets.append(('hovered', shape, lambda screen: show_hovered(screen, shape)))
+        if ai is not None and ai.last_stats is not None:
+            stats = ai.last_stats
+            widgets.append(('ai_stats', (stats['iterations'], stats['tree_size']),
+                            lambda screen: show_ai_stats(screen, stats)))
+        if game.is_game_over():
+            widgets.append(('game_over', game.who_win(), lambda screen: show_game_over(screen, game)))
+        if show_profiler:
+            # панель обновляется два раза в секунду
+            widgets.append(('profile', int(time.monotonic() * 2),
+                            lambda screen: show_profile(screen, PROFILER.snapshot())))
+        widgets_done = time.perf_counter()
+        rects = renderer.render(map_layer, widgets)
+        render_done = time.perf_counter()
+        if rects:
+            pygame.display.update(rects)
+        if PROFILER.enabled:
+            # отрисовка делится на виджеты карты, интерфейса и остальное (статический слой, грязные области)
+            drawing = renderer.phases
+            PROFILER.record_frame([('events', events_done - begin), ('widgets', widgets_done - events_done),
+                                   ('map', drawing['map']), ('hud', drawing['hud']),
+                                   ('render', render_done - widgets_done - drawing['map'] - drawing['hud']),
+                                   ('display', time.perf_counter() - render_done)])
+    PROFILER.disable()
+    if ai is not None:
+        ai.close()
     pygame.quit()
 
 
@@ -928,6 +800,15 @@ def start_page(screen):
             manager=manager
         )
         roles.append(role)
+    controllers = []
+    for i in range(4):
+        controller = pygame_gui.elements.ui_drop_down_menu.UIDropDownMenu(
+            options_list=CONTROLLERS,
+            starting_option=CONTROLLERS[0],
+            relative_rect=pygame.Rect((410, 100 + i * 40), (120, 30)),
+            manager=manager
+        )
+        controllers.append(controller)
 
     confirm = pygame_gui.elements.UIButton(
         relative_rect=pygame.Rect((150, 300), (250, 40)),
@@ -936,6 +817,7 @@ def start_page(screen):
     )
 
     chosen_roles = [-1] * 4
+    chosen_ai = [False] * 4
     running = True
     clock = pygame.time.Clock()
     while running:
@@ -948,14 +830,20 @@ def start_page(screen):
                     for i in range(len(roles)):
                         if event.ui_element == roles[i]:
                             chosen_roles[i] = NUMBER_BY_ROLE[event.text]
+                    for i in range(len(controllers)):
+                        if event.ui_element == controllers[i]:
+                            chosen_ai[i] = event.text == CONTROLLERS[1]
                 if event.user_type == pygame_gui.UI_BUTTON_PRESSED:
                     if event.ui_element == confirm:
                         tmp = []
-                        for role in chosen_roles:
+                        ai_seats = []
+                        for role, is_ai in zip(chosen_roles, chosen_ai):
                             if role != -1:
+                                if is_ai:
+                                    ai_seats.append(len(tmp))
                                 tmp.append(role)
                         if len(set(tmp)) == len(tmp):
-                            return tmp
+                            return tmp, ai_seats
             manager.process_events(event)
         manager.update(time_delta)
         screen.blit(background, (0, 0))
@@ -964,9 +852,11 @@ def start_page(screen):
 
 
 if __name__ == '__main__':
+    if os.environ.get(PROFILE_ENV):
+        PROFILER.enable(os.environ[PROFILE_ENV])
     pygame.init()
     size = IMAGE_W, IMAGE_H + 100
     screen = pygame.display.set_mode(size)
-    players = start_page(screen)
-    if players:
-        main(screen, players)
+    chosen = start_page(screen)
+    if chosen and chosen[0]:
+        main(screen, *chosen, map_file=sys.argv[1] if len(sys.argv) > 1 else MAP_FILE)
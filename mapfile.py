@@ -0,0 +1,117 @@
+import argparse
+import json
+from array import array
+
+from engine import CityMap, VIRUS_COUNT, load_cities, load_cities_graph
+
+# файл карты (JSON): города, связи и оформление в одном месте.
+# {"version": 1, "image": "map.png" или null, "size": [ширина, высота], "background": [r, g, b],
+#  "start": "Атланта", "viruses": [[r, g, b], ...] - цвета вирусов по номеру,
+#  "cities": [[название, x, y, вирус, dx, dy], ...] - dx, dy - сдвиг подписи от центра (можно не указывать),
+#  "edges": [[номер, номер], ...], "wrap": [[номер, номер], ...] - связи, которые уходят за край карты
+#  и входят с другой стороны}. Номера городов и вирусов начинаются с 0
+FORMAT_VERSION = 1
+MAP_FILE = 'world.json'
+LABEL_OFFSET = (-5, 7)
+BACKGROUND = (112, 146, 190)
+VIRUS_COLORS = ((10, 10, 10), (0, 10, 245), (255, 255, 0), (255, 0, 0))
+
+
+class MapLayout:
+    # оформление карты в массивах по номеру города и по номеру связи (в порядке CityMap.edges)
+    def __init__(self, city_map, size=None, image=None, background=BACKGROUND, colors=VIRUS_COLORS,
+                 labels=None, wrap=()):
+        self.xs = array('i', (x for x, _ in city_map.cords))
+        self.ys = array('i', (y for _, y in city_map.cords))
+        if size is None:
+            size = (max(self.xs, default=0) + 1, max(self.ys, default=0) + 1)
+        self.size = tuple(size)
+        self.image = image
+        self.background = tuple(background)
+        self.colors = tuple(tuple(color) for color in colors)
+        self.label_dx = array('i', [LABEL_OFFSET[0]]) * len(city_map)
+        self.label_dy = array('i', [LABEL_OFFSET[1]]) * len(city_map)
+        for city, (dx, dy) in (labels or {}).items():
+            self.label_dx[city] = dx
+            self.label_dy[city] = dy
+        wrap = {tuple(sorted(edge)) for edge in wrap}
+        self.wrap = bytearray(tuple(sorted(edge)) in wrap for edge in city_map.edges)
+
+    def label_offset(self, city):
+        return self.label_dx[city], self.label_dy[city]
+
+
+def layout_of(city_map):
+    # у карты из csv-файлов оформления нет: берется оформление по умолчанию
+    if city_map.layout is None:
+        city_map.layout = MapLayout(city_map)
+    return city_map.layout
+
+
+def load_map(path):
+    with open(path, encoding='utf8') as file:
+        data = json.load(file)
+    if data.get('version') != FORMAT_VERSION:
+        raise ValueError(f'{path}: неподдерживаемая версия файла карты {data.get("version")}')
+    cities = []
+    labels = dict()
+    for num, record in enumerate(data['cities']):
+        name, x, y, virus = record[:4]
+        if not 0 <= virus < VIRUS_COUNT:
+            raise ValueError(f'{path}: у города {name} неизвестный вирус {virus}')
+        cities.append((num, name, (x, y), virus))
+        if len(record) > 4:
+            labels[num] = (record[4], record[5])
+    graph = [(c_1, c_2) for c_1, c_2 in data['edges']]
+    edges = {tuple(sorted(edge)) for edge in graph}
+    for c_1, c_2 in data.get('wrap', ()):
+        if tuple(sorted((c_1, c_2))) not in edges:
+            raise ValueError(f'{path}: связь {c_1}-{c_2} из wrap не объявлена в edges')
+    city_map = CityMap(cities, graph, data.get('start'))
+    city_map.layout = MapLayout(city_map, data.get('size'), data.get('image'), data.get('background', BACKGROUND),
+                                data.get('viruses', VIRUS_COLORS), labels, data.get('wrap', ()))
+    return city_map
+
+
+def save_map(city_map, path):
+    layout = layout_of(city_map)
+    cities = []
+    for num, (name, (x, y), virus) in enumerate(zip(city_map.names, city_map.cords, city_map.viruses)):
+        record = [name, x, y, virus]
+        if layout.label_offset(num) != LABEL_OFFSET:
+            record += layout.label_offset(num)
+        cities.append(record)
+    header = {
+        'version': FORMAT_VERSION,
+        'image': layout.image,
+        'size': list(layout.size),
+        'background': list(layout.background),
+        'start': city_map.start,
+        'viruses': [list(color) for color in layout.colors],
+    }
+    lists = {
+        'cities': cities,
+        'edges': [list(edge) for edge in city_map.edges],
+        'wrap': [list(edge) for edge, wrap in zip(city_map.edges, layout.wrap) if wrap],
+    }
+    # по городу и по связи на строку, чтобы файл было удобно править и сравнивать
+    fields = [f' "{key}": {json.dumps(value, ensure_ascii=False)}' for key, value in header.items()]
+    fields += [f' "{key}": [\n' + ',\n'.join('  ' + json.dumps(item, ensure_ascii=False) for item in items) + '\n ]'
+               for key, items in lists.items()]
+    with open(path, 'w', encoding='utf8') as file:
+        file.write('{\n' + ',\n'.join(fields) + '\n}\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Файл карты из cities.csv и graph.csv')
+    parser.add_argument('output', nargs='?', default=MAP_FILE)
+    parser.add_argument('--image', default=None)
+    parser.add_argument('--size', type=int, nargs=2, default=None)
+    parser.add_argument('--wrap', nargs='*', default=[], help='связи за край карты: номер-номер')
+    parser.add_argument('--above', nargs='*', default=[], help='города с подписью над кружком')
+    args = parser.parse_args()
+    city_map = CityMap(load_cities(), load_cities_graph())
+    wrap = [tuple(int(num) for num in edge.split('-')) for edge in args.wrap]
+    labels = {city_map.index[name]: (-15, -25) for name in args.above}
+    city_map.layout = MapLayout(city_map, args.size, args.image, labels=labels, wrap=wrap)
+    save_map(city_map, args.output)
@@ -0,0 +1,171 @@
+import argparse
+import csv
+import math
+import os
+import random
+
+from engine import CityMap, VIRUS_COUNT
+from mapfile import MapLayout, save_map
+
+# генератор синтетических карт: города в случайных точках, связи с ближайшими соседями,
+# вирусы по полосам карты с заданными долями; пишет cities.csv и graph.csv в формате load_cities
+SPACING = 60
+MEAN_DEGREE = 4.0
+MAX_DEGREE = 12
+DEGREES = ('fixed', 'poisson', 'powerlaw')
+
+
+def sample_degree(rng, distribution, mean):
+    # сколько соседей город ищет себе сам (не меньше одного); итоговая степень выше за счет чужих связей
+    if distribution == 'fixed':
+        return max(1, round(mean))
+    if distribution == 'poisson':
+        # 1 + Пуассон(mean - 1) методом Кнута
+        limit = math.exp(-max(mean - 1, 0.0))
+        degree = 1
+        product = rng.random()
+        while product > limit:
+            degree += 1
+            product *= rng.random()
+        return min(degree, MAX_DEGREE)
+    # степенной закон: Парето с минимумом 1 и средним mean
+    alpha = mean / (mean - 1) if mean > 1 else 2.0
+    return min(int(rng.paretovariate(alpha)), MAX_DEGREE)
+
+
+class PointGrid:
+    # сетка точек для поиска ближайших соседей
+    def __init__(self, xs, ys, cell):
+        self.xs = xs
+        self.ys = ys
+        self.cell = cell
+        self.cells = dict()
+        for city in range(len(xs)):
+            self.cells.setdefault((xs[city] // cell, ys[city] // cell), []).append(city)
+        self.max_ring = max(max(xs, default=0), max(ys, default=0)) // cell + 1
+
+    def nearest(self, city, need, accept):
+        # до need ближайших к city городов, для которых accept(город) истинно;
+        # кольца ячеек добавляются, пока кандидатов не хватает
+        x, y = self.xs[city], self.ys[city]
+        cx, cy = x // self.cell, y // self.cell
+        found = []
+        ring = 0
+        while ring <= self.max_ring:
+            for gx in range(cx - ring, cx + ring + 1):
+                for gy in range(cy - ring, cy + ring + 1):
+                    if max(abs(gx - cx), abs(gy - cy)) != ring:
+                        continue
+                    for other in self.cells.get((gx, gy), ()):
+                        if other != city and accept(other):
+                            found.append(((self.xs[other] - x) ** 2 + (self.ys[other] - y) ** 2, other))
+            # своя ячейка просматривается вместе с первым кольцом: город у ее края ближе к соседней ячейке
+            if len(found) >= need and ring > 0:
+                break
+            ring += 1
+        found.sort()
+        return [other for _, other in found[:need]]
+
+
+def find(parents, city):
+    while parents[city] != city:
+        parents[city] = parents[parents[city]]
+        city = parents[city]
+    return city
+
+
+def generate(count, degrees='poisson', mean_degree=MEAN_DEGREE, viruses=(1,) * VIRUS_COUNT, seed=0,
+             spacing=SPACING):
+    # связная карта из count городов; viruses - доли вирусов (цвета идут полосами слева направо)
+    rng = random.Random(seed)
+    height = max(1, int(math.sqrt(count / 2) * spacing))
+    width = 2 * height
+    xs = [rng.randrange(width) for _ in range(count)]
+    ys = [rng.randrange(height) for _ in range(count)]
+    grid = PointGrid(xs, ys, spacing)
+    neighbors = [set() for _ in range(count)]
+    edges = []
+
+    def link(c_1, c_2):
+        neighbors[c_1].add(c_2)
+        neighbors[c_2].add(c_1)
+        edges.append((c_1, c_2))
+
+    order = list(range(count))
+    rng.shuffle(order)
+    for city in order:
+        need = sample_degree(rng, degrees, mean_degree) - len(neighbors[city])
+        if need <= 0:
+            continue
+        for other in grid.nearest(city, need, lambda other: other not in neighbors[city]
+                                  and len(neighbors[other]) < MAX_DEGREE):
+            link(city, other)
+    # компоненты связности соединяются с ближайшим городом вне компоненты
+    parents = list(range(count))
+    for c_1, c_2 in edges:
+        parents[find(parents, c_1)] = find(parents, c_2)
+    roots = {find(parents, city): city for city in range(count)}
+    components = len(roots)
+    for city in roots.values():
+        if components == 1:
+            break
+        root = find(parents, city)
+        other = grid.nearest(city, 1, lambda other: find(parents, other) != root)[0]
+        link(city, other)
+        parents[root] = find(parents, other)
+        components -= 1
+    # вирусы: города по x делятся на полосы пропорционально долям
+    total = sum(viruses)
+    by_x = sorted(range(count), key=lambda city: (xs[city], ys[city]))
+    colors = [0] * count
+    start = 0
+    share = 0.0
+    for virus, weight in enumerate(viruses):
+        share += weight / total
+        stop = count if virus == len(viruses) - 1 else round(share * count)
+        for city in by_x[start:stop]:
+            colors[city] = virus
+        start = stop
+    cities = [(num, f'Город {num + 1}', (xs[num], ys[num]), colors[num]) for num in range(count)]
+    city_map = CityMap(cities, edges)
+    city_map.layout = MapLayout(city_map, (width, height))
+    return city_map
+
+
+def write_csv(city_map, directory):
+    # cities.csv и graph.csv в том же виде, что и файлы стандартной карты (номера с 1)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'cities.csv'), 'w', encoding='utf8', newline='') as file:
+        writer = csv.writer(file, delimiter=';', quotechar='"', lineterminator='\n')
+        for num, (name, (x, y), virus) in enumerate(zip(city_map.names, city_map.cords, city_map.viruses)):
+            writer.writerow([num + 1, name, x, y, virus + 1])
+    with open(os.path.join(directory, 'graph.csv'), 'w', encoding='utf8', newline='') as file:
+        writer = csv.writer(file, delimiter=';', quotechar='"', lineterminator='\n')
+        for c_1, c_2 in city_map.edges:
+            writer.writerow([c_1 + 1, c_2 + 1])
+
+
+def degree_stats(city_map):
+    degrees = [len(group) for group in city_map.neighbors]
+    return {'cities': len(city_map), 'edges': len(city_map.edges), 'mean_degree': sum(degrees) / len(degrees),
+            'max_degree': max(degrees), 'viruses': [city_map.viruses.count(virus) for virus in range(VIRUS_COUNT)]}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Генератор синтетических карт')
+    parser.add_argument('count', type=int, help='число городов')
+    parser.add_argument('directory', help='куда записать cities.csv и graph.csv')
+    parser.add_argument('--degrees', choices=DEGREES, default='poisson', help='распределение степеней')
+    parser.add_argument('--mean-degree', type=float, default=MEAN_DEGREE)
+    parser.add_argument('--viruses', type=float, nargs=VIRUS_COUNT, default=[1] * VIRUS_COUNT,
+                        help='доли вирусов')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--map', help='дополнительно записать файл карты (JSON)')
+    args = parser.parse_args()
+    if args.count < 2:
+        parser.error('нужно хотя бы 2 города')
+    city_map = generate(args.count, args.degrees, args.mean_degree, args.viruses, args.seed)
+    write_csv(city_map, args.directory)
+    if args.map:
+        save_map(city_map, args.map)
+    print(degree_stats(city_map))
@@ -0,0 +1,174 @@
+import json
+import os
+import time
+
+from engine import Game
+from cascade import OutbreakCascade
+from spatial import SpatialIndex
+
+# встроенные замеры движка и кадров интерфейса. Пока замеры выключены, методы классов
+# остаются исходными и ничего не стоят: обертки ставятся на классы при enable() и снимаются при disable()
+# имя счетчика -> (класс, метод); hit_test - поиск элемента под курсором (кнопки, игроки, города окна карты)
+PROFILED_METHODS = {
+    'infection': (Game, 'infection'),
+    'outbreak': (Game, 'outbreak'),
+    'transfer_motion': (Game, 'transfer_motion'),
+    'open_infections_card': (Game, 'open_infections_card'),
+    'create_vaccine': (Game, 'create_vaccine'),
+    'hit_test': (SpatialIndex, 'find'),
+}
+# разрешение цепочек вспышек: у Game (resolve) и у GameState в поиске ИИ (resolve_levels)
+PROFILED_CASCADES = ('resolve', 'resolve_levels')
+# верхние границы корзин гистограммы времени кадра, мс
+FRAME_BUCKETS = (1, 2, 4, 8, 16, 33, 50, 100)
+DUMP_INTERVAL = 5.0
+
+
+def bucket_name(index):
+    if index < len(FRAME_BUCKETS):
+        return f'<{FRAME_BUCKETS[index]}ms'
+    return f'>={FRAME_BUCKETS[-1]}ms'
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.originals = dict()
+        self.dump_path = None
+        self.dump_interval = DUMP_INTERVAL
+        self.last_dump = 0.0
+        self.reset()
+
+    def reset(self):
+        # по методу - [число вызовов, суммарное время в секундах]
+        self.methods = {name: [0, 0.0] for name in PROFILED_METHODS}
+        # размер цепочки вспышек -> сколько раз она случилась
+        self.cascades = dict()
+        self.frames = [0] * (len(FRAME_BUCKETS) + 1)
+        self.frame_count = 0
+        self.frame_time = 0.0
+        self.frame_max = 0.0
+        # по фазе кадра - суммарное время в секундах
+        self.phases = dict()
+        self.started = time.perf_counter()
+
+    def enable(self, dump_path=None, dump_interval=DUMP_INTERVAL):
+        # dump_path - файл, куда раз в dump_interval секунд пишется JSON со снимком счетчиков
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self.last_dump = time.monotonic()
+        if self.enabled:
+            return
+        self.enabled = True
+        for name, (cls, method_name) in PROFILED_METHODS.items():
+            method = getattr(cls, method_name)
+            self.originals[(cls, method_name)] = method
+            setattr(cls, method_name, self.timed(method, name))
+        for method_name in PROFILED_CASCADES:
+            resolve = getattr(OutbreakCascade, method_name)
+            self.originals[(OutbreakCascade, method_name)] = resolve
+            setattr(OutbreakCascade, method_name, self.counted_cascade(resolve))
+
+    def disable(self):
+        if not self.enabled:
+            return
+        for (cls, name), method in self.originals.items():
+            setattr(cls, name, method)
+        self.originals.clear()
+        self.enabled = False
+        if self.dump_path is not None:
+            self.dump(self.dump_path)
+
+    def timed(self, method, name):
+        # счетчики берутся из профилировщика при каждом вызове, поэтому reset() не трогает обертки
+        profiler = self
+        perf_counter = time.perf_counter
+
+        def wrapper(*args):
+            begin = perf_counter()
+            try:
+                return method(*args)
+            finally:
+                counter = profiler.methods[name]
+                counter[0] += 1
+                counter[1] += perf_counter() - begin
+        wrapper.__name__ = method.__name__
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+
+    def counted_cascade(self, resolve):
+        profiler = self
+
+        def wrapper(cascade, *args):
+            result = resolve(cascade, *args)
+            cascades = profiler.cascades
+            size = len(result[0])
+            cascades[size] = cascades.get(size, 0) + 1
+            return result
+        wrapper.__name__ = resolve.__name__
+        return wrapper
+
+    def record_frame(self, phases):
+        # phases - [(имя фазы, секунды)] одного кадра главного цикла
+        total = 0.0
+        for name, spent in phases:
+            self.phases[name] = self.phases.get(name, 0.0) + spent
+            total += spent
+        ms = total * 1000
+        index = 0
+        while index < len(FRAME_BUCKETS) and ms >= FRAME_BUCKETS[index]:
+            index += 1
+        self.frames[index] += 1
+        self.frame_count += 1
+        self.frame_time += total
+        self.frame_max = max(self.frame_max, total)
+        self.tick()
+
+    def tick(self):
+        # периодическая выгрузка; вызывается из главного цикла, поэтому потоки не нужны
+        if self.dump_path is None:
+            return
+        now = time.monotonic()
+        if now - self.last_dump >= self.dump_interval:
+            self.last_dump = now
+            self.dump(self.dump_path)
+
+    def snapshot(self):
+        methods = dict()
+        for name, (calls, spent) in self.methods.items():
+            methods[name] = {
+                'calls': calls,
+                'total_ms': spent * 1000,
+                'mean_us': spent / calls * 1e6 if calls else 0.0,
+            }
+        cascades = sum(self.cascades.values())
+        frames = self.frame_count
+        return {
+            'enabled': self.enabled,
+            'elapsed': time.perf_counter() - self.started,
+            'methods': methods,
+            'cascades': {
+                'count': cascades,
+                'max': max(self.cascades, default=0),
+                'mean': sum(size * count for size, count in self.cascades.items()) / cascades if cascades else 0.0,
+                'sizes': {str(size): self.cascades[size] for size in sorted(self.cascades)},
+            },
+            'frames': {
+                'count': frames,
+                'mean_ms': self.frame_time / frames * 1000 if frames else 0.0,
+                'max_ms': self.frame_max * 1000,
+                'histogram': {bucket_name(index): count for index, count in enumerate(self.frames)},
+                'phases_ms': {name: spent / frames * 1000 if frames else 0.0
+                              for name, spent in self.phases.items()},
+            },
+        }
+
+    def dump(self, path):
+        # запись через временный файл, чтобы читатель не увидел половину JSON
+        temp = path + '.tmp'
+        with open(temp, 'w', encoding='utf8') as file:
+            json.dump(self.snapshot(), file, ensure_ascii=False, indent=2)
+        os.replace(temp, path)
+
+
+PROFILER = Profiler()
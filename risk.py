@@ -0,0 +1,87 @@
+from math import comb
+
+
+def draw_tail(size, copies, draws, need):
+    # вероятность вытянуть не меньше need карт одного вида из колоды size карт, где их copies, за draws карт
+    if need <= 0:
+        return 1.0
+    draws = min(draws, size)
+    if need > min(copies, draws):
+        return 0.0
+    total = 0
+    for taken in range(need, min(copies, draws) + 1):
+        total += comb(copies, taken) * comb(size - copies, draws - taken)
+    return total / comb(size, draws)
+
+
+class OutbreakRisk:
+    # вероятности того, что на следующем ходу у города вытянут карту заражения (заражение)
+    # и вытянут больше его карт, чем в нем осталось места для кубиков (вспышка без учета цепочек).
+    # Вероятность зависит только от числа копий карты города в колоде, уровня заражения, размера колоды
+    # и заражаемости. Копии ведет сама колода (Deck.counts), уровень - город, поэтому после вытягивания
+    # меняется лишь небольшая таблица по (копии, нужно вытянуть), и ее ячейки считаются по запросу
+    def __init__(self, game, limit):
+        # limit - уровень заражения, после которого следующий кубик вызывает вспышку (MAK_CONTAMINATION)
+        self.game = game
+        self.limit = limit
+        self.viruses = game.map.viruses
+        # сколько копий карты каждого города во всей колоде заражения: столько их будет после перемешивания
+        self.totals = [0] * (len(self.viruses) + 1)
+        for card in game.take_infection_deck().cards:
+            self.totals[card] += 1
+        self.key = None
+        self.table = dict()
+
+    def refresh(self):
+        # таблица сбрасывается, когда изменились размер колоды или заражаемость
+        deck = self.game.take_infection_deck()
+        key = (deck.remaining(), self.game.take_infectivity())
+        if key != self.key:
+            self.key = key
+            self.table.clear()
+        return deck
+
+    def chance(self, deck, city, need):
+        copies = deck.counts[city]
+        cell = (copies, self.totals[city], need)
+        value = self.table.get(cell)
+        if value is None:
+            left, draws = self.key
+            if draws <= left:
+                value = draw_tail(left, copies, draws, need)
+            else:
+                # колода кончится посреди хода: ее остаток вытягивается весь, остальное - из перемешанной заново
+                value = draw_tail(len(deck.cards), self.totals[city], draws - left, need - copies)
+            self.table[cell] = value
+        return value
+
+    def immune(self, city):
+        # город под защитой специалиста по карантину или его вирус побежден
+        return self.game.protected[city] or self.game.victory_over_viruses[self.viruses[city]]
+
+    def infection_risk(self, town):
+        deck = self.refresh()
+        city = town.take_num()
+        if self.immune(city):
+            return 0.0
+        return self.chance(deck, city, 1)
+
+    def outbreak_risk(self, town):
+        deck = self.refresh()
+        city = town.take_num()
+        if self.immune(city):
+            return 0.0
+        return self.chance(deck, city, self.limit + 1 - town.take_contamination())
+
+    def risks(self, towns):
+        # (заражение, вспышка) для каждого города из towns
+        deck = self.refresh()
+        result = []
+        for town in towns:
+            city = town.take_num()
+            if self.immune(city):
+                result.append((0.0, 0.0))
+            else:
+                result.append((self.chance(deck, city, 1),
+                               self.chance(deck, city, self.limit + 1 - town.take_contamination())))
+        return result
@@ -0,0 +1,95 @@
+from array import array
+from collections import deque
+
+# расстояние до недостижимого города
+UNREACHABLE = 0xFFFF
+
+_matrices = dict()
+
+
+class DistanceMatrix:
+    # кратчайшие расстояния (в ходах между соседями) между всеми парами городов
+    def __init__(self, count, edges):
+        self.count = count
+        neighbors = [[] for _ in range(count)]
+        for c_1, c_2 in edges:
+            neighbors[c_1].append(c_2)
+            neighbors[c_2].append(c_1)
+        self.dist = array('H', [UNREACHABLE]) * (count * count)
+        for start in range(count):
+            base = start * count
+            self.dist[base + start] = 0
+            queue = deque([start])
+            while queue:
+                city = queue.popleft()
+                step = self.dist[base + city] + 1
+                for neig in neighbors[city]:
+                    if self.dist[base + neig] == UNREACHABLE:
+                        self.dist[base + neig] = step
+                        queue.append(neig)
+
+    def distance(self, c_1, c_2):
+        return self.dist[c_1 * self.count + c_2]
+
+    def row(self, city):
+        return self.dist[city * self.count:(city + 1) * self.count]
+
+
+def shared_matrix(count, edges):
+    # матрица строится один раз на карту и разделяется между партиями
+    key = (count, tuple(edges))
+    if key not in _matrices:
+        _matrices[key] = DistanceMatrix(count, edges)
+    return _matrices[key]
+
+
+class RouteIndex:
+    # расстояния с учетом станций; обновляется при постройке станции
+    def __init__(self, towns, edges):
+        self.towns = sorted(towns, key=lambda town: town.take_num())
+        self.index = {town.take_name(): town.take_num() for town in self.towns}
+        self.matrix = shared_matrix(len(self.towns), edges)
+        self.station_dist = array('H', [UNREACHABLE]) * len(self.towns)
+        for town in self.towns:
+            town.station_listeners.append(self.add_station)
+            if town.is_station():
+                self.add_station(town)
+
+    def add_station(self, town):
+        row = self.matrix.row(town.take_num())
+        station_dist = self.station_dist
+        for city in range(len(station_dist)):
+            if row[city] < station_dist[city]:
+                station_dist[city] = row[city]
+
+    def distance(self, town_1, town_2):
+        return self.matrix.distance(town_1.take_num(), town_2.take_num())
+
+    def travel_distance(self, town_1, town_2):
+        # пешком или через перелет между станциями (одно действие)
+        c_1, c_2 = town_1.take_num(), town_2.take_num()
+        return min(self.matrix.distance(c_1, c_2), self.station_dist[c_1] + 1 + self.station_dist[c_2])
+
+    def _card_cost(self, card, city):
+        # прямой рейс по карте card и дальнейший путь до city
+        return 1 + min(self.matrix.distance(card, city), self.station_dist[card] + 1 + self.station_dist[city])
+
+    def reachable(self, player, actions):
+        # города, куда игрок может попасть не более чем за actions действий со своей рукой
+        index = self.index
+        hand = [index[card] for card in player.take_hand() if card in index]
+        walk = self.matrix.row(player.take_location().take_num())
+        station_dist = self.station_dist
+        shuttle = station_dist[player.take_location().take_num()] + 1
+        costs = [min(walk[city], shuttle + station_dist[city]) for city in range(len(self.towns))]
+        # чартерный рейс: добраться до города карты, не тратя эту же карту, и сбросить её
+        for card in hand:
+            entry = min([costs[card]] + [self._card_cost(other, card) for other in hand if other != card])
+            if entry + 1 <= actions:
+                return list(self.towns)
+        for card in hand:
+            for city in range(len(costs)):
+                cost = self._card_cost(card, city)
+                if cost < costs[city]:
+                    costs[city] = cost
+        return [town for town, cost in zip(self.towns, costs) if cost <= actions]
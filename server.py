@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import itertools
+import json
+import struct
+import time
+
+from engine import Game, ROLE_DISPATCHER, ROLE_DOCTOR, ROLE_SCIENTIST, ROLE_QUARANTINE_SPECIALIST, \
+    INFECTION_CARD_NAME, VIRUS_COUNT, shared_map
+from actionlog import ActionLog, ReplayError, replay
+
+# сервер партий: много объектов Game в одном процессе asyncio.
+# Протокол - JSON по строке на сообщение (TCP или Unix-сокет). Запрос: {"id": ..., "op": ..., ...},
+# ответ: {"id": ..., "ok": true/false, ...}; рассылка состояния: {"event": "state", "game": ..., "state": ...}
+IDLE_TIMEOUT = 300
+# зерно партии хранится в журнале как 64-битное число без знака
+SEED_LIMIT = 2 ** 64
+EVICT_INTERVAL = 30
+# действия игрока: имя метода Game -> аргументы запроса
+ACTIONS = {
+    'action_with_city': ('city', 'card'),
+    'transfer_card': ('to', 'card'),
+    'create_vaccine': ('virus', 'cards'),
+    'build_station': (),
+    'fighting_virus': (),
+    'dispatcher_action': ('player', 'city', 'card'),
+}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def send(writer, message):
+    if writer.is_closing():
+        return
+    writer.write(json.dumps(message, ensure_ascii=False).encode('utf8') + b'\n')
+
+
+def is_number(value):
+    # bool в JSON - не число, хотя в Python это подкласс int
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def seat_player(players, num):
+    # игрок по номеру места из запроса; отрицательный номер Python принял бы как индекс с конца
+    if not is_number(num) or not 0 <= num < len(players):
+        raise ProtocolError(f'Нет места {num}')
+    return players[num]
+
+
+def card_name(cities, card):
+    # карта из запроса проверяется до вызова действия: журнал не может записать неизвестную карту
+    if card is not None and card != INFECTION_CARD_NAME and (not isinstance(card, str) or card not in cities):
+        raise ProtocolError(f'Нет карты {card}')
+    return card
+
+
+def game_state(game):
+    # все, что видно за столом: в этой игре руки игроков открыты, порядок колод скрыт
+    cities = list(game.take_cities_list())
+    return {
+        'turn': game.turn,
+        'current': game.take_current_player().take_num(),
+        'actions_left': game.how_many_actions(),
+        'infectivity': game.take_infectivity(),
+        'outbreaks': game.take_scale_outbreaks(),
+        'vaccines': game.take_vaccines(),
+        'virus_units': game.take_viruses_unit(),
+        'contamination': [city.take_contamination() for city in cities],
+        'stations': [city.take_num() for city in cities if city.is_station()],
+        'players': [{'role': player.take_role(), 'location': player.take_location().take_name(),
+                     'hand': player.take_hand()} for player in game.take_players()],
+        'players_pack': game.take_player_pack(),
+        'last_infections': game.take_last_infections(),
+        'last_outbreaks': game.take_last_outbreaks(),
+        'game_over': game.is_game_over(),
+        'winner': game.who_win(),
+        'loss_reason': game.take_loss_reason(),
+    }
+
+
+class Session:
+    # одна партия: игра, ее журнал, подключенные клиенты и занятые ими места
+    def __init__(self, game, log):
+        self.game = game
+        self.log = log
+        self.lock = asyncio.Lock()
+        self.clients = set()
+        self.seats = dict()
+        self.last_active = time.monotonic()
+
+    def broadcast(self, message):
+        for writer in self.clients:
+            send(writer, message)
+
+    async def publish(self, message):
+        # рассылка с ожиданием отправки: под замком партии обновления уходят клиентам по порядку
+        self.broadcast(message)
+        for writer in list(self.clients):
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+
+class GameServer:
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, evict_interval=EVICT_INTERVAL):
+        self.idle_timeout = idle_timeout
+        self.evict_interval = evict_interval
+        self.sessions = dict()
+        # партии, к которым подключен клиент: writer -> номера партий
+        self.joined = dict()
+        # выгруженные партии: номер -> журнал действий, по которому партия восстанавливается
+        self.archived = dict()
+        self.ids = itertools.count(1)
+        self.map = None
+        self.server = None
+        self.evictor = None
+
+    def session(self, game_id):
+        session = self.sessions.get(game_id)
+        if session is not None:
+            return session
+        data = self.archived.get(game_id)
+        if data is None:
+            raise ProtocolError(f'Нет партии {game_id}')
+        # журнал убирается из архива только после восстановления, иначе партия потерялась бы
+        try:
+            game = replay(data, verify=False)
+        except (ReplayError, struct.error) as error:
+            raise ProtocolError(f'Партия {game_id} не восстанавливается: {error}')
+        del self.archived[game_id]
+        log = ActionLog.resume(game, data)
+        game.log = log
+        session = Session(game, log)
+        self.sessions[game_id] = session
+        return session
+
+    def evict(self, game_id):
+        # партия выгружается в журнал; клиенты получают уведомление и могут подключиться снова
+        session = self.sessions.pop(game_id)
+        self.archived[game_id] = session.log.to_bytes()
+        session.broadcast({'event': 'evicted', 'game': game_id})
+        for writer in session.clients:
+            self.joined[writer].discard(game_id)
+
+    def evict_idle(self):
+        deadline = time.monotonic() - self.idle_timeout
+        for game_id in [game_id for game_id, session in self.sessions.items()
+                        if session.last_active < deadline and not session.lock.locked()]:
+            self.evict(game_id)
+
+    async def evict_loop(self):
+        while True:
+            await asyncio.sleep(self.evict_interval)
+            self.evict_idle()
+
+    def op_create(self, writer, request):
+        roles = request.get('roles') or [ROLE_DOCTOR, ROLE_SCIENTIST]
+        if not isinstance(roles, list) or not 2 <= len(roles) <= 4 or len(set(roles)) != len(roles):
+            raise ProtocolError('Нужно от 2 до 4 разных ролей')
+        for role in roles:
+            if not is_number(role) or not ROLE_DISPATCHER <= role <= ROLE_QUARANTINE_SPECIALIST:
+                raise ProtocolError(f'Нет роли {role}')
+        seed = request.get('seed')
+        if seed is not None and (not is_number(seed) or not 0 <= seed < SEED_LIMIT):
+            raise ProtocolError(f'Зерно должно быть целым от 0 до 2^64 - 1, получено {seed}')
+        log = ActionLog()
+        game = Game(roles, seed, log)
+        game_id = next(self.ids)
+        self.sessions[game_id] = Session(game, log)
+        return {'game': game_id, 'seats': len(roles)}
+
+    def op_map(self, writer, request):
+        if self.map is None:
+            city_map = shared_map()
+            self.map = {'names': city_map.names, 'cords': city_map.cords, 'viruses': city_map.viruses,
+                        'neighbors': city_map.neighbors}
+        return self.map
+
+    def op_list(self, writer, request):
+        return {'active': list(self.sessions), 'archived': list(self.archived)}
+
+    def op_join(self, writer, request):
+        # seat - номер места за столом; без него клиент только наблюдает
+        game_id = request.get('game')
+        session = self.session(game_id)
+        seat = request.get('seat')
+        if seat is not None:
+            seat_player(session.game.take_players(), seat)
+            if session.seats.get(seat, writer) is not writer:
+                raise ProtocolError(f'Место {seat} занято')
+            session.seats[seat] = writer
+        session.clients.add(writer)
+        self.joined.setdefault(writer, set()).add(game_id)
+        session.last_active = time.monotonic()
+        return {'game': game_id, 'seat': seat, 'state': game_state(session.game)}
+
+    def op_leave(self, writer, request):
+        game_id = request.get('game')
+        self.detach(self.session(game_id), writer)
+        self.joined.get(writer, set()).discard(game_id)
+        return {}
+
+    def op_state(self, writer, request):
+        session = self.session(request.get('game'))
+        session.last_active = time.monotonic()
+        return {'state': game_state(session.game)}
+
+    async def op_act(self, writer, request):
+        game_id = request.get('game')
+        session = self.session(game_id)
+        async with session.lock:
+            game = session.game
+            player = game.take_current_player()
+            if session.seats.get(player.take_num()) is not writer:
+                raise ProtocolError('Сейчас ходит не ваше место')
+            if game.is_game_over():
+                raise ProtocolError('Партия окончена')
+            done = self.apply(game, player, request.get('action'), request.get('args') or {})
+            if done:
+                game.spending_action()
+                await session.publish({'event': 'state', 'game': game_id, 'state': game_state(game)})
+            session.last_active = time.monotonic()
+        return {'done': bool(done)}
+
+    def apply(self, game, player, action, args):
+        # аргументы запроса (названия городов и карт, номера мест) переводятся в объекты игры
+        if action not in ACTIONS:
+            raise ProtocolError(f'Неизвестное действие {action}')
+        cities = game.cities
+        players = game.take_players()
+        try:
+            if action == 'action_with_city':
+                return game.action_with_city(player, cities[args['city']], card_name(cities, args.get('card')))
+            if action == 'transfer_card':
+                return game.transfer_card(player, seat_player(players, args['to']), card_name(cities, args['card']))
+            if action == 'create_vaccine':
+                virus = int(args['virus'])
+                if not 0 <= virus < VIRUS_COUNT:
+                    raise ProtocolError(f'Нет вируса {virus}')
+                cards = [card_name(cities, card) for card in args['cards']]
+                return game.create_vaccine(player, virus, cards)
+            if action == 'build_station':
+                return game.build_station(player, player.take_location())
+            if action == 'fighting_virus':
+                return game.fighting_virus(player)
+            return game.dispatcher_action(seat_player(players, args['player']), cities[args['city']],
+                                          card_name(cities, args.get('card')))
+        except (KeyError, IndexError, TypeError, ValueError) as error:
+            raise ProtocolError(f'Неверные аргументы {action}: {error}')
+
+    def detach(self, session, writer):
+        session.clients.discard(writer)
+        for seat in [seat for seat, owner in session.seats.items() if owner is writer]:
+            del session.seats[seat]
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = None
+                try:
+                    request = json.loads(line)
+                    handler = getattr(self, 'op_' + str(request.get('op')), None)
+                    if handler is None:
+                        raise ProtocolError(f'Неизвестная операция {request.get("op")}')
+                    result = handler(writer, request)
+                    if asyncio.iscoroutine(result):
+                        result = await result
+                    response = {'ok': True}
+                    response.update(result)
+                except (ProtocolError, ValueError, TypeError, AttributeError) as error:
+                    response = {'ok': False, 'error': str(error)}
+                if isinstance(request, dict) and 'id' in request:
+                    response['id'] = request['id']
+                send(writer, response)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for game_id in self.joined.pop(writer, ()):
+                self.detach(self.sessions[game_id], writer)
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8765, path=None):
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port)
+        self.evictor = asyncio.create_task(self.evict_loop())
+
+    async def stop(self):
+        self.evictor.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def serve(self, host='127.0.0.1', port=8765, path=None):
+        await self.start(host, port, path)
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Сервер партий')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='путь Unix-сокета вместо TCP')
+    parser.add_argument('--idle', type=float, default=IDLE_TIMEOUT, help='секунд простоя до выгрузки партии')
+    args = parser.parse_args()
+    try:
+        asyncio.run(GameServer(args.idle).serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
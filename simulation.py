@@ -0,0 +1,183 @@
+import argparse
+import json
+import random
+from collections import Counter
+from multiprocessing import Pool, cpu_count
+
+from engine import Game, Town, PLAYER_ACTIONS, VIRUS_COUNT, ROLE_SCIENTIST, ROLE_RESEARCHER, ROLE_DOCTOR, \
+    LOSS_OUTBREAKS, LOSS_VIRUS_UNITS, LOSS_PLAYER_PACK
+
+# пакетная симуляция целых партий без интерфейса
+MAX_GAME_ACTIONS = 10000
+LOSS_NAMES = {LOSS_OUTBREAKS: 'outbreaks', LOSS_VIRUS_UNITS: 'virus_units', LOSS_PLAYER_PACK: 'player_pack'}
+
+
+def try_vaccine(game, player):
+    for virus in range(VIRUS_COUNT):
+        if player.can_cure(virus) and game.create_vaccine(player, virus, player.cards_of(virus)):
+            return True
+    return False
+
+
+def try_transfer(game, player, rng):
+    hand = player.take_hand()
+    if not hand:
+        return False
+    for other in game.take_players():
+        if other is player:
+            continue
+        if other.take_location() == player.take_location() or \
+                ROLE_RESEARCHER in (player.take_role(), other.take_role()):
+            return game.transfer_card(player, other, rng.choice(hand))
+    return False
+
+
+def random_policy(game, rng):
+    # случайное допустимое действие текущего игрока
+    player = game.take_current_player()
+    location = player.take_location()
+    actions = ['vaccine', 'fight', 'build', 'transfer', 'move', 'move', 'move']
+    rng.shuffle(actions)
+    for action in actions:
+        if action == 'vaccine' and try_vaccine(game, player):
+            return True
+        if action == 'fight' and game.fighting_virus(player):
+            return True
+        if action == 'build' and game.build_station(player, location):
+            return True
+        if action == 'transfer' and try_transfer(game, player, rng):
+            return True
+        if action == 'move':
+            # множество соседей обходится в порядке адресов объектов, поэтому для повторяемости партий
+            # соседи упорядочиваются по номеру
+            neighbors = sorted(location.take_neighbors(), key=Town.take_num)
+            if game.action_with_city(player, rng.choice(neighbors)):
+                return True
+    return False
+
+
+def greedy_policy(game, rng):
+    # вакцина, затем лечение, затем движение к самому зараженному соседу
+    player = game.take_current_player()
+    location = player.take_location()
+    if try_vaccine(game, player):
+        return True
+    if game.fighting_virus(player):
+        return True
+    if player.take_role() != ROLE_DOCTOR and game.build_station(player, location):
+        return True
+    neighbors = sorted(location.take_neighbors(), key=Town.take_num)
+    rng.shuffle(neighbors)
+    target = max(neighbors, key=lambda city: city.take_contamination())
+    return game.action_with_city(player, target)
+
+
+def risk_policy(game, rng):
+    # вакцина; лечение, если вспышка здесь на следующем ходу не менее вероятна, чем у соседей;
+    # иначе движение к соседу с самым высоким риском вспышки (при равенстве - к самому зараженному)
+    player = game.take_current_player()
+    location = player.take_location()
+    if try_vaccine(game, player):
+        return True
+    risk = game.take_risk()
+    neighbors = sorted(location.take_neighbors(), key=Town.take_num)
+    rng.shuffle(neighbors)
+    target = max(neighbors, key=lambda city: (risk.outbreak_risk(city), city.take_contamination()))
+    if risk.outbreak_risk(location) >= risk.outbreak_risk(target) and game.fighting_virus(player):
+        return True
+    if player.take_role() != ROLE_DOCTOR and game.build_station(player, location):
+        return True
+    return game.action_with_city(player, target)
+
+
+POLICIES = {'random': random_policy, 'greedy': greedy_policy, 'risk': risk_policy}
+
+
+def play_game(roles, policy, seed, city_map=None):
+    # одна партия до конца; возвращает (победитель, причина поражения, ходы, вспышки)
+    rng = random.Random(seed)
+    game = Game(roles, seed, city_map=city_map)
+    turns = 0
+    for _ in range(MAX_GAME_ACTIONS):
+        if game.is_game_over():
+            break
+        policy(game, rng)
+        game.spending_action()
+        if game.how_many_actions() == PLAYER_ACTIONS:
+            turns += 1
+    return game.who_win(), game.take_loss_reason(), turns, game.take_scale_outbreaks()
+
+
+def empty_stats():
+    return {'games': 0, 'wins': 0, 'losses': Counter(), 'turns': Counter(), 'outbreaks': Counter()}
+
+
+def add_result(stats, result):
+    winner, reason, turns, outbreaks = result
+    stats['games'] += 1
+    if winner:
+        stats['wins'] += 1
+    else:
+        stats['losses'][LOSS_NAMES.get(reason, 'unfinished')] += 1
+    stats['turns'][turns] += 1
+    stats['outbreaks'][outbreaks] += 1
+
+
+def merge_stats(stats, other):
+    stats['games'] += other['games']
+    stats['wins'] += other['wins']
+    for key in ('losses', 'turns', 'outbreaks'):
+        stats[key].update(other[key])
+
+
+def run_chunk(args):
+    # работа одного процесса: партии с номерами [start, stop)
+    roles, policy_name, seed, start, stop = args
+    policy = POLICIES[policy_name]
+    stats = empty_stats()
+    for index in range(start, stop):
+        add_result(stats, play_game(roles, policy, seed + index))
+    return stats
+
+
+def run_batch(games, roles, policy='random', seed=0, workers=None, chunk_size=256):
+    # партии раскладываются по пулу процессов; зерно партии зависит только от её номера,
+    # поэтому результат не зависит от числа процессов
+    chunks = [(tuple(roles), policy, seed, start, min(start + chunk_size, games))
+              for start in range(0, games, chunk_size)]
+    stats = empty_stats()
+    if workers == 1:
+        for chunk in chunks:
+            merge_stats(stats, run_chunk(chunk))
+        return stats
+    with Pool(workers or cpu_count()) as pool:
+        for chunk_stats in pool.imap_unordered(run_chunk, chunks):
+            merge_stats(stats, chunk_stats)
+    return stats
+
+
+def summary(stats):
+    games = max(stats['games'], 1)
+    turns = sum(turn * count for turn, count in stats['turns'].items())
+    outbreaks = sum(value * count for value, count in stats['outbreaks'].items())
+    return {
+        'games': stats['games'],
+        'win_rate': stats['wins'] / games,
+        'losses': dict(sorted(stats['losses'].items())),
+        'mean_turns': turns / games,
+        'mean_outbreaks': outbreaks / games,
+        'turns': dict(sorted(stats['turns'].items())),
+        'outbreaks': dict(sorted(stats['outbreaks'].items())),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Пакетная симуляция партий')
+    parser.add_argument('-n', '--games', type=int, default=1000)
+    parser.add_argument('--roles', type=int, nargs='+', default=[ROLE_DOCTOR, ROLE_SCIENTIST])
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='random')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    result = run_batch(args.games, args.roles, args.policy, args.seed, args.workers)
+    print(json.dumps(summary(result), ensure_ascii=False, indent=2))
@@ -0,0 +1,169 @@
+import random
+import struct
+from array import array
+
+from engine import Game, VIRUS_COUNT, shared_map
+from deck import Deck
+
+# двоичный снимок партии: все изменяемое состояние Game в одном буфере, без журнала и без разбора карты.
+# Заголовок, числа партии, роли, байт на город (заражение и станция), игроки с руками, обе колоды
+# с курсорами, последние заражения и вспышки, состояние генератора случайных чисел
+SNAPSHOT_MAGIC = b'PNDS'
+SNAPSHOT_VERSION = 1
+# сигнатура, версия, контрольная сумма карты, зерно, число городов, число игроков
+HEADER = struct.Struct('<4sBIQIB')
+# ход, осталось действий, текущий игрок, вспышки, заражаемость, флаги, причина поражения,
+# вакцины и побежденные вирусы битами, кубики вирусов
+STATE = struct.Struct(f'<IBBHBBBBB{VIRUS_COUNT}H')
+COUNT = struct.Struct('<I')
+DECK = struct.Struct('<II')
+# состояние генератора: 624 слова Мерсенн-Твистера и позиция, затем запасное значение gauss
+RANDOM_WORDS = 625
+RANDOM_TAIL = struct.Struct('<Bd')
+GAME_OVER = 1
+PLAYERS_WON = 2
+NO_WINNER = 4
+STATION = 8
+CONTAMINATION_MASK = 7
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def card_type(count):
+    # номера карт со знаком, чтобы карта усиления заражаемости (-1) писалась как есть
+    return 'h' if count < 0x7FFF else 'i'
+
+
+def bits(flags):
+    value = 0
+    for i, flag in enumerate(flags):
+        if flag:
+            value |= 1 << i
+    return value
+
+
+def save_snapshot(game):
+    city_map = game.map
+    count = len(city_map)
+    index = city_map.index
+    typecode = card_type(count)
+    players = game.take_players()
+    flags = 0
+    if game.game_over:
+        flags |= GAME_OVER
+    if game.winner is None:
+        flags |= NO_WINNER
+    elif game.winner:
+        flags |= PLAYERS_WON
+    data = bytearray(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, city_map.checksum(), game.seed, count,
+                                 len(players)))
+    data += STATE.pack(game.turn, game.remaining_actions, game.current_player.take_num(), game.scale_outbreaks,
+                       game.scale_infectivity, flags, game.loss_reason or 0, bits(game.vaccines),
+                       bits(game.victory_over_viruses), *game.viruses_units)
+    data += bytes(player.take_role() for player in players)
+    data += bytes(town.contamination | (STATION if town.station else 0) for town in game.cities.values())
+    for player in players:
+        hand = player.take_hand()
+        data.append(len(hand))
+        data += array(typecode, [player.take_location().take_num()] + [city_map.card_id(card) for card in hand])
+    for deck in (game.players_pack, game.infection_pack):
+        data += DECK.pack(len(deck.cards), deck.pos)
+        data += array(typecode, deck.cards)
+    for names in (game.last_infections, game.last_outbreaks):
+        data += COUNT.pack(len(names))
+        data += array(typecode, [index[name] for name in names])
+    _, internal, gauss = game.rng.getstate()
+    data += array('I', internal)
+    data += RANDOM_TAIL.pack(gauss is not None, gauss or 0.0)
+    return bytes(data)
+
+
+def load_snapshot(data, city_map=None):
+    # партия из снимка; city_map - карта, на которой он снят (по умолчанию общая карта)
+    magic, version, crc, seed, count, players_count = HEADER.unpack_from(data, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise SnapshotError('Неизвестный формат снимка')
+    if city_map is None:
+        city_map = shared_map()
+    if len(city_map) != count or city_map.checksum() != crc:
+        raise SnapshotError('Снимок снят на другой карте')
+    typecode = card_type(count)
+    width = array(typecode).itemsize
+    pos = HEADER.size
+    state = STATE.unpack_from(data, pos)
+    pos += STATE.size
+    turn, remaining_actions, current, scale_outbreaks, scale_infectivity, flags, loss_reason, vaccines, \
+        victory = state[:9]
+    roles = list(data[pos:pos + players_count])
+    pos += players_count
+
+    game = Game.__new__(Game)
+    game.seed = seed
+    game.log = None
+    game.turn = turn
+    game.setup_board(roles, city_map)
+    towns = list(game.cities.values())
+    for town, cell in zip(towns, data[pos:pos + count]):
+        town.contamination = cell & CONTAMINATION_MASK
+        town.station = bool(cell & STATION)
+    pos += count
+    names = city_map.names
+    start = towns[city_map.index[city_map.start]]
+    for player in game.players:
+        size = data[pos]
+        cards = array(typecode, data[pos + 1:pos + 1 + (size + 1) * width])
+        pos += 1 + (size + 1) * width
+        location = towns[cards[0]]
+        start.del_player(player)
+        location.add_player(player)
+        player.set_location(location)
+        for card in cards[1:]:
+            player.add_card(city_map.card_name(card))
+    game.protected[:] = bytes(count)
+    if game.specialist is not None:
+        game.set_protection(game.specialist.take_location().take_num(), 1)
+    decks = []
+    for _ in range(2):
+        size, drawn = DECK.unpack_from(data, pos)
+        pos += DECK.size
+        decks.append(Deck.restore(array(typecode, data[pos:pos + size * width]), drawn, count))
+        pos += size * width
+    game.players_pack, game.infection_pack = decks
+    lasts = []
+    for _ in range(2):
+        size = COUNT.unpack_from(data, pos)[0]
+        pos += COUNT.size
+        lasts.append([names[city] for city in array(typecode, data[pos:pos + size * width])])
+        pos += size * width
+    game.last_infections, game.last_outbreaks = lasts
+    internal = array('I', data[pos:pos + RANDOM_WORDS * 4])
+    pos += RANDOM_WORDS * 4
+    has_gauss, gauss = RANDOM_TAIL.unpack_from(data, pos)
+    game.rng = random.Random()
+    game.rng.setstate((3, tuple(internal), gauss if has_gauss else None))
+
+    game.scale_outbreaks = scale_outbreaks
+    game.scale_infectivity = scale_infectivity
+    game.vaccines = [bool(vaccines >> virus & 1) for virus in range(VIRUS_COUNT)]
+    game.viruses_units = list(state[9:])
+    game.victory_over_viruses = [bool(victory >> virus & 1) for virus in range(VIRUS_COUNT)]
+    game.game_over = bool(flags & GAME_OVER)
+    game.winner = None if flags & NO_WINNER else bool(flags & PLAYERS_WON)
+    game.loss_reason = loss_reason or None
+    game.remaining_actions = remaining_actions
+    game.current_player = game.players[current]
+    game._reset_caches()
+    game.rehash()
+    return game
+
+
+def write_snapshot(game, path):
+    with open(path, 'wb') as file:
+        file.write(save_snapshot(game))
+
+
+def read_snapshot(path, city_map=None):
+    with open(path, 'rb') as file:
+        return load_snapshot(file.read(), city_map)
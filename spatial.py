@@ -0,0 +1,54 @@
+# равномерная сетка для поиска элемента под курсором
+GRID_CELL = 32
+
+
+class SpatialIndex:
+    # элементы - круги; при пересечении побеждает добавленный раньше
+    def __init__(self, cell=GRID_CELL):
+        self.cell = cell
+        self.cells = dict()
+        self.shapes = dict()
+        self.order = 0
+
+    def _cell_range(self, x, y, radius):
+        cell = self.cell
+        return range(int((x - radius) // cell), int((x + radius) // cell) + 1), \
+            range(int((y - radius) // cell), int((y + radius) // cell) + 1)
+
+    def add(self, x, y, radius, element):
+        self.remove(element)
+        shape = (self.order, x, y, radius * radius, element)
+        self.order += 1
+        self.shapes[id(element)] = (x, y, radius, shape)
+        xs, ys = self._cell_range(x, y, radius)
+        for cx in xs:
+            for cy in ys:
+                self.cells.setdefault((cx, cy), []).append(shape)
+
+    def remove(self, element):
+        if id(element) not in self.shapes:
+            return
+        x, y, radius, shape = self.shapes.pop(id(element))
+        xs, ys = self._cell_range(x, y, radius)
+        for cx in xs:
+            for cy in ys:
+                self.cells[(cx, cy)].remove(shape)
+
+    def shape(self, element):
+        # (x, y, радиус) элемента
+        x, y, radius, _ = self.shapes[id(element)]
+        return x, y, radius
+
+    def find(self, pos):
+        ex, ey = pos
+        best = None
+        for shape in self.cells.get((int(ex // self.cell), int(ey // self.cell)), ()):
+            order, x, y, radius_2, element = shape
+            if (x - ex) ** 2 + (y - ey) ** 2 <= radius_2 and (best is None or order < best[0]):
+                best = shape
+        if best is None:
+            return None
+        return best[4]
+
+    def __len__(self):
+        return len(self.shapes)
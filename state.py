@@ -0,0 +1,378 @@
+import random
+
+from cascade import OutbreakCascade
+from zobrist import copy_key, fold_counters
+from engine import INFECTION_CARD, MAK_CONTAMINATION, HOW_TAKE, \
+    MAX_OUTBREAKS_COUNT, INFECTIVITY, VIRUS_UNITS_COUNT, MAX_CARDS_IN_HAND, PLAYER_ACTIONS, \
+    GAME_WIN, PLAYERS_WIN, LOSS_OUTBREAKS, LOSS_VIRUS_UNITS, LOSS_PLAYER_PACK, ROLE_DISPATCHER, ROLE_DOCTOR, \
+    ROLE_RESEARCHER, ROLE_ENGINEER, ROLE_QUARANTINE_SPECIALIST, cure_size
+
+
+class GameState:
+    # состояние партии в плоских списках; clone() копирует только изменяемые списки
+    __slots__ = ('map', 'cascade', 'rng',
+                 'keys', 'location_keys', 'card_keys', 'zobrist',
+                 'turn', 'roles', 'by_role', 'specialist', 'protected',
+                 'contamination', 'stations', 'station_cities', 'locations', 'hands',
+                 'players_pack', 'players_pos', 'infection_pack', 'infection_pos', 'complete_pack',
+                 'scale_outbreaks', 'scale_infectivity', 'vaccines', 'viruses_units', 'victory_over_viruses',
+                 'game_over', 'winner', 'loss_reason', 'remaining_actions', 'current', 'last_infections')
+
+    @classmethod
+    def from_game(cls, game, city_map=None):
+        # снимок объекта Game
+        if city_map is None:
+            city_map = game.map
+        state = cls.__new__(cls)
+        state.map = city_map
+        # цепочки вспышек разрешаются одним объектом на все копии состояния: маска защиты и уровни
+        # заражения передаются в каждый вызов
+        state.cascade = OutbreakCascade(None, neighbors=city_map.neighbors, viruses=city_map.viruses)
+        # генератор для перемешивания колоды заражения - копия генератора партии, поэтому состояние
+        # перемешивает ее так же, как Game
+        state.rng = random.Random()
+        state.rng.setstate(game.rng.getstate())
+        # хеш позиции в тех же ключах, что у Game: ведется при каждом изменении, как Game.state_hash
+        state.keys = city_map.zobrist_keys()
+        players = [state.keys.player(num) for num in range(len(game.take_players()))]
+        state.location_keys = tuple(locations for locations, _ in players)
+        state.card_keys = tuple(cards for _, cards in players)
+        state.zobrist = game.state_hash.value
+        state.turn = game.turn
+        towns = [game.cities[name] for name in city_map.names]
+        state.roles = tuple(player.take_role() for player in game.take_players())
+        # номер игрока по роли (первый, если роль повторяется) и маска городов под защитой
+        # специалиста по карантину, как в Game
+        state.by_role = {role: player.take_num() for role, player in game.by_role.items()}
+        state.specialist = state.by_role.get(ROLE_QUARANTINE_SPECIALIST)
+        state.protected = bytearray(game.protected)
+        state.contamination = [town.take_contamination() for town in towns]
+        state.stations = [town.is_station() for town in towns]
+        state.station_cities = [city for city, station in enumerate(state.stations) if station]
+        state.locations = [city_map.index[player.take_location().take_name()] for player in game.take_players()]
+        state.hands = [[city_map.card_id(card) for card in player.take_hand()] for player in game.take_players()]
+        players_deck = game.take_players_deck()
+        state.players_pack = tuple(players_deck.peek(players_deck.remaining()))
+        state.players_pos = 0
+        infection_deck = game.take_infection_deck()
+        state.infection_pack = tuple(infection_deck.peek(infection_deck.remaining()))
+        state.infection_pos = 0
+        state.complete_pack = tuple(infection_deck.cards)
+        state.scale_outbreaks = game.scale_outbreaks
+        state.scale_infectivity = game.scale_infectivity
+        state.vaccines = list(game.vaccines)
+        state.viruses_units = list(game.viruses_units)
+        state.victory_over_viruses = list(game.victory_over_viruses)
+        state.game_over = game.game_over
+        state.winner = game.winner
+        state.loss_reason = game.loss_reason
+        state.remaining_actions = game.remaining_actions
+        state.current = game.take_current_player().take_num()
+        state.last_infections = [city_map.index[card] for card in game.take_last_infections()]
+        return state
+
+    def clone(self, rng=None):
+        # колоды хранятся кортежами с курсором и разделяются между копиями.
+        # rng - генератор копии; без него копируется состояние генератора, чтобы розыгрыш
+        # из копии не менял будущие перемешивания исходного состояния
+        state = GameState.__new__(GameState)
+        state.map = self.map
+        state.cascade = self.cascade
+        if rng is None:
+            rng = random.Random()
+            rng.setstate(self.rng.getstate())
+        state.rng = rng
+        state.keys = self.keys
+        state.location_keys = self.location_keys
+        state.card_keys = self.card_keys
+        state.zobrist = self.zobrist
+        state.turn = self.turn
+        state.roles = self.roles
+        state.by_role = self.by_role
+        state.specialist = self.specialist
+        state.protected = self.protected[:]
+        state.contamination = self.contamination[:]
+        state.stations = self.stations[:]
+        state.station_cities = self.station_cities[:]
+        state.locations = self.locations[:]
+        state.hands = [hand[:] for hand in self.hands]
+        state.players_pack = self.players_pack
+        state.players_pos = self.players_pos
+        state.infection_pack = self.infection_pack
+        state.infection_pos = self.infection_pos
+        state.complete_pack = self.complete_pack
+        state.scale_outbreaks = self.scale_outbreaks
+        state.scale_infectivity = self.scale_infectivity
+        state.vaccines = self.vaccines[:]
+        state.viruses_units = self.viruses_units[:]
+        state.victory_over_viruses = self.victory_over_viruses[:]
+        state.game_over = self.game_over
+        state.winner = self.winner
+        state.loss_reason = self.loss_reason
+        state.remaining_actions = self.remaining_actions
+        state.current = self.current
+        state.last_infections = self.last_infections[:]
+        return state
+
+    def find_role(self, role):
+        return self.by_role.get(role)
+
+    def __eq__(self, other):
+        # равенство для таблицы транспозиций: одна позиция на одной карте, как бы к ней ни пришли
+        if not isinstance(other, GameState):
+            return NotImplemented
+        return self.map is other.map and self.take_state_hash() == other.take_state_hash()
+
+    def __hash__(self):
+        return self.take_state_hash()
+
+    def take_state_hash(self):
+        # ключ таблицы транспозиций; для состояния из Game равен game.take_state_hash()
+        vaccines = sum(1 << virus for virus, done in enumerate(self.vaccines) if done)
+        outcome = 0 if not self.game_over else 1 + bool(self.winner)
+        return self.zobrist ^ fold_counters(self.keys, (
+            self.turn, self.remaining_actions, self.current, self.scale_outbreaks, self.scale_infectivity,
+            vaccines, len(self.players_pack) - self.players_pos, len(self.infection_pack) - self.infection_pos,
+            outcome))
+
+    def set_contamination(self, city, level):
+        keys = self.keys.towns[city]
+        self.zobrist ^= keys[self.contamination[city]] ^ keys[level]
+        self.contamination[city] = level
+
+    def add_card(self, player, card):
+        hand = self.hands[player]
+        hand.append(card)
+        self.zobrist ^= copy_key(self.card_keys[player][card], hand.count(card))
+
+    def del_card(self, player, card):
+        hand = self.hands[player]
+        self.zobrist ^= copy_key(self.card_keys[player][card], hand.count(card))
+        hand.remove(card)
+
+    def set_protection(self, city, value):
+        self.protected[city] = value
+        for neig in self.map.neighbors[city]:
+            self.protected[neig] = value
+
+    def players_in(self, city):
+        return [num for num, location in enumerate(self.locations) if location == city]
+
+    def players_pack_left(self):
+        return len(self.players_pack) - self.players_pos
+
+    def take_infectivity(self):
+        return INFECTIVITY[self.scale_infectivity]
+
+    # правила игры, повторяющие методы Game, но над номерами городов и игроков
+    def infection(self, city):
+        virus = self.map.viruses[city]
+        if self.victory_over_viruses[virus] or self.viruses_units[virus] == 0:
+            return True
+        if self.protected[city]:
+            return True
+        if self.contamination[city] == MAK_CONTAMINATION:
+            return False
+        self.set_contamination(city, self.contamination[city] + 1)
+        self.viruses_units[virus] -= 1
+        if self.viruses_units[virus] == 0:
+            self.finish(GAME_WIN, LOSS_VIRUS_UNITS)
+        return True
+
+    def outbreak(self, start_city):
+        chain, exhausted = self.cascade.resolve_levels(start_city, self.contamination, MAK_CONTAMINATION,
+                                                       self.protected, self.viruses_units,
+                                                       self.victory_over_viruses)
+        town_keys = self.keys.towns
+        for city in self.cascade.infected:
+            level = self.contamination[city]
+            self.zobrist ^= town_keys[city][level - 1] ^ town_keys[city][level]
+        self.scale_outbreaks += len(chain)
+        if exhausted:
+            self.finish(GAME_WIN, LOSS_VIRUS_UNITS)
+        if self.scale_outbreaks >= MAX_OUTBREAKS_COUNT:
+            self.finish(GAME_WIN, LOSS_OUTBREAKS)
+
+    def city_infection(self, city):
+        if not self.infection(city):
+            self.outbreak(city)
+
+    def medication(self, player, city):
+        virus = self.map.viruses[city]
+        if self.roles[player] == ROLE_DOCTOR or self.vaccines[virus]:
+            if self.contamination[city] == 0:
+                return False
+            self.viruses_units[virus] += self.contamination[city]
+            self.set_contamination(city, 0)
+        elif self.contamination[city] > 0:
+            self.set_contamination(city, self.contamination[city] - 1)
+            self.viruses_units[virus] += 1
+        else:
+            return False
+        if self.vaccines[virus] and self.viruses_units[virus] == VIRUS_UNITS_COUNT:
+            self.victory_over_viruses[virus] = True
+        return True
+
+    def finish(self, winner, reason=None):
+        if self.game_over:
+            return
+        self.game_over = True
+        self.winner = winner
+        self.loss_reason = reason
+
+    def move_player(self, player, city):
+        if player == self.specialist:
+            self.set_protection(self.locations[player], 0)
+            self.set_protection(city, 1)
+        locations = self.location_keys[player]
+        self.zobrist ^= locations[self.locations[player]] ^ locations[city]
+        self.locations[player] = city
+        if self.roles[player] == ROLE_DOCTOR and self.vaccines[self.map.viruses[city]]:
+            self.medication(player, city)
+
+    def open_players_card(self):
+        if self.players_pos == len(self.players_pack):
+            return None
+        self.players_pos += 1
+        return self.players_pack[self.players_pos - 1]
+
+    def open_infections_card(self):
+        if self.infection_pos == len(self.infection_pack):
+            # как Deck.reshuffle: перемешивается вся колода в ее текущем порядке
+            cards = list(self.complete_pack)
+            self.rng.shuffle(cards)
+            self.infection_pack = tuple(cards)
+            self.complete_pack = self.infection_pack
+            self.infection_pos = 0
+        self.infection_pos += 1
+        return self.infection_pack[self.infection_pos - 1]
+
+    def receiving_cards(self, player):
+        hand = self.hands[player]
+        for _ in range(HOW_TAKE):
+            if len(hand) == MAX_CARDS_IN_HAND:
+                break
+            card = self.open_players_card()
+            if card is None:
+                self.finish(GAME_WIN, LOSS_PLAYER_PACK)
+                break
+            if card == INFECTION_CARD:
+                self.scale_infectivity += 1
+            else:
+                self.add_card(player, card)
+
+    def fighting_virus(self, player):
+        if self.contamination[self.locations[player]] > 0:
+            return self.medication(player, self.locations[player])
+        return False
+
+    def simple_moving(self, player, city):
+        if city in self.map.neighbor_sets[self.locations[player]]:
+            self.move_player(player, city)
+            return True
+        return False
+
+    def work_moving(self, player, city):
+        if self.stations[self.locations[player]] and self.stations[city]:
+            self.move_player(player, city)
+            return True
+        return False
+
+    def air_moving(self, player, city, card):
+        hand = self.hands[player]
+        if card not in hand or card not in (self.locations[player], city):
+            return False
+        self.move_player(player, city)
+        self.del_card(player, card)
+        return True
+
+    def build_station(self, player):
+        location = self.locations[player]
+        if self.stations[location]:
+            return False
+        if self.roles[player] != ROLE_ENGINEER:
+            if location not in self.hands[player]:
+                return False
+            self.del_card(player, location)
+        self.stations[location] = True
+        self.zobrist ^= self.keys.stations[location]
+        self.station_cities.append(location)
+        return True
+
+    def transfer_card(self, player_from, player_to, card):
+        if card not in self.hands[player_from]:
+            return False
+        if self.locations[player_from] == self.locations[player_to] or \
+                ROLE_RESEARCHER in (self.roles[player_from], self.roles[player_to]):
+            self.del_card(player_from, card)
+            self.add_card(player_to, card)
+            return True
+        return False
+
+    def create_vaccine(self, player, virus, cards):
+        if self.vaccines[virus]:
+            return False
+        need = cure_size(self.roles[player])
+        if len(cards) < need:
+            return False
+        cards = cards[:need]
+        hand = self.hands[player]
+        if any(card == INFECTION_CARD or self.map.viruses[card] != virus or cards.count(card) > hand.count(card)
+               for card in cards):
+            return False
+        for card in cards:
+            self.del_card(player, card)
+        self.vaccines[virus] = True
+        if all(self.vaccines):
+            self.finish(PLAYERS_WIN)
+        doctor = self.find_role(ROLE_DOCTOR)
+        if doctor is not None:
+            self.medication(doctor, self.locations[doctor])
+        return True
+
+    def action_with_city(self, player, city, card=None):
+        if self.locations[player] == city:
+            return self.fighting_virus(player)
+        if self.simple_moving(player, city):
+            return True
+        if self.work_moving(player, city):
+            return True
+        if card is not None:
+            return self.air_moving(player, city, card)
+        return False
+
+    def dispatcher_action(self, player, city, card=None):
+        if self.roles[self.current] != ROLE_DISPATCHER:
+            return False
+        if self.locations[player] == city:
+            return False
+        if self.simple_moving(player, city):
+            return True
+        if self.players_in(city):
+            self.move_player(player, city)
+            return True
+        if self.work_moving(player, city):
+            return True
+        hand = self.hands[self.current]
+        if card is not None and card in hand and card in (self.locations[player], city):
+            self.move_player(player, city)
+            self.del_card(self.current, card)
+            return True
+        return False
+
+    def spending_action(self):
+        self.remaining_actions -= 1
+        if self.remaining_actions == 0:
+            self.transfer_motion()
+
+    def transfer_motion(self):
+        self.turn += 1
+        self.remaining_actions = PLAYER_ACTIONS
+        self.receiving_cards(self.current)
+        self.last_infections.clear()
+        for _ in range(self.take_infectivity()):
+            card = self.open_infections_card()
+            self.city_infection(card)
+            self.last_infections.append(card)
+        self.current = (self.current + 1) % len(self.roles)
+
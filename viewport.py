@@ -0,0 +1,133 @@
+import math
+
+# видимая часть карты: сдвиг и масштаб, отбор городов и связей, попадающих в окно
+MIN_ZOOM = 0.05
+MAX_ZOOM = 4.0
+# размер ячейки сетки отбора в координатах карты (не меньше)
+CULL_CELL = 64
+# отрезок, который покрывает больше ячеек, не раскладывается по сетке и проверяется при каждом запросе
+LONG_SEGMENT_CELLS = 64
+
+
+def edge_segments(city_map, layout):
+    # отрезки связей: (номер связи, x1, y1, x2, y2, город на другом конце или -1);
+    # связь через край карты - два отрезка от городов до краев, у края подписывается город на другом конце
+    width = layout.size[0]
+    xs, ys = layout.xs, layout.ys
+    segments = []
+    for edge, (c_1, c_2) in enumerate(city_map.edges):
+        if layout.wrap[edge]:
+            if xs[c_1] > xs[c_2]:
+                c_1, c_2 = c_2, c_1
+            middle = (ys[c_1] + ys[c_2]) // 2
+            segments.append((edge, xs[c_1], ys[c_1], 0, middle, c_2))
+            segments.append((edge, xs[c_2], ys[c_2], width, middle, c_1))
+        else:
+            segments.append((edge, xs[c_1], ys[c_1], xs[c_2], ys[c_2], -1))
+    return segments
+
+
+class CullIndex:
+    # равномерная сетка по координатам карты: города по точке, отрезки связей по ограничивающему прямоугольнику
+    def __init__(self, xs, ys, segments, width, height):
+        self.xs = xs
+        self.ys = ys
+        self.segments = segments
+        self.cell = max(CULL_CELL, int(math.sqrt(width * height / max(len(xs), 1)) * 2))
+        cell = self.cell
+        self.city_cells = dict()
+        for city in range(len(xs)):
+            self.city_cells.setdefault((xs[city] // cell, ys[city] // cell), []).append(city)
+        self.segment_cells = dict()
+        self.long_segments = []
+        for index, (_, x1, y1, x2, y2, _) in enumerate(segments):
+            cx1, cx2 = min(x1, x2) // cell, max(x1, x2) // cell
+            cy1, cy2 = min(y1, y2) // cell, max(y1, y2) // cell
+            if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > LONG_SEGMENT_CELLS:
+                self.long_segments.append(index)
+                continue
+            for cx in range(cx1, cx2 + 1):
+                for cy in range(cy1, cy2 + 1):
+                    self.segment_cells.setdefault((cx, cy), []).append(index)
+
+    def cities(self, rect, margin=0):
+        # номера городов внутри прямоугольника (x1, y1, x2, y2), расширенного на margin
+        x1, y1, x2, y2 = rect[0] - margin, rect[1] - margin, rect[2] + margin, rect[3] + margin
+        cell = self.cell
+        xs, ys = self.xs, self.ys
+        found = []
+        for cx in range(int(x1 // cell), int(x2 // cell) + 1):
+            for cy in range(int(y1 // cell), int(y2 // cell) + 1):
+                for city in self.city_cells.get((cx, cy), ()):
+                    if x1 <= xs[city] <= x2 and y1 <= ys[city] <= y2:
+                        found.append(city)
+        found.sort()
+        return found
+
+    def segments_in(self, rect):
+        # номера отрезков, чей ограничивающий прямоугольник пересекает rect
+        x1, y1, x2, y2 = rect
+        cell = self.cell
+        segments = self.segments
+        found = set()
+        for cx in range(int(x1 // cell), int(x2 // cell) + 1):
+            for cy in range(int(y1 // cell), int(y2 // cell) + 1):
+                found.update(self.segment_cells.get((cx, cy), ()))
+        found.update(self.long_segments)
+        return sorted(index for index in found
+                      if min(segments[index][1], segments[index][3]) <= x2
+                      and max(segments[index][1], segments[index][3]) >= x1
+                      and min(segments[index][2], segments[index][4]) <= y2
+                      and max(segments[index][2], segments[index][4]) >= y1)
+
+
+class Viewport:
+    # окно width x height пикселей на карту world_width x world_height;
+    # x, y - точка карты в левом верхнем углу окна, zoom - пикселей на единицу карты
+    def __init__(self, width, height, world_width, world_height):
+        self.width = width
+        self.height = height
+        self.world_width = world_width
+        self.world_height = world_height
+        # карта целиком помещается в окно при минимальном масштабе
+        self.min_zoom = max(MIN_ZOOM, min(1.0, width / world_width, height / world_height))
+        self.zoom = 1.0
+        self.x = 0.0
+        self.y = 0.0
+
+    def key(self):
+        return self.x, self.y, self.zoom
+
+    def to_screen(self, x, y):
+        zoom = self.zoom
+        return round((x - self.x) * zoom), round((y - self.y) * zoom)
+
+    def to_world(self, pos):
+        return self.x + pos[0] / self.zoom, self.y + pos[1] / self.zoom
+
+    def world_rect(self):
+        return self.x, self.y, self.x + self.width / self.zoom, self.y + self.height / self.zoom
+
+    def clamp(self):
+        # край карты не уходит внутрь окна; карта меньше окна прижата к его левому верхнему углу
+        for axis, size, world in (('x', self.width, self.world_width), ('y', self.height, self.world_height)):
+            free = max(0.0, world - size / self.zoom)
+            setattr(self, axis, min(max(getattr(self, axis), 0.0), free))
+
+    def pan(self, dx, dy):
+        # сдвиг на dx, dy пикселей экрана; возвращает, изменилось ли окно
+        old = self.key()
+        self.x -= dx / self.zoom
+        self.y -= dy / self.zoom
+        self.clamp()
+        return self.key() != old
+
+    def zoom_at(self, pos, factor):
+        # масштаб с неподвижной точкой карты под pos
+        old = self.key()
+        x, y = self.to_world(pos)
+        self.zoom = min(max(self.zoom * factor, self.min_zoom), MAX_ZOOM)
+        self.x = x - pos[0] / self.zoom
+        self.y = y - pos[1] / self.zoom
+        self.clamp()
+        return self.key() != old
@@ -0,0 +1,57 @@
+import random
+from array import array
+
+# хеш позиции по Зобристу: у каждого элемента состояния (уровень заражения города, станция, место игрока,
+# карта на руке) свой случайный 64-битный ключ, хеш - xor ключей всех элементов, которые сейчас есть.
+# Изменение элемента - xor старого и нового ключа, поэтому хеш ведется за O(1) на каждое изменение
+ZOBRIST_SEED = 20240601
+MASK = (1 << 64) - 1
+
+
+class StateHash:
+    # общее значение хеша партии: его меняют города, игроки и сама игра
+    __slots__ = ('value',)
+
+    def __init__(self, value=0):
+        self.value = value
+
+
+def words(rng, size):
+    return array('Q', rng.randbytes(8 * size))
+
+
+class ZobristKeys:
+    # ключи одной карты: общие для всех партий на ней, чтобы одинаковые позиции разных партий совпадали.
+    # Пустой город (уровень 0) ключа не имеет, поэтому хеш новой доски - только станции и места игроков
+    def __init__(self, count, levels, counters, seed=ZOBRIST_SEED):
+        self.count = count
+        self.seed = seed
+        rng = random.Random(seed)
+        contamination = words(rng, count * (levels - 1))
+        step = levels - 1
+        self.towns = tuple((0,) + tuple(contamination[city * step:(city + 1) * step]) for city in range(count))
+        self.stations = words(rng, count)
+        # ключи счетчиков партии нечетные: значение счетчика умножается на ключ
+        self.counters = tuple(key | 1 for key in words(rng, counters))
+        self.players = []
+
+    def player(self, num):
+        # места и карты игрока num: (ключи по городу, ключи по номеру карты, последний - карта не города);
+        # таблицы создаются по мере надобности, но от порядка создания не зависят
+        while len(self.players) <= num:
+            rng = random.Random(self.seed + len(self.players) + 1)
+            self.players.append((words(rng, self.count), words(rng, self.count + 1)))
+        return self.players[num]
+
+
+def copy_key(key, count):
+    # ключ count-й одинаковой карты на руке: xor одинаковых ключей взаимно уничтожился бы
+    return key * (2 * count - 1) & MASK
+
+
+def fold_counters(keys, counters):
+    # счетчики партии в хеше: значение каждого умножается на свой нечетный ключ
+    value = 0
+    for key, counter in zip(keys.counters, counters):
+        value ^= key * (counter + 1) & MASK
+    return value